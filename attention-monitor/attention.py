@@ -0,0 +1,116 @@
+"""
+Blink, yawn and focus state machines.
+
+AttentionTracker holds the per-user counters the client publishes and turns
+per-frame face measurements into records. It takes the frame timestamp as an
+argument instead of reading the clock, so durations come out the same whether
+frames are analysed serially, in a pipeline, or from a recorded video.
+"""
+
+import uuid
+
+
+class AttentionTracker:
+    """
+    Accumulate attention metrics for one user across frames.
+
+    Args:
+        userid: User identifier written into each record
+        eye_closed_threshold: EAR below which the eyes count as closed
+        yawn_threshold: MAR above which the mouth counts as yawning
+        focus_yaw_threshold: |yaw| in degrees beyond which focus is lost
+    """
+
+    def __init__(self, userid, eye_closed_threshold=0.15, yawn_threshold=0.4,
+                 focus_yaw_threshold=30):
+        self.userid = str(userid)
+        self.eye_closed_threshold = eye_closed_threshold
+        self.yawn_threshold = yawn_threshold
+        self.focus_yaw_threshold = focus_yaw_threshold
+
+        # Metrics tracking
+        self.blink_count = 0
+        self.yawn_count = 0
+        self.lost_focus_count = 0
+        self.lost_focus_duration = 0
+        self.face_not_present_duration = 0
+
+        # State tracking
+        self.eye_closed = False
+        self.yawning = False
+        self.lost_focus = False
+        self.focus_timer = None
+        self.face_timer = None
+
+        self.last_record = None
+
+    def counters(self):
+        """Return the counters shown in the overlay and published records."""
+        return (self.blink_count, self.yawn_count, self.lost_focus_count,
+                self.lost_focus_duration, self.face_not_present_duration)
+
+    def update(self, timestamp, faces):
+        """
+        Advance the state machines by one frame.
+
+        Args:
+            timestamp: Frame time in seconds
+            faces: List of (ear, mar, yaw, pitch, roll) floats, one per face
+
+        Returns:
+            list: One record dict per face
+        """
+        if len(faces) == 0:
+            if self.face_timer is None:
+                self.face_timer = timestamp
+            self.face_not_present_duration += timestamp - self.face_timer
+            self.face_timer = timestamp
+        else:
+            self.face_timer = None
+
+        records = []
+        for ear, mar, yaw, pitch, roll in faces:
+            # Blink detection
+            if ear < self.eye_closed_threshold:
+                self.eye_closed = True
+            elif ear > self.eye_closed_threshold and self.eye_closed:
+                self.blink_count += 1
+                self.eye_closed = False
+
+            # Yawn detection
+            if mar > self.yawn_threshold:
+                self.yawning = True
+            elif mar < self.yawn_threshold * 0.5 and self.yawning:
+                self.yawn_count += 1
+                self.yawning = False
+
+            # Focus loss detection
+            if yaw < -self.focus_yaw_threshold or yaw > self.focus_yaw_threshold:
+                self.lost_focus = True
+                if self.focus_timer is None:
+                    self.focus_timer = timestamp
+                self.lost_focus_duration += timestamp - self.focus_timer
+                self.focus_timer = timestamp
+            elif -self.focus_yaw_threshold <= yaw <= self.focus_yaw_threshold and self.lost_focus:
+                self.lost_focus_count += 1
+                self.lost_focus = False
+                self.focus_timer = None
+
+            self.last_record = {
+                'id': self.userid,
+                'sortKey': str(uuid.uuid1()),
+                'timestamp': timestamp,
+                'yaw': yaw,
+                'pitch': pitch,
+                'roll': roll,
+                'ear': ear,
+                'blink_count': self.blink_count,
+                'mar': mar,
+                'yawn_count': self.yawn_count,
+                'lost_focus_count': self.lost_focus_count,
+                'lost_focus_duration': self.lost_focus_duration,
+                'face_not_present_duration': self.face_not_present_duration
+            }
+            records.append(self.last_record)
+
+        return records
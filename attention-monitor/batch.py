@@ -0,0 +1,356 @@
+"""
+Batch analyzer for recorded lecture archives.
+
+Spreads a directory (or manifest) of videos across a process pool. Each
+worker process loads the dlib predictor and Hopenet once and reuses them for
+every chunk it is given. Long videos are split into time-range chunks that
+are measured in parallel; the blink, yawn and focus state machines are then
+replayed over the chunks in order, so the counters come out exactly as if
+the video had been analysed in one pass.
+
+Face tracking (--track-interval) and the pose cache (--pose-cache) restart
+at every chunk boundary: each chunk begins with a full detection and fresh
+pose estimates. The results never depend on how chunks are scheduled, but
+in those modes they can differ slightly from a single pass; use
+--chunk-seconds 0 to reproduce one exactly.
+
+Usage:
+    python batch.py --input recordings/ --output-dir sessions/ --workers 8
+    python batch.py --input manifest.txt --chunk-seconds 300
+
+A manifest has one video per line, optionally followed by a comma and the
+user ID (the file name stem is used otherwise). Each session's records are
+written to <user ID>_<stem>.npz, or <stem>.npz when the two are the same.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+from utils import parse_scales
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.webm'}
+
+# The client module, imported once per process by _load_client
+client = None
+
+
+def load_sessions(source):
+    """
+    List the videos to analyse.
+
+    Args:
+        source: Directory of videos or manifest file
+
+    Returns:
+        list: (video path, user ID) tuples
+    """
+    source = Path(source)
+    if source.is_dir():
+        return [(path, path.stem) for path in sorted(source.iterdir())
+                if path.suffix.lower() in VIDEO_EXTENSIONS]
+
+    sessions = []
+    for line in source.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        path, _, userid = line.partition(',')
+        path = Path(path.strip())
+        if not path.is_absolute():
+            path = source.parent / path
+        sessions.append((path, userid.strip() or path.stem))
+    return sessions
+
+
+def output_names(sessions):
+    """
+    Choose a distinct records file name for every session.
+
+    Names are the video's file name stem, prefixed with the user ID when it
+    differs from the stem, so the same file name in different folders or
+    for different users doesn't collide.
+
+    Args:
+        sessions: (video path, user ID) tuples from load_sessions
+
+    Returns:
+        list: File names, one per session
+
+    Raises:
+        ValueError: If two sessions would still write the same file
+    """
+    names = []
+    seen = {}
+    for path, userid in sessions:
+        stem = Path(path).stem
+        name = f"{stem}.npz" if userid == stem else f"{userid}_{stem}.npz"
+        if name in seen:
+            raise ValueError(f"{seen[name]} and {path} would both be written to {name}; "
+                             f"give them distinct user IDs in a manifest")
+        seen[name] = path
+        names.append(name)
+    return names
+
+
+def plan_chunks(path, chunk_seconds):
+    """
+    Split a video into [start, end) media-time ranges.
+
+    Args:
+        path: Video file path
+        chunk_seconds: Target chunk length (0 = one chunk per video)
+
+    Returns:
+        list: (start, end) tuples; the last end is None (end of video)
+    """
+    duration = client.video_duration(path)
+    if chunk_seconds <= 0 or duration <= chunk_seconds:
+        return [(0.0, None)]
+    bounds = np.arange(0.0, duration, chunk_seconds)
+    return [(float(start), float(start + chunk_seconds) if i + 1 < len(bounds) else None)
+            for i, start in enumerate(bounds)]
+
+
+def _load_client():
+    """Import the client module (which loads the dlib predictor) once per process."""
+    global client
+    if client is None:
+        import main
+        client = main
+    return client
+
+
+def _init_worker(settings):
+    """Load models once per worker process."""
+    import cv2
+    cv2.setNumThreads(1)
+
+    _load_client()
+    client.configure(settings['track_interval'], settings['tracker'], settings['detect_scales'],
+                     settings['pose_backend'], settings['hopenet_backend'],
+                     settings['pose_input_size'], settings['pose_cache'],
+                     settings['pose_cache_max_age'], settings['pose_cache_measure'])
+    if client.HAVE_FACEPOSE:
+        import torch
+        torch.set_num_threads(settings['threads'])
+    client.load_pose_model()
+
+
+def _measure_chunk(index, path, start, end, sample_rate, batch_frames):
+    began = time.perf_counter()
+    frames, counters = client.measure_video(path, start=start, end=end,
+                                            sample_rate=sample_rate,
+                                            batch_frames=batch_frames)
+    counters['wall_time'] = time.perf_counter() - began
+    counters['pid'] = os.getpid()
+    return index, frames, counters
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def main(source, output_dir, workers, chunk_seconds, sample_rate, batch_frames, settings):
+    sessions = load_sessions(source)
+    if not sessions:
+        print(f"No videos found in {source}")
+        return
+    outputs = output_names(sessions)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Chunk planning only reads container metadata and stitching only replays
+    # the state machines, so both run in this process
+    _load_client()
+    report = {'sessions': [], 'failed_sessions': []}
+    tasks = []
+    for session, (path, userid) in enumerate(sessions):
+        try:
+            chunks = plan_chunks(path, chunk_seconds)
+        except Exception as e:
+            print(f"ERROR: {path}: {e}")
+            report['failed_sessions'].append(_failed_session(path, userid, 0, [{'error': str(e)}]))
+            continue
+        for chunk, (start, end) in enumerate(chunks):
+            tasks.append((session, chunk, str(path), start, end))
+
+    print(f"Analysing {len(sessions)} videos as {len(tasks)} chunks on {workers} workers")
+    if len(tasks) > len(sessions) and (settings['track_interval'] or settings['pose_cache']):
+        print("Note: face tracking and the pose cache restart at every chunk, so results "
+              "can differ slightly from a single pass (--chunk-seconds 0)")
+    began = time.perf_counter()
+    results = {}
+    failures = {}
+    remaining = {}
+    for session, *_ in tasks:
+        results[session] = {}
+        failures[session] = []
+        remaining[session] = remaining.get(session, 0) + 1
+    total_chunks = dict(remaining)
+
+    chunk_latency = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(settings,)) as pool:
+        futures = {pool.submit(_measure_chunk, chunk, path, start, end,
+                               sample_rate, batch_frames): (session, chunk, start, end)
+                   for session, chunk, path, start, end in tasks}
+        for future in as_completed(futures):
+            session, chunk, start, end = futures[future]
+            path, userid = sessions[session]
+            try:
+                chunk, frames, counters = future.result()
+            except Exception as e:
+                print(f"ERROR: {path} chunk {chunk}: {e}")
+                failures[session].append({'chunk': chunk, 'start': start, 'end': end,
+                                          'error': str(e)})
+            else:
+                chunk_latency.append(counters['wall_time'])
+                results[session][chunk] = (frames, counters)
+            remaining[session] -= 1
+            if remaining[session] > 0:
+                continue
+
+            # Stitching around a missing chunk would replay the counters
+            # wrongly, so a session is written whole or not at all
+            chunks = results.pop(session)
+            if failures[session]:
+                report['failed_sessions'].append(
+                    _failed_session(path, userid, total_chunks[session], failures[session]))
+                continue
+            try:
+                report['sessions'].append(_finish_session(path, userid, chunks,
+                                                           output_dir / outputs[session]))
+            except Exception as e:
+                print(f"ERROR: {path}: {e}")
+                report['failed_sessions'].append(
+                    _failed_session(path, userid, total_chunks[session], [{'error': str(e)}]))
+
+    wall_time = time.perf_counter() - began
+    frames = sum(s['frames_analysed'] for s in report['sessions'])
+    media = sum(s['media_duration'] for s in report['sessions'])
+    report.update({
+        'workers': workers,
+        'chunks': len(tasks),
+        'chunks_failed': sum(len(f) for f in failures.values()),
+        'wall_time': wall_time,
+        'frames_analysed': frames,
+        'media_duration': media,
+        'throughput_fps': frames / wall_time if wall_time else 0.0,
+        'realtime_factor': media / wall_time if wall_time else 0.0,
+        'chunk_latency_p50': _percentile(chunk_latency, 50),
+        'chunk_latency_p95': _percentile(chunk_latency, 95),
+        'chunk_latency_max': max(chunk_latency) if chunk_latency else 0.0,
+    })
+    with open(output_dir / 'report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Analysed {frames} frames ({media / 60:.1f} min of video) in {wall_time:.1f}s: "
+          f"{report['throughput_fps']:.1f} fps, {report['realtime_factor']:.1f}x realtime")
+    print(f"Chunk latency p50 {report['chunk_latency_p50']:.1f}s, "
+          f"p95 {report['chunk_latency_p95']:.1f}s")
+    if report['failed_sessions']:
+        print(f"WARNING: {len(report['failed_sessions'])} of {len(sessions)} videos failed "
+              f"and were not written; see failed_sessions in the report")
+    print(f"Report written to {output_dir / 'report.json'}")
+
+
+def _failed_session(path, userid, chunks, errors):
+    """Describe a session that was not written, for the report."""
+    return {
+        'video': str(path),
+        'userid': userid,
+        'chunks': chunks,
+        'errors': errors,
+    }
+
+
+def _finish_session(path, userid, chunks, output):
+    """Stitch a session's chunks in media-time order and write its records."""
+    frames = []
+    decoded = 0
+    worker_time = 0.0
+    media_end = 0.0
+    for chunk in sorted(chunks):
+        chunk_frames, counters = chunks[chunk]
+        frames.extend(chunk_frames)
+        decoded += counters['frames_decoded']
+        worker_time += counters['wall_time']
+        media_end = max(media_end, counters['media_end'])
+
+    records = client.replay_frames(userid, frames)
+    output = client.write_columns(output, client.records_to_columns(records))
+    print(f"  {Path(path).name}: {len(frames)} frames, {len(records)} records -> {output}")
+    return {
+        'video': str(path),
+        'userid': userid,
+        'output': str(output),
+        'chunks': len(chunks),
+        'frames_decoded': decoded,
+        'frames_analysed': len(frames),
+        'records': len(records),
+        'media_duration': media_end,
+        # Summed wall time of the workers that measured the chunks
+        'worker_time': worker_time,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batch-analyse recorded sessions')
+    parser.add_argument('--input', required=True, help='Directory of videos or manifest file')
+    parser.add_argument('--output-dir', default='sessions', help='Where to write per-session records')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Torch threads per worker')
+    parser.add_argument('--chunk-seconds', type=float, default=600,
+                        help='Split videos into chunks of this many seconds (0 = whole videos)')
+    parser.add_argument('--sample-rate', type=float, default=5,
+                        help='Frames per second of media time to analyse (0 = all)')
+    parser.add_argument('--batch-frames', type=int, default=8,
+                        help='Frames batched per head pose inference')
+    parser.add_argument('--track-interval', type=int, default=0,
+                        help='Run face detection every N frames and track faces in between')
+    parser.add_argument('--tracker', choices=['correlation', 'landmarks'], default='correlation')
+    parser.add_argument('--detect-scales', default=None,
+                        help='Face detection downscale factors tried in order, e.g. "0.5,1.0"')
+    parser.add_argument('--pose-backend', choices=['hopenet', 'pnp'], default=None,
+                        help='Head pose model (default: hopenet when available)')
+    parser.add_argument('--hopenet-backend', default=None,
+                        choices=['eager', 'torchscript', 'int8-dynamic', 'int8-static', 'onnx', 'auto'],
+                        help='Hopenet inference backend; run export_pose.py first for all but eager')
+    parser.add_argument('--pose-input-size', type=int, default=None,
+                        help='Hopenet face crop size, e.g. 112 or 160 (default 224)')
+    parser.add_argument('--pose-cache', type=float, default=0.0,
+                        help='Reuse head poses of faces that changed less than this (0 = off)')
+    parser.add_argument('--pose-cache-max-age', type=int, default=10)
+    parser.add_argument('--pose-cache-measure', choices=['landmarks', 'pixels'], default='landmarks')
+    args = parser.parse_args()
+
+    detect_scales = None
+    if args.detect_scales:
+        try:
+            detect_scales = parse_scales(args.detect_scales)
+        except ValueError as e:
+            parser.error(f"--detect-scales: {e}")
+
+    settings = {
+        'threads': args.threads,
+        'track_interval': args.track_interval,
+        'tracker': args.tracker,
+        'detect_scales': detect_scales,
+        'pose_backend': args.pose_backend,
+        'hopenet_backend': args.hopenet_backend,
+        'pose_input_size': args.pose_input_size,
+        'pose_cache': args.pose_cache,
+        'pose_cache_max_age': args.pose_cache_max_age,
+        'pose_cache_measure': args.pose_cache_measure,
+    }
+    main(args.input, args.output_dir, args.workers, args.chunk_seconds,
+         args.sample_rate, args.batch_frames, settings)
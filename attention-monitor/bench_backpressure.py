@@ -0,0 +1,187 @@
+"""
+Backpressure policies against a slow subscriber.
+
+Publishes one client's traffic, a record on metrics/<userid> and a
+half-resolution 720p frame on video/<userid> at --rate fps, to a local
+subscriber process that sleeps --delay seconds after every message, so
+it can take far less than it is offered. Each scenario sends the same
+traffic a different way:
+
+    default   one PUB socket with default high-water marks, sent directly
+              from the publishing thread (no FrameSender): ZeroMQ queues
+              and drops silently
+    policies  FrameSender with metrics drop-oldest and video latest
+    block     FrameSender with both channels blocking
+
+For each channel the benchmark reports what the sender sent, dropped,
+delivered late (more than --late-after after capture) and had refused by
+a full socket, and what the subscriber received with the age of the
+data when it arrived (p50/p95/max). It also reports the time put() spent
+waiting for room. Latest-value policies should keep the video age near
+one frame interval. The default socket delivers ever older frames.
+
+Usage:
+    python bench_backpressure.py --rate 15 --delay 0.05 --duration 5
+    python bench_backpressure.py --codec jpeg --queue-size 16
+"""
+
+import argparse
+import multiprocessing
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import zmq
+
+import main as client
+from sender import Channel, FrameSender, apply_policy
+from zeromq.SerializingContext import CODECS, METRICS, VIDEO, SerializingContext
+
+IMAGE_PATH = Path(__file__).parent.parent / "image" / "lena.jpg"
+
+SCENARIOS = {
+    'default': None,
+    'policies': {METRICS: 'drop-oldest', VIDEO: 'latest'},
+    'block': {METRICS: 'block', VIDEO: 'block'},
+}
+
+
+def slow_subscriber(port, delay, ready, stop, results):
+    """Receive everything, slowly; report per-channel counts and data ages."""
+    context = SerializingContext()
+    socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.RCVHWM, 2)
+    for channel in (METRICS, VIDEO):
+        socket.setsockopt(zmq.SUBSCRIBE, f"{channel}/".encode())
+    socket.bind(f"tcp://127.0.0.1:{port}")
+    ready.set()
+
+    ages = {METRICS: [], VIDEO: []}
+    while not stop.is_set():
+        if not socket.poll(50):
+            continue
+        name, data, _ = socket.recv_message()
+        channel = name.split('/', 1)[0]
+        ages[channel].append(time.time() - data['captured'])
+        time.sleep(delay)
+    results.put(ages)
+    socket.close(linger=0)
+    context.term()
+
+
+def percentile_ms(values, q):
+    return float(np.percentile(values, q)) * 1e3 if values else float('nan')
+
+
+def run(scenario, port, image, rate, duration, delay, codec, queue_size, late_after, drain):
+    """Publish for `duration` seconds with one scenario; returns sender and subscriber results."""
+    ready, stop, queue = multiprocessing.Event(), multiprocessing.Event(), multiprocessing.Queue()
+    process = multiprocessing.Process(target=slow_subscriber,
+                                      args=(port, delay, ready, stop, queue))
+    process.start()
+    ready.wait()
+
+    policies = SCENARIOS[scenario]
+    client.socket = client.context.socket(zmq.PUB)
+    client.video_socket = client.socket if policies is None else client.context.socket(zmq.PUB)
+    if policies is not None:
+        apply_policy(client.socket, policies[METRICS], queue_size)
+        apply_policy(client.video_socket, policies[VIDEO], queue_size)
+    for socket in {client.socket, client.video_socket}:
+        socket.connect(f"tcp://127.0.0.1:{port}")
+    client.video_socket.set_codec(codec)
+
+    sender = None
+    if policies is not None:
+        sender = client.frame_sender = FrameSender({
+            METRICS: Channel(lambda item, flags: client.send_metrics(*item, flags=flags),
+                             policies[METRICS], queue_size, late_after),
+            VIDEO: Channel(lambda item, flags: client.send_video(*item, flags=flags),
+                           policies[VIDEO], queue_size, late_after),
+        })
+        sender.start()
+    # Let the subscriptions reach the publisher before the first message
+    time.sleep(0.5)
+
+    interval = 1.0 / rate
+    published = 0
+    start = time.perf_counter()
+    while published * interval < duration:
+        now = time.time()
+        data = {'id': 'student0042', 'captured': now,
+                'record': {'id': 'student0042', 'timestamp': now, 'blink_count': published}}
+        client.publish(image, data)
+        published += 1
+        pause = start + published * interval - time.perf_counter()
+        if pause > 0:
+            time.sleep(pause)
+    publish_time = time.perf_counter() - start
+
+    stats = None
+    if sender is not None:
+        sender.close()
+        stats = sender.stats()
+        client.frame_sender = None
+    time.sleep(drain)
+    stop.set()
+    ages = queue.get()
+    process.join()
+    for socket in {client.socket, client.video_socket}:
+        socket.close(linger=0)
+    return {'published': published, 'publish_time': publish_time, 'sender': stats, 'ages': ages}
+
+
+def report(scenario, result):
+    stats, ages = result['sender'], result['ages']
+    for channel in (METRICS, VIDEO):
+        received = ages[channel]
+        if stats is None:
+            counters = f"{result['published']:>5} {'-':>7} {'-':>5} {'-':>7}"
+        else:
+            counters = (f"{stats[f'{channel}_sent']:>5} {stats[f'{channel}_dropped']:>7} "
+                        f"{stats[f'{channel}_late']:>5} {stats[f'{channel}_refused']:>7}")
+        print(f"{scenario:>9} {channel:>8} {counters} {len(received):>8} "
+              f"{percentile_ms(received, 50):>8.0f} {percentile_ms(received, 95):>8.0f} "
+              f"{1e3 * max(received, default=float('nan')):>8.0f}")
+    if stats is not None:
+        blocked = stats[f'{METRICS}_blocked_seconds'] + stats[f'{VIDEO}_blocked_seconds']
+        print(f"{'':>9} put() waited {blocked:.2f}s of {result['publish_time']:.2f}s publishing")
+
+
+def main(rate, duration, delay, codec, queue_size, late_after, drain, port, scenarios):
+    image = cv2.imread(str(IMAGE_PATH))
+    if image is None:
+        raise IOError(f"Could not read {IMAGE_PATH}")
+    # The client publishes half of a 720p frame
+    image = np.ascontiguousarray(cv2.cvtColor(cv2.resize(image, (640, 360)), cv2.COLOR_BGR2RGB))
+
+    print(f"{rate:g} fps for {duration:g}s to a subscriber taking {delay * 1e3:g} ms per message, "
+          f"{codec} frames, queue size {queue_size}")
+    print(f"{'scenario':>9} {'channel':>8} {'sent':>5} {'dropped':>7} {'late':>5} {'refused':>7} "
+          f"{'received':>8} {'age p50':>8} {'p95':>8} {'max':>8}")
+    results = {}
+    for scenario in scenarios:
+        result = results[scenario] = run(scenario, port, image, rate, duration, delay, codec,
+                                         queue_size, late_after, drain)
+        report(scenario, result)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark backpressure policies')
+    parser.add_argument('--rate', type=float, default=15, help='Frames per second published')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per scenario')
+    parser.add_argument('--delay', type=float, default=0.05,
+                        help='Seconds the subscriber sleeps after each message')
+    parser.add_argument('--codec', choices=CODECS, default='raw', help='Frame codec')
+    parser.add_argument('--queue-size', type=int, default=64)
+    parser.add_argument('--late-after', type=float, default=0.5)
+    parser.add_argument('--drain', type=float, default=2.0,
+                        help='Seconds the subscriber keeps receiving after publishing stops')
+    parser.add_argument('--port', type=int, default=5568)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    args = parser.parse_args()
+    main(args.rate, args.duration, args.delay, args.codec, args.queue_size, args.late_after,
+         args.drain, args.port, args.scenarios.split(','))
@@ -0,0 +1,158 @@
+"""
+Bandwidth and CPU of metrics-only subscribers.
+
+Publishes the traffic of --clients simulated clients: a record on
+metrics/<userid> at --rate fps and a half-resolution 720p frame on
+video/<userid> at --video-rate fps. The same traffic is received twice
+over TCP, each time by a subscriber in its own process:
+
+    all       subscribes to b'' and decodes every frame, as before topics
+    metrics   subscribes to b'metrics/' only
+
+For each subscriber the benchmark reports the messages and bytes it
+received and the CPU time its process used, including ZeroMQ's I/O thread.
+The difference is what a metrics-only consumer saves.
+
+Usage:
+    python bench_channels.py --clients 20 --rate 5 --duration 5
+    python bench_channels.py --codec jpeg --video-rate 1
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import zmq
+
+from zeromq.SerializingContext import (CODECS, METRICS, VIDEO, SerializingContext,
+                                       decode_frame, topic)
+
+IMAGE_PATH = Path(__file__).parent.parent / "image" / "lena.jpg"
+
+END = topic(METRICS, '__end__')
+
+SUBSCRIPTIONS = {
+    'all': [b''],
+    'metrics': [f"{METRICS}/".encode()],
+}
+
+
+def subscriber(port, prefixes, ready, results):
+    """Receive until the end marker; report counts, bytes and CPU time."""
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.RCVHWM, 0)
+    for prefix in prefixes:
+        socket.setsockopt(zmq.SUBSCRIBE, prefix)
+    socket.connect(f"tcp://127.0.0.1:{port}")
+    ready.set()
+
+    messages = frames = received = 0
+    cpu = None
+    while True:
+        parts = socket.recv_multipart(copy=False)
+        if cpu is None:
+            cpu = time.process_time()
+        name = parts[0].bytes.decode('utf-8')
+        if name == END:
+            break
+        messages += 1
+        received += sum(len(part.buffer) for part in parts)
+        if len(parts) == 3:
+            decode_frame(parts[2].buffer, json.loads(parts[1].bytes))
+            frames += 1
+        else:
+            json.loads(parts[1].bytes)
+    results.put({
+        'messages': messages,
+        'frames': frames,
+        'bytes': received,
+        'cpu_seconds': time.process_time() - (cpu or time.process_time()),
+    })
+    socket.close()
+    context.term()
+
+
+def publish(socket, image, clients, rate, video_rate, duration):
+    """Send every client's metrics and video for `duration` seconds, paced at `rate`."""
+    interval = 1.0 / rate
+    video_every = max(1, round(rate / video_rate)) if video_rate else 0
+    start = time.perf_counter()
+    tick = 0
+    while tick * interval < duration:
+        now = time.time()
+        for client in range(clients):
+            userid = f"user{client:04d}"
+            data = {'id': userid, 'captured': now, 'sent': now,
+                    'record': {'id': userid, 'timestamp': now, 'yaw': 1.5, 'pitch': -2.0,
+                               'roll': 0.5, 'ear': 0.31, 'mar': 0.08, 'blink_count': tick,
+                               'yawn_count': 0, 'lost_focus_count': 0,
+                               'lost_focus_duration': 0.0, 'face_not_present_duration': 0.0}}
+            socket.send_record(topic(METRICS, userid), data)
+            if video_every and tick % video_every == 0:
+                socket.send_array(image, {'id': userid, 'captured': now, 'sent': now},
+                                  copy=False, topic=topic(VIDEO, userid))
+        tick += 1
+        delay = start + tick * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def main(clients, rate, video_rate, duration, codec, port):
+    image = cv2.imread(str(IMAGE_PATH))
+    if image is None:
+        raise IOError(f"Could not read {IMAGE_PATH}")
+    # The client publishes half of a 720p frame
+    image = np.ascontiguousarray(cv2.cvtColor(cv2.resize(image, (640, 360)), cv2.COLOR_BGR2RGB))
+
+    context = SerializingContext()
+    socket = context.socket(zmq.PUB)
+    socket.setsockopt(zmq.SNDHWM, 0)
+    socket.bind(f"tcp://127.0.0.1:{port}")
+    socket.set_codec(codec)
+
+    print(f"{clients} clients, metrics {rate} fps, video {video_rate} fps, {codec}, {duration}s")
+    print(f"{'subscriber':>10} {'messages':>9} {'frames':>7} {'MB':>8} {'MB/s':>7} "
+          f"{'CPU s':>6} {'CPU %':>6}")
+    results = {}
+    for name, prefixes in SUBSCRIPTIONS.items():
+        ready, queue = multiprocessing.Event(), multiprocessing.Queue()
+        process = multiprocessing.Process(target=subscriber, args=(port, prefixes, ready, queue))
+        process.start()
+        ready.wait()
+        # Let the subscription reach the publisher before the first message
+        time.sleep(0.5)
+        publish(socket, image, clients, rate, video_rate, duration)
+        socket.send_record(END, {})
+        result = results[name] = queue.get()
+        process.join()
+        print(f"{name:>10} {result['messages']:>9} {result['frames']:>7} "
+              f"{result['bytes'] / 1e6:>8.1f} {result['bytes'] / 1e6 / duration:>7.2f} "
+              f"{result['cpu_seconds']:>6.2f} {100 * result['cpu_seconds'] / duration:>6.1f}")
+
+    everything, metrics = results['all'], results['metrics']
+    if everything['bytes'] and everything['cpu_seconds']:
+        print(f"Metrics-only subscriber: "
+              f"{100 * (1 - metrics['bytes'] / everything['bytes']):.1f}% fewer bytes, "
+              f"{100 * (1 - metrics['cpu_seconds'] / everything['cpu_seconds']):.1f}% less CPU")
+    socket.close()
+    context.term()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark metrics-only ZeroMQ subscribers')
+    parser.add_argument('--clients', type=int, default=20, help='Simulated clients')
+    parser.add_argument('--rate', type=float, default=5, help='Metrics messages per second per client')
+    parser.add_argument('--video-rate', type=float, default=None,
+                        help='Frames per second per client (default: same as --rate)')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per subscriber')
+    parser.add_argument('--codec', choices=CODECS, default='raw', help='Frame codec')
+    parser.add_argument('--port', type=int, default=5558)
+    args = parser.parse_args()
+    main(args.clients, args.rate, args.rate if args.video_rate is None else args.video_rate,
+         args.duration, args.codec, args.port)
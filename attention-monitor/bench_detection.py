@@ -0,0 +1,105 @@
+"""
+Face detection recall and latency across downscale factors.
+
+Places image/lena.jpg (or the images given with --images) into 720p and
+1080p frames, runs the client's detector (dlib HOG, or the Haar cascade when
+dlib is missing) at each scale factor and reports the mean latency and the
+recall against full-resolution detection, matching faces at IoU >= 0.5.
+
+Usage:
+    python bench_detection.py --scales 1.0,0.75,0.5,0.35,0.25
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import main as client
+
+SCRIPT_DIR = Path(__file__).parent
+IMAGE_PATH = SCRIPT_DIR.parent / "image" / "lena.jpg"
+
+FRAME_SIZES = [(1280, 720), (1920, 1080)]
+IOU_THRESHOLD = 0.5
+
+
+def to_boxes(faces):
+    """Convert dlib rectangles or Haar (x, y, w, h) rows to x0, y0, x1, y1 rows."""
+    if len(faces) == 0:
+        return np.zeros((0, 4))
+    if client.HAVE_DLIB:
+        return np.array([[r.left(), r.top(), r.right(), r.bottom()] for r in faces], dtype=float)
+    faces = np.asarray(faces, dtype=float)
+    return np.column_stack([faces[:, 0], faces[:, 1],
+                            faces[:, 0] + faces[:, 2], faces[:, 1] + faces[:, 3]])
+
+
+def iou(a, b):
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x1 - x0) * max(0.0, y1 - y0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def make_frames(images):
+    """Place each image, scaled to 60% of frame height, into webcam-sized frames."""
+    frames = []
+    for path in images:
+        image = cv2.imread(str(path))
+        if image is None:
+            print(f"WARNING: could not read {path}")
+            continue
+        for width, height in FRAME_SIZES:
+            frame = np.full((height, width), 96, dtype=np.uint8)
+            side = int(height * 0.6)
+            face = cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), (side, side))
+            top, left = (height - side) // 2, (width - side) // 2
+            frame[top:top + side, left:left + side] = face
+            frames.append(frame)
+    return frames
+
+
+def main(scales, images, repeats):
+    frames = make_frames(images)
+    if not frames:
+        print("No frames to benchmark")
+        return
+
+    references = [to_boxes(client.detect_faces_at_scale(frame, 1.0)) for frame in frames]
+    total = sum(len(ref) for ref in references)
+    detector = 'dlib HOG' if client.HAVE_DLIB else 'Haar cascade'
+    print(f"{detector}: {len(frames)} frames, {total} reference faces")
+    print(f"{'scale':>6} {'latency ms':>11} {'recall':>7}")
+
+    for scale in scales:
+        elapsed = 0.0
+        found = 0
+        for frame, reference in zip(frames, references):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                faces = client.detect_faces_at_scale(frame, scale)
+            elapsed += time.perf_counter() - start
+
+            boxes = to_boxes(faces)
+            found += sum(1 for ref in reference
+                         if any(iou(ref, box) >= IOU_THRESHOLD for box in boxes))
+
+        latency = elapsed / (len(frames) * repeats) * 1e3
+        recall = found / total if total else float('nan')
+        print(f"{scale:>6.2f} {latency:>11.2f} {recall:>7.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark multi-resolution face detection')
+    parser.add_argument('--scales', default='1.0,0.75,0.5,0.35,0.25',
+                        help='Comma-separated downscale factors')
+    parser.add_argument('--images', nargs='*', default=[IMAGE_PATH],
+                        help='Face images to place into synthetic frames')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='Timed detections per frame and scale')
+    args = parser.parse_args()
+    main([float(s) for s in args.scales.split(',')], args.images, args.repeats)
@@ -0,0 +1,136 @@
+"""
+Hopenet accuracy and latency across input sizes.
+
+Runs Facepose at each input size over the same face crops and reports the
+per-face latency (batch of 1 and of 8) and the mean absolute yaw/pitch/roll
+difference from the 224 px model it was trained at. With --labels, the
+error against ground-truth angles is reported as well.
+
+--face-size downsamples every crop first, to mimic the small faces a webcam
+sees at the back of a room; those are the crops a 224 px model has to
+upsample.
+
+Usage:
+    python bench_input_size.py --video recordings/lecture.mp4 --face-size 100
+    python bench_input_size.py --labels aflw2000.csv
+"""
+
+import argparse
+import csv
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from export_pose import IMAGE_PATH, collect_faces
+from facepose import Facepose
+
+
+def load_labelled(path):
+    """
+    Read face crops with ground-truth angles.
+
+    Args:
+        path: CSV with rows of image path, yaw, pitch, roll (degrees);
+            relative image paths are resolved against the CSV's directory
+
+    Returns:
+        tuple: (RGB crops, (3, N) angle array)
+    """
+    path = Path(path)
+    faces, angles = [], []
+    with open(path) as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            image_path = Path(row[0])
+            if not image_path.is_absolute():
+                image_path = path.parent / image_path
+            image = cv2.imread(str(image_path))
+            if image is None:
+                print(f"WARNING: could not read {image_path}")
+                continue
+            faces.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            angles.append([float(x) for x in row[1:4]])
+    return faces, np.array(angles, dtype=np.float32).T.reshape(3, -1)
+
+
+def shrink(face, size):
+    """Downsample a crop so its short side is `size` pixels."""
+    h, w = face.shape[:2]
+    scale = size / min(h, w)
+    if scale >= 1:
+        return face
+    return cv2.resize(face, (max(1, round(w * scale)), max(1, round(h * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def predict_all(facepose, faces, batch_size=8):
+    angles = [np.stack(facepose.predict_batch(faces[i:i + batch_size]))
+              for i in range(0, len(faces), batch_size)]
+    return np.concatenate(angles, axis=1)
+
+
+def time_batch(facepose, faces, batch_size, repeats):
+    batch = (faces * batch_size)[:batch_size]
+    facepose.predict_batch(batch)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        facepose.predict_batch(batch)
+    return (time.perf_counter() - start) / (repeats * batch_size) * 1e3
+
+
+def main(model_path, sizes, faces, labels, backend, repeats):
+    reference = None
+    print(f"{len(faces)} faces, backend {backend}")
+    header = f"{'size':>5} {'ms/face@1':>10} {'ms/face@8':>10} {'yaw':>6} {'pitch':>6} {'roll':>6}"
+    print(header + (f" {'gt err':>7}" if labels is not None else ''))
+
+    for size in sorted(sizes, reverse=True):
+        facepose = Facepose(model_path, backend=backend, input_size=size)
+        facepose.warmup()
+        angles = predict_all(facepose, faces)
+        if reference is None:
+            # Errors are relative to the largest size, normally the 224 px
+            # resolution the weights were trained at
+            reference = angles
+        error = np.abs(angles - reference).mean(axis=1)
+        line = (f"{size:>5} {time_batch(facepose, faces, 1, repeats):>10.2f} "
+                f"{time_batch(facepose, faces, 8, repeats):>10.2f} "
+                f"{error[0]:>6.2f} {error[1]:>6.2f} {error[2]:>6.2f}")
+        if labels is not None:
+            line += f" {np.abs(angles - labels).mean():>7.2f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep Hopenet input sizes')
+    parser.add_argument('--model-path', default=None, help='Hopenet weights (.pkl)')
+    parser.add_argument('--sizes', default='224,192,160,128,112',
+                        help='Comma-separated input sizes; errors are relative to the largest')
+    parser.add_argument('--video', default=None, help='Recorded video to take face crops from')
+    parser.add_argument('--images', nargs='*', default=[IMAGE_PATH],
+                        help='Still images to use when no video is given')
+    parser.add_argument('--labels', default=None,
+                        help='CSV of face crop path, yaw, pitch, roll for ground-truth error')
+    parser.add_argument('--frames', type=int, default=64, help='Frames sampled from the video')
+    parser.add_argument('--face-size', type=int, default=0,
+                        help='Downsample crops to this many pixels first (0 = as captured)')
+    parser.add_argument('--backend', default='eager',
+                        help='Hopenet inference backend (see pose_backends.py)')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed runs per size')
+    args = parser.parse_args()
+
+    labels = None
+    if args.labels:
+        faces, labels = load_labelled(args.labels)
+    else:
+        faces = collect_faces(args.video, args.images, args.frames)
+    if args.face_size:
+        faces = [shrink(face, args.face_size) for face in faces]
+    if not faces:
+        print("No faces to benchmark")
+    else:
+        main(args.model_path, [int(s) for s in args.sizes.split(',')], faces, labels,
+             args.backend, args.repeats)
@@ -0,0 +1,134 @@
+"""
+Compare the landmark-based solvePnP pose backend against Hopenet.
+
+Samples frames from a recorded video (or reads still images), finds faces and
+landmarks with the client's own detector and predictor, then runs both pose
+backends on every face. Hopenet is the reference: the report gives the mean
+and 95th percentile absolute yaw/pitch/roll difference of PnP from it, and
+the per-face latency of each backend.
+
+Usage:
+    python bench_pose.py --video recordings/lecture.mp4 --frames 200
+    python bench_pose.py --images image/lena.jpg
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import main as client
+
+SCRIPT_DIR = Path(__file__).parent
+IMAGE_PATH = SCRIPT_DIR.parent / "image" / "lena.jpg"
+
+
+def load_frames(video=None, images=(), count=200, sample_rate=5):
+    """
+    Read frames to compare on, as the client would see them.
+
+    Args:
+        video: Video file to sample
+        images: Still images, used when no video is given
+        count: Maximum number of frames to sample from the video
+        sample_rate: Frames per second of media time to sample
+
+    Returns:
+        list: (rgb frame, gray frame) pairs
+    """
+    frames = []
+    if video is None:
+        for path in images:
+            image = cv2.imread(str(path))
+            if image is None:
+                print(f"WARNING: could not read {path}")
+                continue
+            frames.append(client.prepare_frame(image))
+        return frames
+
+    cap = cv2.VideoCapture(str(video))
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or sample_rate
+    step = max(1, int(round(fps / sample_rate)))
+    index = 0
+    try:
+        while len(frames) < count and cap.grab():
+            if index % step == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    frames.append(client.prepare_frame(frame))
+            index += 1
+    finally:
+        cap.release()
+    return frames
+
+
+def time_backend(name, run, faces, repeats):
+    """Run a backend over every face and return (angles array, ms per face)."""
+    model = client.pose_models.get(name)
+    angles = []
+    elapsed = 0.0
+    for frame, rect, shape in faces:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            yaw, pitch, roll = run(model, frame, rect, shape)
+        elapsed += time.perf_counter() - start
+        angles.append((float(yaw[0]), float(pitch[0]), float(roll[0])))
+    return np.array(angles).reshape(-1, 3), elapsed / (len(faces) * repeats) * 1e3
+
+
+def run_hopenet(model, frame, rect, shape):
+    return model.predict_batch([client.get_face_roi(frame, rect)])
+
+
+def run_pnp(model, frame, rect, shape):
+    return model.predict_landmarks([shape], frame.shape)
+
+
+def main(video, images, count, repeats):
+    if not client.HAVE_DLIB:
+        print("ERROR: dlib is required for landmarks")
+        return
+
+    faces = []
+    for frame, gray in load_frames(video, images, count):
+        for rect in client.detect_faces(gray):
+            shape = client.face_utils.shape_to_np(client.predictor(gray, rect))
+            faces.append((frame, rect, shape))
+    if not faces:
+        print("No faces found")
+        return
+    print(f"{len(faces)} faces")
+
+    pnp, pnp_ms = time_backend('pnp', run_pnp, faces, repeats)
+    print(f"{'backend':>8} {'ms/face':>8}")
+    print(f"{'pnp':>8} {pnp_ms:>8.2f}")
+    if 'hopenet' not in client.pose_models.names():
+        print("Hopenet is unavailable (torch not installed); skipping the comparison")
+        return
+
+    hopenet, hopenet_ms = time_backend('hopenet', run_hopenet, faces, repeats)
+    print(f"{'hopenet':>8} {hopenet_ms:>8.2f}")
+
+    error = np.abs(pnp - hopenet)
+    print("\nPnP vs Hopenet absolute error (degrees)")
+    print(f"{'angle':>6} {'mean':>7} {'p95':>7} {'max':>7}")
+    for i, angle in enumerate(('yaw', 'pitch', 'roll')):
+        print(f"{angle:>6} {error[:, i].mean():>7.2f} {np.percentile(error[:, i], 95):>7.2f} "
+              f"{error[:, i].max():>7.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare PnP and Hopenet head pose')
+    parser.add_argument('--video', default=None, help='Recorded video to sample frames from')
+    parser.add_argument('--images', nargs='*', default=[IMAGE_PATH],
+                        help='Still images to use when no video is given')
+    parser.add_argument('--frames', type=int, default=200,
+                        help='Maximum frames sampled from the video')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='Timed estimates per face and backend')
+    args = parser.parse_args()
+    main(args.video, args.images, args.frames, args.repeats)
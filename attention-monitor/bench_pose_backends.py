@@ -0,0 +1,63 @@
+"""
+Latency and throughput of every Hopenet inference backend.
+
+Runs each backend exported by export_pose.py (plus the eager model) on
+batches of 1, 4, 8 and 16 faces and prints p50/p99 latency per batch and
+throughput in faces per second. The accuracy of each variant is read from
+the export manifest.
+
+Usage:
+    python bench_pose_backends.py --batch-sizes 1,4,8,16 --iterations 50
+"""
+
+import argparse
+
+import numpy as np
+import torch
+
+import pose_backends
+from facepose import load_hopenet
+
+
+def main(model_path, backends, export_dir, batch_sizes, iterations, threads, input_size=224):
+    if threads:
+        torch.set_num_threads(threads)
+    manifest = pose_backends.read_manifest(export_dir).get('backends', {})
+    if not backends:
+        backends = ['eager'] + [name for name in manifest if name != 'eager']
+
+    rng = np.random.default_rng(0)
+    print(f"{'backend':>13} {'batch':>5} {'p50 ms':>8} {'p99 ms':>8} {'faces/s':>8} {'error':>6}")
+    for name in backends:
+        try:
+            model = load_hopenet(model_path) if name == 'eager' else None
+            backend = pose_backends.load_backend(name, model, export_dir, threads or 0)
+        except Exception as e:
+            print(f"{name:>13} unavailable: {e}")
+            continue
+
+        error = manifest.get(name, {}).get('mean_error', float('nan'))
+        for batch_size in batch_sizes:
+            batch = rng.standard_normal((batch_size, 3, input_size, input_size), dtype=np.float32)
+            latency = pose_backends.measure_latency(backend, batch, iterations)
+            p50, p99 = np.percentile(latency, 50), np.percentile(latency, 99)
+            print(f"{name:>13} {batch_size:>5} {p50 * 1e3:>8.2f} {p99 * 1e3:>8.2f} "
+                  f"{batch_size / latency.mean():>8.1f} {error:>6.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Hopenet inference backends')
+    parser.add_argument('--model-path', default=None, help='Hopenet weights (.pkl)')
+    parser.add_argument('--backends', default=None,
+                        help='Comma-separated backends (default: eager and everything exported)')
+    parser.add_argument('--export-dir', default=str(pose_backends.EXPORT_DIR))
+    parser.add_argument('--batch-sizes', default='1,4,8,16')
+    parser.add_argument('--iterations', type=int, default=30,
+                        help='Timed runs per backend and batch size')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='Intra-op threads (0 = library default)')
+    parser.add_argument('--input-size', type=int, default=224, help='Face crop size')
+    args = parser.parse_args()
+    main(args.model_path, args.backends.split(',') if args.backends else None, args.export_dir,
+         [int(b) for b in args.batch_sizes.split(',')], args.iterations, args.threads,
+         args.input_size)
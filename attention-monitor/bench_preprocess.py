@@ -0,0 +1,91 @@
+"""
+Parity check and per-face latency benchmark for Hopenet preprocessing.
+
+Compares the cv2/NumPy FacePreprocessor against the torchvision pipeline it
+replaces (PIL Resize -> CenterCrop -> ToTensor -> Normalize) on face-sized
+crops of image/lena.jpg, then times both paths per face.
+
+Usage:
+    python bench_preprocess.py --iterations 500
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+from torchvision.transforms import transforms
+
+from preprocess import FacePreprocessor
+
+SCRIPT_DIR = Path(__file__).parent
+IMAGE_PATH = SCRIPT_DIR.parent / "image" / "lena.jpg"
+
+# Typical webcam face ROI sizes (height, width) after rec_to_roi_box
+ROI_SIZES = [(96, 96), (120, 110), (180, 180), (240, 200), (360, 360)]
+
+# Mean absolute difference allowed in normalized units (~1/255 / std)
+PARITY_TOLERANCE = 0.03
+
+
+def torchvision_pipeline(size=224):
+    return transforms.Compose([transforms.Resize(size),
+                               transforms.CenterCrop(size), transforms.ToTensor(),
+                               transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                                                    std=[0.229, 0.224, 0.225])])
+
+
+def load_rois():
+    image = cv2.imread(str(IMAGE_PATH))
+    if image is None:
+        # Fall back to a synthetic frame when the sample image is missing
+        image = np.random.default_rng(0).integers(0, 256, (512, 512, 3), dtype=np.uint8)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return [np.ascontiguousarray(cv2.resize(image, (w, h))) for h, w in ROI_SIZES]
+
+
+def time_per_face(fn, rois, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(rois)
+    return (time.perf_counter() - start) / (iterations * len(rois))
+
+
+def main(iterations):
+    rois = load_rois()
+    reference = torchvision_pipeline()
+    fast = FacePreprocessor(224)
+
+    print("Parity (normalized units):")
+    ok = True
+    for roi in rois:
+        expected = reference(Image.fromarray(roi)).numpy()
+        actual = fast([roi])[0]
+        diff = np.abs(expected - actual)
+        passed = diff.mean() <= PARITY_TOLERANCE
+        ok = ok and passed
+        print(f"  {roi.shape[0]:>4}x{roi.shape[1]:<4} mean={diff.mean():.4f} "
+              f"max={diff.max():.4f} {'OK' if passed else 'FAIL'}")
+
+    def run_reference(batch):
+        return [reference(Image.fromarray(roi)) for roi in batch]
+
+    ref_time = time_per_face(run_reference, rois, iterations)
+    fast_time = time_per_face(fast, rois, iterations)
+
+    print("Latency per face:")
+    print(f"  torchvision: {ref_time * 1e3:.3f} ms")
+    print(f"  cv2/numpy:   {fast_time * 1e3:.3f} ms ({ref_time / fast_time:.1f}x)")
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Hopenet preprocessing')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='Timed passes over the ROI set')
+    args = parser.parse_args()
+    sys.exit(main(args.iterations))
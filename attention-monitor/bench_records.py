@@ -0,0 +1,120 @@
+"""
+JSON vs binary metrics messages.
+
+Encodes and decodes realistic client metrics messages (a record from
+AttentionTracker plus capture/send times, optionally with stage timings)
+in both record formats of SerializingSocket, and sends them through an
+inproc socket pair with send_record/recv_message. Reports bytes per
+message, encode/decode cost per message, and what that costs the server
+at --clients clients publishing --rate messages per second each.
+
+Usage:
+    python bench_records.py --clients 500 --rate 5
+    python bench_records.py --timing
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import zmq
+
+from attention import AttentionTracker
+from zeromq.SerializingContext import (METRICS, SerializingContext, load_header,
+                                       encode_record, topic)
+
+
+def make_messages(n, timing=False):
+    """Messages as the client publishes them, from a tracker fed varied faces."""
+    rng = np.random.default_rng(0)
+    tracker = AttentionTracker('student0042')
+    messages = []
+    now = time.time()
+    for i in range(n):
+        timestamp = now + i * 0.2
+        ear, mar = rng.uniform(0.1, 0.35), rng.uniform(0.0, 0.6)
+        yaw, pitch, roll = rng.uniform(-45, 45, 3)
+        tracker.update(timestamp, [(ear, mar, yaw, pitch, roll)])
+        data = {'id': tracker.userid, 'record': dict(tracker.last_record),
+                'captured': timestamp, 'sent': timestamp + 0.04}
+        if timing:
+            data['timing'] = {'detect': 21.4, 'landmarks': 3.2, 'pose': 38.9, 'publish': 0.6}
+        messages.append(data)
+    return messages
+
+
+def encoders():
+    # JSON as pyzmq's send_json/recv_json do it
+    return {
+        'json': (lambda data: json.dumps(data).encode('utf-8'), load_header),
+        'binary': (encode_record, load_header),
+    }
+
+
+def time_codec(messages, encode, decode, repeats):
+    packed = [encode(data) for data in messages]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for data in messages:
+            encode(data)
+    encode_time = (time.perf_counter() - start) / (repeats * len(messages))
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for buf in packed:
+            decode(buf)
+    decode_time = (time.perf_counter() - start) / (repeats * len(messages))
+    return np.mean([len(buf) for buf in packed]), encode_time, decode_time
+
+
+def time_socket(messages, record_format):
+    """Send every message through an inproc pair; returns seconds per message."""
+    context = SerializingContext.instance()
+    address = f"inproc://records-{record_format}"
+    receiver = context.socket(zmq.PAIR)
+    receiver.bind(address)
+    sender = context.socket(zmq.PAIR)
+    sender.connect(address)
+    sender.set_record_format(record_format)
+    name = topic(METRICS, messages[0]['id'])
+    start = time.perf_counter()
+    for data in messages:
+        sender.send_record(name, data)
+        receiver.recv_message()
+    elapsed = (time.perf_counter() - start) / len(messages)
+    sender.close()
+    receiver.close()
+    return elapsed
+
+
+def main(n, clients, rate, timing, repeats):
+    messages = make_messages(n, timing)
+    load = clients * rate
+    print(f"{n} messages{' with stage timings' if timing else ''}; "
+          f"server load at {clients} clients x {rate:g}/s = {load:g} messages/s")
+    print(f"{'format':>7} {'bytes':>6} {'enc us':>7} {'dec us':>7} {'socket us':>9} "
+          f"{'KB/s':>8} {'server CPU %':>12}")
+    results = {}
+    for record_format, (encode, decode) in encoders().items():
+        size, encode_time, decode_time = time_codec(messages, encode, decode, repeats)
+        socket_time = time_socket(messages, record_format)
+        results[record_format] = size, decode_time
+        print(f"{record_format:>7} {size:>6.0f} {encode_time * 1e6:>7.2f} {decode_time * 1e6:>7.2f} "
+              f"{socket_time * 1e6:>9.2f} {size * load / 1e3:>8.1f} "
+              f"{100 * decode_time * load:>12.2f}")
+
+    (json_size, json_decode), (binary_size, binary_decode) = results['json'], results['binary']
+    print(f"binary: {binary_size / json_size:.0%} of the JSON size, "
+          f"decoded {json_decode / binary_decode:.1f}x faster")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark metrics message encodings')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=500, help='Clients publishing to the server')
+    parser.add_argument('--rate', type=float, default=5, help='Messages per second per client')
+    parser.add_argument('--timing', action='store_true',
+                        help='Include per-stage timings, as with main.py --record-timing')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    main(args.messages, args.clients, args.rate, args.timing, args.repeats)
@@ -0,0 +1,400 @@
+"""
+Microbenchmarks for the client hot path.
+
+Times every per-frame step of the client in isolation, on a synthetic
+640x480 frame and on image/lena.jpg placed in a 640x480 frame, without a
+camera:
+
+    detect_dlib, detect_haar      face detection
+    landmarks                     predictor + face_utils.shape_to_np
+    ear_mar, ear_mar_vectorized   eye/mouth aspect ratios
+    roi                           rec_to_roi_box + crop_img
+    facepose_predict              Facepose.predict (one PIL crop)
+    facepose_predict_batch        Facepose.predict_batch (one crop)
+    zmq_send_recv                 SerializingSocket.send_array + recv_array
+    zmq_send_recv_jpeg, _webp     the same with frame encoding and decoding
+    overlay                       OverlayRenderer metrics panel + face
+
+Cases whose dependency (dlib, torch and the Hopenet weights, pyzmq) is
+missing are recorded as skipped. Results are written as JSON; compare mode
+flags cases whose median got slower by more than a threshold.
+
+Usage:
+    python bench_suite.py run --output before.json
+    python bench_suite.py run --output after.json --filter detect
+    python bench_suite.py compare before.json after.json --threshold 0.1
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import main as client
+from overlay import OverlayRenderer
+from utils import aspect_ratios, crop_img, eye_aspect_ratio, mouth_aspect_ratio, rec_to_roi_box
+
+SCRIPT_DIR = Path(__file__).parent
+IMAGE_PATH = SCRIPT_DIR.parent / "image" / "lena.jpg"
+
+FRAME_SIZE = (640, 480)
+
+# name -> setup(frame, gray, rect, shape) returning a zero-argument callable
+CASES = {}
+
+
+class SkipCase(Exception):
+    """Raised by a case setup when a dependency is unavailable."""
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class Rect:
+    """Stand-in for dlib.rectangle when dlib is not installed."""
+
+    def __init__(self, left, top, right, bottom):
+        self._box = (left, top, right, bottom)
+
+    def left(self):
+        return self._box[0]
+
+    def top(self):
+        return self._box[1]
+
+    def right(self):
+        return self._box[2]
+
+    def bottom(self):
+        return self._box[3]
+
+    def width(self):
+        return self._box[2] - self._box[0]
+
+    def height(self):
+        return self._box[3] - self._box[1]
+
+
+# ============================================================================
+# Inputs
+# ============================================================================
+
+def synthetic_frame():
+    """Smooth gradient plus noise, so detectors do real work but find nothing."""
+    w, h = FRAME_SIZE
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:h, 0:w]
+    base = (np.sin(xx / 23.0) + np.cos(yy / 17.0)) * 60 + 128
+    frame = np.clip(base[..., None] + rng.normal(0, 12, (h, w, 3)), 0, 255)
+    return frame.astype(np.uint8)
+
+
+def lena_frame():
+    image = cv2.imread(str(IMAGE_PATH))
+    if image is None:
+        raise IOError(f"Could not read {IMAGE_PATH}")
+    w, h = FRAME_SIZE
+    frame = np.full((h, w, 3), 96, dtype=np.uint8)
+    side = int(h * 0.8)
+    top, left = (h - side) // 2, (w - side) // 2
+    frame[top:top + side, left:left + side] = cv2.resize(image, (side, side))
+    return frame
+
+
+def make_input(bgr):
+    """
+    Prepare a BGR frame the way the client does and find a face to work on.
+
+    Falls back to a centered box and synthetic landmarks when nothing is
+    detected (or dlib is missing), so per-face cases still have work to do.
+
+    Returns:
+        tuple: (rgb frame, gray frame, face rect, (68, 2) landmarks)
+    """
+    frame, gray = client.prepare_frame(bgr)
+    h, w = gray.shape
+    rects = client.detect_faces(gray) if client.HAVE_DLIB else []
+    if len(rects) > 0:
+        rect = rects[0]
+        shape = client.face_utils.shape_to_np(client.predictor(gray, rect))
+        return frame, gray, rect, shape
+
+    side = h // 2
+    left, top = (w - side) // 2, (h - side) // 2
+    rect = client.dlib.rectangle(left, top, left + side, top + side) if client.HAVE_DLIB \
+        else Rect(left, top, left + side, top + side)
+    rng = np.random.default_rng(1)
+    shape = rng.integers(0, side, (68, 2)) + (left, top)
+    return frame, gray, rect, shape
+
+
+# ============================================================================
+# Cases
+# ============================================================================
+
+@case('detect_dlib')
+def bench_detect_dlib(frame, gray, rect, shape):
+    if not client.HAVE_DLIB:
+        raise SkipCase('dlib is not installed')
+    detector = client.dlib.get_frontal_face_detector()
+    return lambda: detector(gray, 0)
+
+
+@case('detect_haar')
+def bench_detect_haar(frame, gray, rect, shape):
+    cascade = cv2.CascadeClassifier(client.HAAR_CASCADE_PATH)
+    if cascade.empty():
+        raise SkipCase('Haar cascade not found')
+    return lambda: cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5,
+                                            minSize=(60, 60))
+
+
+@case('landmarks')
+def bench_landmarks(frame, gray, rect, shape):
+    if not client.HAVE_DLIB:
+        raise SkipCase('dlib is not installed')
+    return lambda: client.face_utils.shape_to_np(client.predictor(gray, rect))
+
+
+@case('ear_mar')
+def bench_ear_mar(frame, gray, rect, shape):
+    def run():
+        ear = (eye_aspect_ratio(shape[36:42]) + eye_aspect_ratio(shape[42:48])) / 2.0
+        return ear, mouth_aspect_ratio(shape[60:68])
+    return run
+
+
+@case('ear_mar_vectorized')
+def bench_ear_mar_vectorized(frame, gray, rect, shape):
+    shapes = shape[None]
+    return lambda: aspect_ratios(shapes)
+
+
+@case('roi')
+def bench_roi(frame, gray, rect, shape):
+    def run():
+        roi_box, _, _ = rec_to_roi_box(rect)
+        return crop_img(frame, roi_box)
+    return run
+
+
+def _facepose():
+    if not client.HAVE_FACEPOSE:
+        raise SkipCase('torch is not installed')
+    try:
+        return client.pose_models.get('hopenet')
+    except Exception as e:
+        raise SkipCase(f'Hopenet could not be loaded: {e}')
+
+
+@case('facepose_predict')
+def bench_facepose_predict(frame, gray, rect, shape):
+    from PIL import Image
+    facepose = _facepose()
+    roi_box, _, _ = rec_to_roi_box(rect)
+    crop = Image.fromarray(crop_img(frame, roi_box))
+    return lambda: facepose.predict(crop)
+
+
+@case('facepose_predict_batch')
+def bench_facepose_predict_batch(frame, gray, rect, shape):
+    facepose = _facepose()
+    roi_box, _, _ = rec_to_roi_box(rect)
+    crops = [crop_img(frame, roi_box)]
+    return lambda: facepose.predict_batch(crops)
+
+
+def zmq_send_recv(frame, codec):
+    if not client.HAVE_ZMQ:
+        raise SkipCase('pyzmq is not installed')
+    import zmq
+    from zeromq.SerializingContext import SerializingContext
+
+    context = SerializingContext.instance()
+    address = f"inproc://bench-{codec}-{id(frame)}"
+    receiver = context.socket(zmq.PAIR)
+    receiver.bind(address)
+    sender = context.socket(zmq.PAIR)
+    sender.connect(address)
+    sender.set_codec(codec)
+    # The client publishes a half-resolution frame with the record
+    image = np.ascontiguousarray(cv2.resize(frame, (0, 0), fx=0.5, fy=0.5))
+    data = {'id': 'bench', 'timestamp': 0.0, 'yaw': 0.0, 'pitch': 0.0, 'roll': 0.0}
+
+    def run():
+        sender.send_array(image, data, copy=False)
+        return receiver.recv_array()
+    return run
+
+
+@case('zmq_send_recv')
+def bench_zmq_send_recv(frame, gray, rect, shape):
+    return zmq_send_recv(frame, 'raw')
+
+
+@case('zmq_send_recv_jpeg')
+def bench_zmq_send_recv_jpeg(frame, gray, rect, shape):
+    return zmq_send_recv(frame, 'jpeg')
+
+
+@case('zmq_send_recv_webp')
+def bench_zmq_send_recv_webp(frame, gray, rect, shape):
+    return zmq_send_recv(frame, 'webp')
+
+
+@case('overlay')
+def bench_overlay(frame, gray, rect, shape):
+    renderer = OverlayRenderer()
+    canvas = frame.copy()
+    counter = [0]
+
+    def run():
+        # Change a counter every 10 frames so panel re-rendering is included
+        counter[0] += 1
+        renderer.draw_metrics(canvas, counter[0] // 10, 0, 0, 0.0, 0.0)
+        renderer.draw_face(canvas, rect, shape, 10.0, -5.0, 2.0)
+    return run
+
+
+# ============================================================================
+# Runner
+# ============================================================================
+
+def time_case(fn, min_time=0.5, min_runs=10, max_runs=10000):
+    """
+    Time a callable until both min_time seconds and min_runs calls have elapsed.
+
+    Returns:
+        dict: Run count and latency statistics in milliseconds
+    """
+    fn()
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_runs and (len(times) < min_runs
+                                     or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times = np.array(times) * 1e3
+    return {
+        'runs': len(times),
+        'mean_ms': float(times.mean()),
+        'p50_ms': float(np.percentile(times, 50)),
+        'p95_ms': float(np.percentile(times, 95)),
+        'min_ms': float(times.min()),
+    }
+
+
+def environment():
+    versions = {'python': platform.python_version(), 'numpy': np.__version__,
+                'opencv': cv2.__version__}
+    for module in ('dlib', 'torch', 'zmq'):
+        mod = sys.modules.get(module)
+        if mod is not None:
+            versions[module] = getattr(mod, '__version__', 'unknown')
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'versions': versions,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def run(output, pattern=None, min_time=0.5):
+    inputs = {'synthetic': synthetic_frame(), 'lena': lena_frame()}
+    results = {}
+    print(f"{'case':<32} {'p50 ms':>9} {'p95 ms':>9} {'runs':>7}")
+    for input_name, bgr in inputs.items():
+        prepared = make_input(bgr)
+        for name, setup in CASES.items():
+            key = f"{name}/{input_name}"
+            if pattern and pattern not in key:
+                continue
+            try:
+                fn = setup(*prepared)
+            except SkipCase as e:
+                results[key] = {'skipped': str(e)}
+                print(f"{key:<32} skipped: {e}")
+                continue
+            results[key] = time_case(fn, min_time)
+            r = results[key]
+            print(f"{key:<32} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['runs']:>7}")
+
+    with open(output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"Results written to {output}")
+
+
+def compare(baseline, current, threshold=0.1, metric='p50_ms'):
+    """
+    Print per-case change between two runs and flag regressions.
+
+    Args:
+        baseline: JSON file from an earlier run
+        current: JSON file from the run under test
+        threshold: Relative slowdown that counts as a regression (0.1 = 10%)
+        metric: Statistic to compare
+
+    Returns:
+        list: Names of regressed cases
+    """
+    with open(baseline) as f:
+        before = json.load(f)['results']
+    with open(current) as f:
+        after = json.load(f)['results']
+
+    regressions = []
+    print(f"{'case':<32} {'before':>9} {'after':>9} {'change':>8}")
+    for key in sorted(set(before) | set(after)):
+        old, new = before.get(key, {}), after.get(key, {})
+        if metric not in old or metric not in new:
+            print(f"{key:<32} {'-':>9} {'-':>9} {'n/a':>8}")
+            continue
+        change = new[metric] / old[metric] - 1.0 if old[metric] > 0 else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{key:<32} {old[metric]:>9.3f} {new[metric]:>9.3f} {change:>+8.1%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {threshold:.0%}")
+    else:
+        print(f"\nNo regressions above {threshold:.0%}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Client hot path microbenchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks')
+    run_parser.add_argument('--output', default='bench_results.json')
+    run_parser.add_argument('--filter', default=None,
+                            help='Only run cases whose name contains this text')
+    run_parser.add_argument('--min-time', type=float, default=0.5,
+                            help='Seconds spent timing each case')
+
+    compare_parser = commands.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Relative slowdown flagged as a regression')
+    compare_parser.add_argument('--metric', default='p50_ms', choices=['p50_ms', 'p95_ms', 'mean_ms', 'min_ms'])
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args.output, args.filter, args.min_time)
+    else:
+        sys.exit(1 if compare(args.baseline, args.current, args.threshold, args.metric) else 0)
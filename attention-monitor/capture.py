@@ -0,0 +1,127 @@
+"""
+Threaded camera capture with frame skipping.
+
+The camera is drained with grab() at its native rate so its internal buffer
+never fills up with stale frames, but only the frames the analysis stage will
+consume are retrieve()d (decoded) and converted. Those are handed over through
+a single-slot buffer that always holds the most recent frame.
+"""
+
+import threading
+import time
+
+
+class LatestFrame:
+    """
+    Single-slot buffer that keeps only the newest item.
+
+    put() overwrites whatever is in the slot; get() blocks until an item
+    newer than the last one returned is available. Overwritten items are
+    counted as dropped.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._read_seq = 0
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._seq > self._read_seq:
+                self.dropped += 1
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Return the newest unread item.
+
+        Args:
+            timeout: Seconds to wait (None waits forever)
+
+        Returns:
+            The item, or None on timeout or once the buffer is closed and drained
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > self._read_seq or self._closed,
+                                       timeout=timeout):
+                return None
+            if self._seq == self._read_seq:
+                return None
+            self._read_seq = self._seq
+            return self._item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class CaptureThread(threading.Thread):
+    """
+    Grab frames at full camera rate and publish the ones worth analysing.
+
+    Args:
+        cap: Opened cv2.VideoCapture
+        frame_rate: Frames per second handed to the analysis stage
+        prepare: Optional callable applied to each retrieved BGR frame in
+            the capture thread (colour conversion, flipping, ...)
+    """
+
+    def __init__(self, cap, frame_rate, prepare=None):
+        super().__init__(name='Capture Thread', daemon=True)
+        self.cap = cap
+        self.interval = 1.0 / frame_rate if frame_rate else 0.0
+        self.prepare = prepare
+        self.slot = LatestFrame()
+        self.grabbed = 0
+        self.retrieved = 0
+        self._running = threading.Event()
+        self._running.set()
+
+    def run(self):
+        last = 0.0
+        try:
+            while self._running.is_set():
+                if not self.cap.grab():
+                    break
+                self.grabbed += 1
+
+                timestamp = time.time()
+                if timestamp - last < self.interval:
+                    continue
+
+                ret, frame = self.cap.retrieve()
+                if not ret:
+                    continue
+                last = timestamp
+                self.retrieved += 1
+
+                if self.prepare is not None:
+                    frame = self.prepare(frame)
+                self.slot.put((timestamp, frame))
+        finally:
+            self.slot.close()
+
+    def read(self, timeout=None):
+        """
+        Return the latest prepared frame as (timestamp, frame).
+
+        Returns:
+            tuple or None: None once the camera stops delivering frames
+        """
+        return self.slot.get(timeout=timeout)
+
+    def stop(self):
+        self._running.clear()
+
+    def stats(self):
+        return {
+            'grabbed': self.grabbed,
+            'retrieved': self.retrieved,
+            'dropped': self.slot.dropped,
+        }
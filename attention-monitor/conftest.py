@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The client modules import each other by bare name (they are run from this
+# directory), so make that work when pytest runs from the repository root
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,186 @@
+"""
+Export optimized CPU variants of Hopenet and measure what they cost in accuracy.
+
+Builds the TorchScript, int8 (dynamic and static) and ONNX backends described
+in pose_backends.py from the trained weights, reloads each exported file and
+compares its yaw/pitch/roll against the eager model on face crops taken from
+a recorded video (or still images). Static quantization is calibrated on half
+of the crops and evaluated on the other half.
+
+The results go to model/hopenet_export/manifest.json, which
+`Facepose(backend='auto')` and `main.py --hopenet-backend auto` use to pick
+the fastest variant within the accepted error. Run it on the deployment
+machine: latencies (and int8 kernels) depend on the CPU.
+
+Usage:
+    python export_pose.py --video recordings/lecture.mp4
+    python export_pose.py --backends torchscript,int8-static
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+import main as client
+import pose_backends
+from facepose import load_hopenet
+from preprocess import FacePreprocessor
+
+IMAGE_PATH = Path(__file__).parent.parent / "image" / "lena.jpg"
+
+
+def collect_faces(video=None, images=(), count=64):
+    """
+    Gather RGB face crops the way the client would see them.
+
+    Frames without a detected face are used whole. Every crop is also added
+    mirrored, which doubles the small default image set.
+
+    Returns:
+        list: HxWx3 uint8 RGB crops
+    """
+    frames = []
+    if video is not None:
+        cap = cv2.VideoCapture(str(video))
+        total = cap.get(cv2.CAP_PROP_FRAME_COUNT) or count
+        step = max(1, int(total // count))
+        index = 0
+        while len(frames) < count and cap.grab():
+            if index % step == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    frames.append(client.prepare_frame(frame))
+            index += 1
+        cap.release()
+    else:
+        for path in images:
+            image = cv2.imread(str(path))
+            if image is None:
+                print(f"WARNING: could not read {path}")
+                continue
+            frames.append(client.prepare_frame(image))
+
+    faces = []
+    for frame, gray in frames:
+        rects = client.detect_faces(gray)
+        crops = [client.get_face_roi(frame, rect) for rect in rects] or [frame]
+        for crop in crops:
+            if crop.size > 0:
+                faces.extend([crop, np.ascontiguousarray(crop[:, ::-1])])
+    return faces
+
+
+def make_batches(faces, batch_size, input_size=224):
+    preprocess = FacePreprocessor(input_size)
+    return [preprocess(faces[i:i + batch_size]).copy()
+            for i in range(0, len(faces), batch_size)]
+
+
+def export(name, model, example, calibration, path):
+    """Build one backend and save it to path."""
+    if name == 'onnx':
+        pose_backends.export_onnx(model, example, path)
+        return
+    if name == 'torchscript':
+        module = pose_backends.export_torchscript(model, example)
+    elif name == 'int8-dynamic':
+        module = pose_backends.export_int8_dynamic(model, example)
+    else:
+        module = pose_backends.export_int8_static(model, example, calibration)
+    torch.jit.save(module, str(path))
+
+
+def main(model_path, backends, export_dir, video, images, count, batch_size, input_size):
+    export_dir = Path(export_dir)
+    export_dir.mkdir(parents=True, exist_ok=True)
+
+    model = load_hopenet(model_path)
+    faces = collect_faces(video, images, count)
+    if not faces:
+        print("No frames to calibrate on")
+        return
+    batches = make_batches(faces, batch_size, input_size)
+    # Calibrate and evaluate on different crops when there are enough
+    calibration = batches[::2]
+    evaluation = batches[1::2] or batches
+    example = torch.from_numpy(batches[0])
+    print(f"{len(faces)} face crops in {len(batches)} batches")
+
+    eager = pose_backends.load_backend('eager', model)
+    single = batches[0][:1]
+    latency = pose_backends.measure_latency(eager, single)
+    manifest = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'torch': torch.__version__,
+        'quantized_engine': torch.backends.quantized.engine,
+        'input_size': input_size,
+        'faces': len(faces),
+        'backends': {
+            'eager': {
+                'file': None,
+                **pose_backends.measure_error(eager, eager, evaluation),
+                'latency_p50': float(np.percentile(latency, 50)),
+                'latency_p99': float(np.percentile(latency, 99)),
+            },
+        },
+    }
+
+    for name in backends:
+        path = export_dir / pose_backends.BACKEND_FILES[name]
+        start = time.perf_counter()
+        try:
+            export(name, model, example, calibration, path)
+            backend = pose_backends.load_backend(name, export_dir=export_dir)
+        except Exception as e:
+            print(f"WARNING: Could not export {name}: {e}")
+            continue
+        export_time = time.perf_counter() - start
+
+        latency = pose_backends.measure_latency(backend, single)
+        manifest['backends'][name] = {
+            'file': path.name,
+            **pose_backends.measure_error(backend, eager, evaluation),
+            'latency_p50': float(np.percentile(latency, 50)),
+            'latency_p99': float(np.percentile(latency, 99)),
+            'export_time': export_time,
+        }
+
+    with open(export_dir / pose_backends.MANIFEST_NAME, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"{'backend':>13} {'p50 ms':>7} {'yaw':>6} {'pitch':>6} {'roll':>6} {'max':>6}")
+    for name, entry in manifest['backends'].items():
+        print(f"{name:>13} {entry['latency_p50'] * 1e3:>7.1f} {entry['yaw_error']:>6.2f} "
+              f"{entry['pitch_error']:>6.2f} {entry['roll_error']:>6.2f} {entry['max_error']:>6.2f}")
+    print("Errors are mean absolute degrees against the eager model (max over all angles)")
+    print(f"Fastest with every angle within 2 degrees: "
+          f"{pose_backends.select_backend(2.0, export_dir, input_size)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export optimized Hopenet backends')
+    parser.add_argument('--model-path', default=None, help='Hopenet weights (.pkl)')
+    parser.add_argument('--backends', default='torchscript,int8-dynamic,int8-static,onnx',
+                        help='Comma-separated backends to export')
+    parser.add_argument('--export-dir', default=str(pose_backends.EXPORT_DIR))
+    parser.add_argument('--video', default=None, help='Recorded video to take face crops from')
+    parser.add_argument('--images', nargs='*', default=[IMAGE_PATH],
+                        help='Still images to use when no video is given')
+    parser.add_argument('--frames', type=int, default=64,
+                        help='Frames sampled from the video')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--input-size', type=int, default=224,
+                        help='Face crop size to calibrate and evaluate at (see Facepose)')
+    args = parser.parse_args()
+
+    backends = [name for name in args.backends.split(',') if name]
+    if 'onnx' in backends and not pose_backends.HAVE_ONNXRUNTIME:
+        print("WARNING: onnxruntime is not installed, skipping the ONNX backend")
+        backends.remove('onnx')
+    main(args.model_path, backends, args.export_dir, args.video, args.images,
+         args.frames, args.batch_size, args.input_size)
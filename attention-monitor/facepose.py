@@ -2,30 +2,64 @@
 
 # face pose detection
 import os
+import numpy as np
 import torch
 import torchvision
 from torchvision.transforms import transforms
 import torch.nn.functional as F
+from PIL import Image
 
 import hopenet
+import pose_backends
+from preprocess import FacePreprocessor
+
+
+def default_model_path():
+    # Get the project root directory (parent of attention-monitor)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.path.join(project_root, "model", "hopenet_robust_alpha1.pkl")
+
+
+def load_hopenet(model_path=None):
+    model = hopenet.Hopenet(torchvision.models.resnet.Bottleneck, [3, 4, 6, 3], 66)
+    saved_state_dict = torch.load(model_path or default_model_path(), map_location="cpu")
+    model.load_state_dict(saved_state_dict)
+    model.eval()
+    return model
+
 
 class Facepose:
-    def __init__(self):
-        self.model = hopenet.Hopenet(torchvision.models.resnet.Bottleneck, [3, 4, 6, 3], 66)
-        # Get the project root directory (parent of attention-monitor)
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(script_dir)
-        model_path = os.path.join(project_root, "model", "hopenet_robust_alpha1.pkl")
-        saved_state_dict = torch.load(model_path, map_location="cpu")
-        self.model.load_state_dict(saved_state_dict)
-        self.model.eval()
-
-        self.transformations = transforms.Compose([transforms.Resize(224),
-                                      transforms.CenterCrop(224), transforms.ToTensor(),
+    def __init__(self, model_path=None, fast_preprocess=True, backend='eager',
+                 export_dir=pose_backends.EXPORT_DIR, max_error=2.0, input_size=224):
+        # backend is one of pose_backends.BACKENDS, or 'auto' to use the
+        # fastest exported variant, made at input_size, whose every angle is
+        # within max_error degrees of the eager model
+        if backend == 'auto':
+            backend = pose_backends.select_backend(max_error, export_dir, input_size)
+        self.backend = backend
+        # Exported variants don't need the float32 weights in memory
+        self.model = load_hopenet(model_path) if backend == 'eager' else None
+        self.runner = pose_backends.load_backend(backend, self.model, export_dir)
+
+        # Crops are resized to input_size before inference. Hopenet was
+        # trained at 224, but smaller sizes avoid upsampling small webcam
+        # faces and cut the ResNet-50 cost roughly with the pixel count
+        self.input_size = input_size
+        self.transformations = transforms.Compose([transforms.Resize(input_size),
+                                      transforms.CenterCrop(input_size), transforms.ToTensor(),
                                       transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])])
 
+        # cv2/NumPy path that skips PIL and writes into a reused buffer
+        self.preprocess = FacePreprocessor(input_size) if fast_preprocess else None
+
         self.idx_tensor = torch.FloatTensor([idx for idx in range(66)])
 
+    def warmup(self):
+        # Run one dummy inference so the first real frame doesn't pay for
+        # lazy allocations inside torch
+        self.predict_batch([np.zeros((self.input_size, self.input_size, 3), dtype=np.uint8)])
+
     def predict(self, img):
         # Transform
         img = self.transformations(img)
@@ -33,7 +67,7 @@ class Facepose:
         img = img.view(1, img_shape[0], img_shape[1], img_shape[2])
 
         with torch.no_grad():
-            yaw, pitch, roll = self.model(img)
+            yaw, pitch, roll = torch.from_numpy(self.runner(img.numpy()))
 
             yaw_predicted = F.softmax(yaw, dim=1)
             pitch_predicted = F.softmax(pitch, dim=1)
@@ -43,4 +77,25 @@ class Facepose:
             pitch_predicted = torch.sum(pitch_predicted.view(-1) * self.idx_tensor) * 3 - 99
             roll_predicted = torch.sum(roll_predicted.view(-1) * self.idx_tensor) * 3 - 99
 
-        return yaw_predicted, pitch_predicted, roll_predicted
\ No newline at end of file
+        return yaw_predicted, pitch_predicted, roll_predicted
+
+    def predict_batch(self, rois):
+        # Stack every face ROI (PIL images or RGB ndarrays) into one batch
+        # and run a single forward pass for all of them
+        if len(rois) == 0:
+            empty = np.zeros(0, dtype=np.float32)
+            return empty, empty, empty
+
+        if self.preprocess is not None:
+            arrays = [np.asarray(roi) for roi in rois]
+            batch = self.preprocess(arrays)
+        else:
+            imgs = [roi if isinstance(roi, Image.Image) else Image.fromarray(roi) for roi in rois]
+            batch = torch.stack([self.transformations(img) for img in imgs]).numpy()
+
+        # (3, N, 66) logits -> expected angle in degrees for every face
+        logits = torch.from_numpy(self.runner(batch))
+        angles = torch.matmul(F.softmax(logits, dim=2), self.idx_tensor) * 3 - 99
+
+        angles = angles.numpy()
+        return angles[0], angles[1], angles[2]
@@ -19,7 +19,9 @@ class Hopenet(nn.Module):
         self.layer2 = self._make_layer(block, 128, layers[1], stride=2)
         self.layer3 = self._make_layer(block, 256, layers[2], stride=2)
         self.layer4 = self._make_layer(block, 512, layers[3], stride=2)
-        self.avgpool = nn.AvgPool2d(7)
+        # Adaptive pooling has no parameters, so the 224x224 weights load
+        # unchanged and smaller inputs (e.g. 112 or 160) also work
+        self.avgpool = nn.AdaptiveAvgPool2d(1)
         self.fc_yaw = nn.Linear(512 * block.expansion, num_bins)
         self.fc_pitch = nn.Linear(512 * block.expansion, num_bins)
         self.fc_roll = nn.Linear(512 * block.expansion, num_bins)
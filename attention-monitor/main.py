@@ -12,16 +12,15 @@ The metrics are published via ZeroMQ to a server for real-time visualization.
 """
 
 import argparse
+import functools
 import cv2
 import json
 import os
+import threading
 import time
-import uuid
-from datetime import datetime
 from pathlib import Path
 
 import numpy as np
-from PIL import Image
 from imutils import face_utils
 
 # Optional dependencies with fallback support
@@ -50,8 +49,20 @@ try:
 except ImportError:
     HAVE_FACEPOSE = False
 
-from utils import eye_aspect_ratio, mouth_aspect_ratio, rec_to_roi_box, crop_img, draw_axis
-from zeromq.SerializingContext import SerializingContext
+from attention import AttentionTracker
+from capture import CaptureThread, LatestFrame
+from metrics import ClientMetrics, MetricsServer, StatsLogger, frame_timing
+from model_registry import pose_models
+from pipeline import Pipeline, Stage
+from pnp_pose import PnPPose
+from pose_cache import PoseCache
+from recordio import records_to_columns, write_columns
+from sender import POLICIES, Channel, FrameSender, apply_policy
+from tracking import FaceTracker
+from overlay import OverlayRenderer
+from utils import aspect_ratios, parse_scales, rec_to_roi_box, crop_img
+from zeromq.SerializingContext import (CODECS, METRICS, RECORD_FORMATS, VIDEO,
+                                       SerializingContext, topic)
 
 # ============================================================================
 # Configuration
@@ -73,6 +84,11 @@ ZMQ_PORT = 5556
 # Frame rate control
 FRAME_RATE = 5
 
+# Face detection runs on a downscaled copy of the frame. Scales are tried in
+# order until one finds a face, so (0.5, 1.0) falls back to full resolution
+# for small faces. Rects are always mapped back to full-resolution pixels.
+DETECT_SCALES = (1.0,)
+
 # Eye and mouth thresholds
 EYE_CLOSED_THRESHOLD = 0.15
 YAWN_THRESHOLD = 0.4
@@ -96,26 +112,44 @@ class Dummy:
 # ============================================================================
 
 # Face detection setup
-detector = None
 predictor = None
-haar_cascade = None
+HAAR_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
 
 if HAVE_DLIB:
-    detector = dlib.get_frontal_face_detector()
     predictor = dlib.shape_predictor(str(MODEL_PATH))
-else:
-    haar_cascade = cv2.CascadeClassifier(
-        cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-    )
+
+# dlib's HOG detector and OpenCV's cascade must not be shared between
+# threads, so each thread that detects faces gets its own instance
+_detectors = threading.local()
+
+# Detect-then-track mode (see tracking.py); None runs detection every frame
+face_tracker = None
+
+# Reuses head poses of faces that haven't moved (see pose_cache.py); None
+# estimates every face on every frame
+pose_cache = None
 
 # AWS Kinesis setup
 kinesis = None
 if ENABLE_KINESIS:
     kinesis = boto3.client('kinesis', region_name=AWS_REGION)
 
+# Pose model registry: loaded once per process and shared by every face.
+# Hopenet is the default; 'pnp' fits a 3D face model to the dlib landmarks.
+if HAVE_FACEPOSE:
+    pose_models.register('hopenet', Facepose)
+pose_models.register('pnp', PnPPose)
+
 # ZeroMQ setup
 context = SerializingContext()
 socket = context.socket(zmq.PUB) if HAVE_DLIB else None
+# Frames go on a socket of their own so each channel gets its own
+# high-water mark and backpressure policy (see sender.py)
+video_socket = context.socket(zmq.PUB) if HAVE_DLIB else None
+
+# Encodes and sends published frames on its own thread (see sender.py);
+# None sends from the publishing thread
+frame_sender = None
 
 
 # ============================================================================
@@ -153,63 +187,249 @@ def open_camera():
     return None
 
 
+def prepare_frame(frame):
+    """
+    Convert a raw camera frame for analysis.
+    
+    Args:
+        frame: BGR frame from the camera
+        
+    Returns:
+        tuple: (mirrored RGB frame, grayscale frame)
+    """
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    frame = cv2.flip(frame, 1)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame, gray
+
+
 # ============================================================================
 # Face Detection and Metrics
 # ============================================================================
 
-def detect_faces(gray_frame):
+def get_detector():
     """
-    Detect faces in a grayscale frame.
+    Return this thread's face detector, creating it on first use.
+    
+    Returns:
+        dlib frontal face detector, or cv2.CascadeClassifier without dlib
+    """
+    detector = getattr(_detectors, 'detector', None)
+    if detector is None:
+        if HAVE_DLIB:
+            detector = dlib.get_frontal_face_detector()
+        else:
+            detector = cv2.CascadeClassifier(HAAR_CASCADE_PATH)
+        _detectors.detector = detector
+    return detector
+
+
+def scale_faces(faces, factor):
+    """
+    Map face rectangles between image scales.
     
     Args:
-        gray_frame: Grayscale image
+        faces: dlib rectangles or (x, y, w, h) array from the Haar cascade
+        factor: Multiplier applied to every coordinate
         
     Returns:
-        list: Face rectangles/regions
+        list or ndarray: Rectangles in the same format, scaled
     """
+    if factor == 1.0 or len(faces) == 0:
+        return faces
     if HAVE_DLIB:
-        return detector(gray_frame, 0)
+        return [dlib.rectangle(int(round(r.left() * factor)), int(round(r.top() * factor)),
+                               int(round(r.right() * factor)), int(round(r.bottom() * factor)))
+                for r in faces]
+    return np.round(np.asarray(faces) * factor).astype(int)
+
+
+def detect_faces_at_scale(gray_frame, scale=1.0):
+    """
+    Detect faces on a downscaled copy of a grayscale frame.
+    
+    Args:
+        gray_frame: Full-resolution grayscale image
+        scale: Downscale factor in (0, 1]
+        
+    Returns:
+        list: Face rectangles/regions in full-resolution coordinates
+    """
+    small = gray_frame
+    if scale != 1.0:
+        small = cv2.resize(gray_frame, (0, 0), fx=scale, fy=scale,
+                           interpolation=cv2.INTER_AREA)
+
+    if HAVE_DLIB:
+        faces = get_detector()(small, 0)
     else:
+        haar_cascade = get_detector()
+        min_size = max(1, int(round(60 * scale)))
         faces = haar_cascade.detectMultiScale(
-            gray_frame,
+            small,
             scaleFactor=1.1,
             minNeighbors=5,
-            minSize=(60, 60)
-        ) if haar_cascade is not None else []
-        return faces
+            minSize=(min_size, min_size)
+        ) if not haar_cascade.empty() else []
+    return scale_faces(faces, 1.0 / scale)
 
 
-def get_eye_metrics(shape):
+def detect_faces(gray_frame, scales=None):
     """
-    Calculate eye aspect ratio from facial landmarks.
+    Detect faces in a grayscale frame.
     
     Args:
-        shape: Facial landmarks (68 points)
+        gray_frame: Grayscale image
+        scales: Downscale factors to try in order (defaults to DETECT_SCALES)
         
     Returns:
-        float: Average eye aspect ratio
+        list: Face rectangles/regions
     """
-    if not HAVE_DLIB:
-        return 0.3
+    faces = []
+    for scale in scales or DETECT_SCALES:
+        faces = detect_faces_at_scale(gray_frame, scale)
+        if len(faces) > 0:
+            break
+    return faces
 
-    left_eye = shape[36:42]
-    right_eye = shape[42:48]
-    left_ear = eye_aspect_ratio(left_eye)
-    right_ear = eye_aspect_ratio(right_eye)
-    return (left_ear + right_ear) / 2.0
 
+def get_face_metrics(shapes):
+    """
+    Calculate eye and mouth aspect ratios for several faces at once.
+    
+    Args:
+        shapes: Facial landmarks for each face, stacked as (N, 68, 2)
+        
+    Returns:
+        tuple: (ear, mar) arrays of length N
+    """
+    if len(shapes) == 0:
+        return np.zeros(0), np.zeros(0)
+
+    _, _, ear, mar = aspect_ratios(np.stack(shapes))
+    return ear, mar
 
-def get_mouth_metrics(shape):
+
+def get_face_roi(frame, rect):
     """
-    Calculate mouth aspect ratio from facial landmarks.
+    Crop the head pose region of interest for a face.
     
     Args:
-        shape: Facial landmarks (68 points)
+        frame: RGB frame
+        rect: Face rectangle
         
     Returns:
-        float: Mouth aspect ratio
+        ndarray: RGB crop (may be empty if the face is off-frame)
     """
-    return mouth_aspect_ratio(shape[60:69]) if HAVE_DLIB else 0.1
+    if HAVE_DLIB:
+        roi_box, _, _ = rec_to_roi_box(rect)
+        return crop_img(frame, roi_box)
+
+    x, y, w, h = int(rect[0]), int(rect[1]), int(rect[2]), int(rect[3])
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(frame.shape[1], x + w), min(frame.shape[0], y + h)
+    return frame[y0:y1, x0:x1]
+
+
+def get_pose_model():
+    """Return the active pose model, or None if it failed to load (not retried)."""
+    try:
+        return pose_models.get()
+    except Exception:
+        return None
+
+
+def estimate_poses(rois):
+    """
+    Estimate head pose for a list of face crops with one batched forward pass.
+    
+    Args:
+        rois: RGB face crops, possibly from several frames
+        
+    Returns:
+        list: One (yaw, pitch, roll) tuple per crop; each value supports .item()
+    """
+    poses = [(Dummy(0), Dummy(0), Dummy(0)) for _ in rois]
+    if len(rois) == 0:
+        return poses
+
+    valid = [i for i, roi in enumerate(rois) if roi.size > 0]
+    facepose = get_pose_model()
+    if not valid or facepose is None or getattr(facepose, 'uses_landmarks', False):
+        return poses
+
+    try:
+        yaws, pitches, rolls = facepose.predict_batch([rois[i] for i in valid])
+    except Exception:
+        return poses
+
+    for j, i in enumerate(valid):
+        poses[i] = (yaws[j], pitches[j], rolls[j])
+    return poses
+
+
+def estimate_poses_from_landmarks(shapes, frame_shape):
+    """
+    Estimate head pose from 68-point landmarks with the 'pnp' backend.
+    
+    Args:
+        shapes: (68, 2) landmark arrays
+        frame_shape: Shape of the frame the landmarks came from
+        
+    Returns:
+        list: One (yaw, pitch, roll) tuple per face; each value supports .item()
+    """
+    poses = [(Dummy(0), Dummy(0), Dummy(0)) for _ in shapes]
+    model = get_pose_model()
+    if len(shapes) == 0 or model is None or not getattr(model, 'uses_landmarks', False):
+        return poses
+
+    try:
+        yaws, pitches, rolls = model.predict_landmarks(shapes, frame_shape)
+    except Exception:
+        return poses
+
+    # Faces solvePnP could not fit come back as NaN and keep the default pose
+    for i, pose in enumerate(zip(yaws, pitches, rolls)):
+        if not np.isnan(pose).any():
+            poses[i] = pose
+    return poses
+
+
+def get_head_poses(frame, rects, shapes=None):
+    """
+    Estimate head pose for every face in a frame with one batched forward pass.
+    
+    With the pose cache enabled, only faces that changed since their pose was
+    last estimated go through the model.
+    
+    Args:
+        frame: RGB frame
+        rects: Face rectangles
+        shapes: Facial landmarks per rect, used by landmark-based backends
+            and the landmark change measure
+        
+    Returns:
+        list: One (yaw, pitch, roll) tuple per rect; each value supports .item()
+    """
+    if pose_cache is None or len(rects) == 0:
+        return estimate_head_poses(frame, rects, shapes)
+
+    def estimate(indices):
+        subset = None if shapes is None or len(shapes) != len(rects) \
+            else [shapes[i] for i in indices]
+        return estimate_head_poses(frame, [rects[i] for i in indices], subset)
+
+    return pose_cache(frame, rects, shapes, estimate, roi=get_face_roi)
+
+
+def estimate_head_poses(frame, rects, shapes=None):
+    """Run the active pose model on every face, bypassing the pose cache."""
+    if getattr(get_pose_model(), 'uses_landmarks', False):
+        if shapes is None or len(shapes) != len(rects):
+            return [(Dummy(0), Dummy(0), Dummy(0)) for _ in rects]
+        return estimate_poses_from_landmarks(shapes, frame.shape)
+    return estimate_poses([get_face_roi(frame, rect) for rect in rects])
 
 
 def get_head_pose(frame, rect, shape=None):
@@ -224,44 +444,313 @@ def get_head_pose(frame, rect, shape=None):
     Returns:
         tuple: (yaw, pitch, roll) as Dummy objects or actual values
     """
-    if not HAVE_FACEPOSE:
-        return Dummy(0), Dummy(0), Dummy(0)
+    return get_head_poses(frame, [rect], None if shape is None else [shape])[0]
+
+
+# ============================================================================
+# Frame Analysis Stages
+# ============================================================================
+
+def detect_stage(job):
+    """Detect (or track) faces in the job's grayscale frame."""
+    if face_tracker is not None:
+        job['rects'] = face_tracker(job['gray'])
+        # Single detect worker (see build_pipeline), so this is still our frame
+        job['track_frame'] = face_tracker.frames
+    else:
+        job['rects'] = detect_faces(job['gray'])
+    return job
+
 
-    # Extract region of interest
+def landmark_stage(job):
+    """Compute landmarks and EAR/MAR for every detected face."""
+    rects = job['rects']
     if HAVE_DLIB:
-        roi_box, _, _ = rec_to_roi_box(rect)
-        roi_img = crop_img(frame, roi_box)
+        job['shapes'] = [face_utils.shape_to_np(predictor(job['gray'], rect)) for rect in rects]
+        job['ears'], job['mars'] = get_face_metrics(job['shapes'])
+        if face_tracker is not None:
+            face_tracker.observe(job['shapes'], job.get('track_frame'))
     else:
-        x, y, w, h = int(rect[0]), int(rect[1]), int(rect[2]), int(rect[3])
-        x0, y0 = max(0, x), max(0, y)
-        x1, y1 = min(frame.shape[1], x + w), min(frame.shape[0], y + h)
-        roi_img = frame[y0:y1, x0:x1]
+        job['shapes'] = []
+        job['ears'], job['mars'] = np.full(len(rects), 0.3), np.full(len(rects), 0.1)
+    return job
+
+
+def pose_stage(job):
+    """Estimate head pose for every detected face in one batch."""
+    job['poses'] = get_head_poses(job['frame'], job['rects'], job['shapes'])
+    return job
+
+
+def pose_stage_batch(jobs):
+    """Estimate head pose for every face across several jobs in one batch."""
+    if pose_cache is not None or getattr(get_pose_model(), 'uses_landmarks', False):
+        # The cache has to see frames in order, and solvePnP works per face,
+        # so there is nothing to gain from batching
+        for job in jobs:
+            pose_stage(job)
+        return jobs
+
+    rois = [get_face_roi(job['frame'], rect) for job in jobs for rect in job['rects']]
+    poses = estimate_poses(rois)
+    for job in jobs:
+        n = len(job['rects'])
+        job['poses'], poses = poses[:n], poses[n:]
+    return jobs
+
+
+ANALYSIS_STAGES = [
+    ('detect', detect_stage),
+    ('landmarks', landmark_stage),
+    ('pose', pose_stage),
+]
+
+
+def analyse_frame(job, stages=None):
+    """Run every analysis stage on a job, in order, on this thread."""
+    for _, stage in stages or ANALYSIS_STAGES:
+        job = stage(job)
+    return job
+
+
+def timed_stages(metrics):
+    """Return ANALYSIS_STAGES with every handler timed into `metrics`."""
+    return [(name, metrics.timed(name, stage)) for name, stage in ANALYSIS_STAGES]
+
+
+def job_faces(job):
+    """Return the (ear, mar, yaw, pitch, roll) floats of every face in a job."""
+    return [(float(ear), float(mar), yaw.item(), pitch.item(), roll.item())
+            for ear, mar, (yaw, pitch, roll) in zip(job['ears'], job['mars'], job['poses'])]
 
-    if roi_img.size == 0:
-        return Dummy(0), Dummy(0), Dummy(0)
 
-    img = Image.fromarray(roi_img)
+class RecordPublisher:
+    """
+    Turn analysed frames into records and publish them.
+
+    Updates the blink/yawn/focus state machines, forwards records to
+    Kinesis when enabled and publishes the latest record over ZeroMQ on
+    metrics/<userid>, and a half-resolution frame on video/<userid> at up
+    to `video_rate` frames per second. Must see frames in capture order.
+    Messages carry the frame's capture time ('captured') and the time they
+    were sent ('sent') so receivers can measure end-to-end latency.
+    
+    Args:
+        userid: User identifier
+        tracker: AttentionTracker for this user
+        record_timing: Attach the frame's per-stage latencies (ms) to the
+            published message as data['timing']
+        video_rate: Frames per second published on the video channel
+            (None = every frame, 0 = none)
+    """
+
+    def __init__(self, userid, tracker, record_timing=False, video_rate=None):
+        self.userid = str(userid)
+        self.tracker = tracker
+        self.record_timing = record_timing
+        self.video_rate = video_rate
+        self.records = []
+        self._last_video = None
+
+    def __call__(self, job):
+        for record in self.tracker.update(job['timestamp'], job_faces(job)):
+            # Send to Kinesis if enabled
+            if ENABLE_KINESIS:
+                self.records.append({
+                    'Data': bytes(json.dumps(record), 'utf-8'),
+                    'PartitionKey': self.userid
+                })
+                if len(self.records) >= 10:
+                    kinesis.put_records(StreamName=KINESIS_STREAM, Records=self.records)
+                    self.records = []
+
+        # Publish via ZeroMQ
+        last_record = self.tracker.last_record
+        job['published'] = last_record is not None
+        job['video_published'] = False
+        if last_record is not None:
+            data = {'id': self.userid, 'record': last_record, 'captured': job['timestamp']}
+            if self.record_timing:
+                data['timing'] = frame_timing(job)
+            frame_stream = None
+            if self._video_due(job['timestamp']):
+                frame_stream = cv2.resize(job['frame'], (0, 0), fx=0.5, fy=0.5)
+                job['video_published'] = True
+            publish(frame_stream, data)
+        return job
+
+    def _video_due(self, timestamp):
+        if self.video_rate == 0:
+            return False
+        if (self.video_rate is not None and self._last_video is not None
+                and timestamp - self._last_video < 1.0 / self.video_rate):
+            return False
+        self._last_video = timestamp
+        return True
+
+
+def parse_workers(spec):
+    """
+    Parse a per-stage worker count spec such as "detect=2,pose=2".
+    
+    Args:
+        spec: Comma-separated stage=count pairs (may be None)
+        
+    Returns:
+        dict: Stage name -> worker count
+    """
+    workers = {}
+    for item in filter(None, (spec or '').split(',')):
+        name, _, count = item.partition('=')
+        workers[name.strip()] = int(count)
+    return workers
+
+
+def build_pipeline(sink, workers=None, stages=None):
+    """
+    Build a pipelined version of the analysis stages.
+    
+    Args:
+        sink: Callable receiving finished jobs in capture order
+        workers: Optional dict of stage name -> worker count
+        stages: (name, handler) pairs (defaults to ANALYSIS_STAGES)
+        
+    Returns:
+        Pipeline: Not yet started
+    """
+    workers = dict(workers or {})
+    if face_tracker is not None:
+        # The tracker carries state from frame to frame, and the landmarks
+        # backend needs its observations in frame order
+        for name in ('detect', 'landmarks'):
+            if workers.get(name, 1) > 1:
+                print(f"WARNING: tracking mode runs a single {name} worker")
+                workers[name] = 1
+    if pose_cache is not None and workers.get('pose', 1) > 1:
+        # The pose cache keeps per-face state and has to see frames in order
+        print("WARNING: the pose cache runs a single pose worker")
+        workers['pose'] = 1
+    stages = [Stage(name, handler, workers=workers.get(name, 1))
+              for name, handler in stages or ANALYSIS_STAGES]
+    return Pipeline(stages, sink)
+
+
+def configure(track_interval=0, tracker_backend='correlation', detect_scales=None,
+              pose_backend=None, hopenet_backend=None, pose_input_size=None,
+              pose_cache_threshold=0.0, pose_cache_max_age=10, pose_cache_measure='landmarks'):
+    """
+    Apply face localisation and pose settings shared by the live and offline modes.
+    
+    Args:
+        track_interval: Run full face detection every N frames and track
+            faces in between (0 detects on every frame)
+        tracker_backend: 'correlation' or 'landmarks'
+        detect_scales: Face detection downscale factors in (0, 1] (see
+            DETECT_SCALES); raises ValueError otherwise
+        pose_backend: Registered pose model to use ('hopenet' or 'pnp')
+        hopenet_backend: Hopenet inference backend (see pose_backends.py),
+            or 'auto' for the fastest exported variant within 2 degrees
+        pose_input_size: Hopenet input size in pixels (default 224)
+        pose_cache_threshold: Reuse a face's pose while it changes less than
+            this (see pose_cache.py); 0 disables the cache
+        pose_cache_max_age: Re-estimate cached poses after this many frames
+        pose_cache_measure: 'landmarks' or 'pixels'
+    """
+    global face_tracker, pose_cache, DETECT_SCALES
+
+    if (hopenet_backend or pose_input_size) and HAVE_FACEPOSE:
+        pose_models.register('hopenet', functools.partial(
+            Facepose, backend=hopenet_backend or 'eager', input_size=pose_input_size or 224))
+    if pose_backend:
+        pose_models.activate(pose_backend)
+
+    if detect_scales:
+        DETECT_SCALES = parse_scales(detect_scales)
+
+    face_tracker = None
+    if track_interval > 0:
+        face_tracker = FaceTracker(detect_faces, interval=track_interval,
+                                   backend=tracker_backend)
+
+    pose_cache = None
+    if pose_cache_threshold > 0:
+        pose_cache = PoseCache(pose_cache_threshold, pose_cache_max_age, pose_cache_measure)
+
+
+def load_pose_model():
+    """Load the active pose model up front so the first frame doesn't pay for it."""
     try:
-        facepose = Facepose()
-        return facepose.predict(img)
-    except Exception:
-        return Dummy(0), Dummy(0), Dummy(0)
+        pose_models.get()
+        for name, stat in pose_models.stats().items():
+            print(f"Loaded pose model '{name}' in {stat['load_time']:.2f}s "
+                  f"(+{stat['rss_delta'] / 2**20:.0f} MB resident)")
+    except Exception as e:
+        print(f"WARNING: Could not load pose model: {e}")
 
 
 # ============================================================================
 # Main Processing Loop
 # ============================================================================
 
-def main(userid, host):
+def main(userid, host, pipelined=False, workers=None, track_interval=0,
+         tracker_backend='correlation', detect_scales=None, headless=False,
+         pose_backend=None, hopenet_backend=None, pose_input_size=None,
+         pose_cache_threshold=0.0, pose_cache_max_age=10, pose_cache_measure='landmarks',
+         metrics_port=0, stats_interval=0, record_timing=False, codec='raw', quality=None,
+         bandwidth=0, video_rate=None, record_format='json', metrics_policy='drop-oldest',
+         video_policy='latest', queue_size=64, late_after=0.5):
     """
     Main attention monitoring loop.
     
+    Every stage is timed into a ClientMetrics (see metrics.py); the overhead
+    is a few microseconds per stage.
+    
     Args:
         userid: User identifier
         host: ZeroMQ server host
+        pipelined: Run detection, landmarks, pose and publishing on
+            separate worker threads instead of serially
+        workers: Optional dict of stage name -> worker count (pipelined only)
+        track_interval: Run full face detection every N frames and track
+            faces in between (0 detects on every frame)
+        tracker_backend: 'correlation' or 'landmarks'
+        detect_scales: Face detection downscale factors (see DETECT_SCALES)
+        headless: Skip all preview window work (stop with Ctrl+C)
+        pose_backend: Registered pose model to use ('hopenet' or 'pnp')
+        hopenet_backend: Hopenet inference backend, or 'auto'
+        pose_input_size: Hopenet input size in pixels (default 224)
+        pose_cache_threshold: Reuse poses of faces that changed less than
+            this; 0 disables the cache
+        pose_cache_max_age: Re-estimate cached poses after this many frames
+        pose_cache_measure: 'landmarks' or 'pixels'
+        metrics_port: Serve Prometheus metrics on 127.0.0.1:<port>/metrics (0 = off)
+        stats_interval: Print a stage latency summary every N seconds (0 = off)
+        record_timing: Publish each frame's stage latencies with its record
+        codec: Frame codec for published frames ('raw', 'jpeg', 'webp', 'png')
+        quality: Codec quality (JPEG/WebP 0-100, PNG compression 0-9)
+        bandwidth: Frame bandwidth budget in kilobytes per second (0 = unlimited)
+        video_rate: Frames per second published on the video channel
+            (None = every analysed frame, 0 = metrics only)
+        record_format: 'json' or 'binary' encoding of metrics messages
+        metrics_policy: Backpressure policy of the metrics channel (see sender.py)
+        video_policy: Backpressure policy of the video channel
+        queue_size: Messages a 'drop-oldest' or 'block' channel may queue
+        late_after: Seconds after capture a sent message counts as late
     """
+    global frame_sender
+
+    configure(track_interval, tracker_backend, detect_scales, pose_backend, hopenet_backend,
+              pose_input_size, pose_cache_threshold, pose_cache_max_age, pose_cache_measure)
+
     # Connect to ZeroMQ server
+    apply_policy(socket, metrics_policy, queue_size)
+    apply_policy(video_socket, video_policy, queue_size)
     socket.connect(f"tcp://{host}:{ZMQ_PORT}")
+    video_socket.connect(f"tcp://{host}:{ZMQ_PORT}")
+    video_socket.set_codec(codec, quality, bandwidth * 1000 or None)
+    socket.set_record_format(record_format)
+
+    load_pose_model()
 
     # Open camera
     cap = open_camera()
@@ -269,173 +758,311 @@ def main(userid, host):
         print("ERROR: Could not open a camera. Try setting CAM_INDEX=0 or 1.")
         return
 
-    # Metrics tracking
-    blink_count = 0
-    yawn_count = 0
-    lost_focus_count = 0
-    lost_focus_duration = 0
-    face_not_present_duration = 0
-
-    # State tracking
-    eye_closed = False
-    yawning = False
-    lost_focus = False
-    focus_timer = None
-    face_timer = None
-
-    # Records buffer for Kinesis
-    records = []
-    last_record = None
-
-    # FPS control
-    prev_time = time.time()
-    shape = None
-    center_x = center_y = 0
+    tracker = AttentionTracker(userid, EYE_CLOSED_THRESHOLD, YAWN_THRESHOLD,
+                               FOCUS_YAW_THRESHOLD)
+    renderer = None if headless else OverlayRenderer()
+
+    metrics = ClientMetrics()
+    stages = timed_stages(metrics)
+    record_publisher = metrics.timed(
+        'publish', RecordPublisher(userid, tracker, record_timing, video_rate))
+
+    def publisher(job):
+        job = record_publisher(job)
+        # Capture-to-publish latency, including any time spent queued
+        metrics.observe('frame_age', time.time() - job['timestamp'])
+        metrics.count('analysed')
+        # Nothing is published until the tracker has its first record
+        metrics.count('published' if job['published'] else 'skipped')
+        if job['video_published']:
+            metrics.count('video')
+        return job
+
+    def prepare(frame):
+        with metrics.time('prepare'):
+            return prepare_frame(frame)
+
+    # Capture runs on its own thread and only decodes frames we will analyse
+    capture = CaptureThread(cap, FRAME_RATE, prepare=prepare)
+    capture.start()
+    metrics.add_source('capture', capture.stats)
+
+    def timed_send(send):
+        # Only sends the socket accepted are timed, not refused retries
+        def run(item, flags):
+            start = time.perf_counter()
+            send(*item, flags=flags)
+            metrics.observe('send', time.perf_counter() - start)
+        return run
+
+    frame_sender = FrameSender({
+        METRICS: Channel(timed_send(send_metrics), metrics_policy, queue_size, late_after),
+        VIDEO: Channel(timed_send(send_video), video_policy, queue_size, late_after),
+    })
+    frame_sender.start()
+    metrics.add_source('sender', frame_sender.stats)
+
+    metrics_server = stats_logger = None
+    if metrics_port:
+        metrics_server = MetricsServer(metrics, metrics_port).start()
+        print(f"Serving metrics at http://127.0.0.1:{metrics_server.port}/metrics")
+    if stats_interval:
+        stats_logger = StatsLogger(metrics, stats_interval)
+        stats_logger.start()
+
+    pipeline = None
+    if pipelined:
+        # Finished frames go to the display through a latest-frame slot so
+        # drawing stays on the main thread
+        display = LatestFrame()
+
+        def sink(job):
+            publisher(job)
+            display.put(job)
+
+        pipeline = build_pipeline(sink, workers, stages)
+        pipeline.start()
+        metrics.add_source('pipeline', lambda: {
+            f"{name}_{key}": value for name, stat in pipeline.stats().items()
+            for key, value in stat.items()})
+
+        def feed():
+            while True:
+                item = capture.read()
+                if item is None:
+                    display.close()
+                    return
+                timestamp, (frame, gray) = item
+                pipeline.submit({'timestamp': timestamp, 'frame': frame, 'gray': gray})
+
+        threading.Thread(target=feed, name='Feeder Thread', daemon=True).start()
 
     print(f"Starting attention monitor for user {userid}")
     print(f"Connecting to ZeroMQ server at tcp://{host}:{ZMQ_PORT}")
 
     try:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = cv2.flip(frame, 1)
-            frame_display = frame.copy()
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # FPS control
-            time_elapsed = time.time() - prev_time
-            if time_elapsed <= 1.0 / FRAME_RATE:
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+        while True:
+            if pipelined:
+                job = display.get(timeout=1.0)
+            else:
+                item = capture.read(timeout=1.0)
+                job = None
+                if item is not None:
+                    timestamp, (frame, gray) = item
+                    job = publisher(analyse_frame(
+                        {'timestamp': timestamp, 'frame': frame, 'gray': gray}, stages))
+
+            if job is None:
+                if not capture.is_alive():
+                    break
+                if not headless and cv2.waitKey(1) & 0xFF == ord('q'):
                     break
                 continue
 
-            prev_time = time.time()
+            if headless:
+                continue
 
-            # Detect faces
-            rects = detect_faces(gray)
-
-            if len(rects) == 0:
-                if face_timer is None:
-                    face_timer = time.time()
-                face_not_present_duration += time.time() - face_timer
-                face_timer = time.time()
-            else:
-                face_timer = None
-
-            # Process each detected face
-            for rect in rects:
-                # Get landmarks
-                if HAVE_DLIB:
-                    shape = predictor(gray, rect)
-                    shape = face_utils.shape_to_np(shape)
-
-                # Get metrics
-                ear = get_eye_metrics(shape) if shape is not None else 0.3
-                mar = get_mouth_metrics(shape) if shape is not None else 0.1
-
-                # Blink detection
-                if ear < EYE_CLOSED_THRESHOLD:
-                    eye_closed = True
-                elif ear > EYE_CLOSED_THRESHOLD and eye_closed:
-                    blink_count += 1
-                    eye_closed = False
-
-                # Yawn detection
-                if mar > YAWN_THRESHOLD:
-                    yawning = True
-                elif mar < YAWN_THRESHOLD * 0.5 and yawning:
-                    yawn_count += 1
-                    yawning = False
-
-                # Get head pose
-                yaw, pitch, roll = get_head_pose(frame, rect, shape)
-
-                # Focus loss detection
-                if yaw.item() < -FOCUS_YAW_THRESHOLD or yaw.item() > FOCUS_YAW_THRESHOLD:
-                    lost_focus = True
-                    if focus_timer is None:
-                        focus_timer = time.time()
-                    lost_focus_duration += time.time() - focus_timer
-                    focus_timer = time.time()
-                elif -FOCUS_YAW_THRESHOLD <= yaw.item() <= FOCUS_YAW_THRESHOLD and lost_focus:
-                    lost_focus_count += 1
-                    lost_focus = False
-                    focus_timer = None
-
-                # Create record
-                if HAVE_DLIB:
-                    center_x = (rect.left() + rect.right()) / 2
-                    center_y = (rect.top() + rect.bottom()) / 2
-                else:
-                    center_x = rect[0] + rect[2] / 2
-                    center_y = rect[1] + rect[3] / 2
-
-                last_record = {
-                    'id': str(userid),
-                    'sortKey': str(uuid.uuid1()),
-                    'timestamp': datetime.now().timestamp(),
-                    'yaw': yaw.item(),
-                    'pitch': pitch.item(),
-                    'roll': roll.item(),
-                    'ear': ear,
-                    'blink_count': blink_count,
-                    'mar': mar,
-                    'yawn_count': yawn_count,
-                    'lost_focus_count': lost_focus_count,
-                    'lost_focus_duration': lost_focus_duration,
-                    'face_not_present_duration': face_not_present_duration
-                }
-
-                # Send to Kinesis if enabled
-                if ENABLE_KINESIS:
-                    records.append({
-                        'Data': bytes(json.dumps(last_record), 'utf-8'),
-                        'PartitionKey': str(userid)
-                    })
-                    if len(records) >= 10:
-                        kinesis.put_records(StreamName=KINESIS_STREAM, Records=records)
-                        records = []
-
-            # Publish via ZeroMQ
-            if last_record is not None:
-                data = {'id': str(userid), 'record': last_record}
-                frame_stream = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-                publish(frame_stream, data)
-
-            # Draw metrics on display frame
-            draw_metrics(frame_display, blink_count, yawn_count, lost_focus_count,
-                        lost_focus_duration, face_not_present_duration)
-
-            # Draw landmarks and pose if available
-            if HAVE_DLIB and shape is not None and len(rects) > 0:
-                rect = rects[0]
-                draw_border(frame_display, (rect.left(), rect.top()),
-                           (rect.left() + rect.width(), rect.top() + rect.height()),
-                           (255, 255, 255), 1, 10, 20)
-                draw_axis(frame_display, yaw.item(), pitch.item(), roll.item(),
-                         tdx=int(center_x), tdy=int(center_y), size=100)
-                for idx, (x, y) in enumerate(shape):
-                    cv2.circle(frame_display, (x, y), 2, (255, 255, 0), -1)
-                    if idx in range(36, 48):  # Eyes
-                        cv2.circle(frame_display, (x, y), 2, (255, 0, 255), -1)
-                    elif idx in range(60, 68):  # Mouth
-                        cv2.circle(frame_display, (x, y), 2, (0, 255, 255), -1)
-
-            cv2.imshow('Attention Monitor', cv2.cvtColor(frame_display, cv2.COLOR_RGB2BGR))
+            with metrics.time('render'):
+                render(job, tracker, renderer)
 
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
 
+    except KeyboardInterrupt:
+        pass
     finally:
+        capture.stop()
+        capture.join(timeout=1.0)
+        if pipeline is not None:
+            pipeline.stop()
+            for name, stat in pipeline.stats().items():
+                print(f"  {name}: {stat}")
+        if face_tracker is not None:
+            print(f"Face tracking: {face_tracker.stats()}")
+        if pose_cache is not None:
+            print(f"Pose cache: {pose_cache.stats()}")
+        frame_sender.close()
+        frame_sender = None
+        if video_socket.budget is not None:
+            print(f"Bandwidth budget: {video_socket.budget.stats()}")
+        if stats_logger is not None:
+            stats_logger.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        for name, stat in metrics.summary()['stages'].items():
+            print(f"  {name}: p50 {stat['p50_ms']:.1f} ms, p95 {stat['p95_ms']:.1f} ms "
+                  f"({stat['count']} in the last {metrics.window:.0f}s)")
         cap.release()
-        cv2.destroyAllWindows()
+        if not headless:
+            cv2.destroyAllWindows()
         print(f"Attention monitor stopped for user {userid}")
 
 
+# ============================================================================
+# Offline Video Analysis
+# ============================================================================
+
+def measure_video(path, start=0.0, end=None, sample_rate=FRAME_RATE, batch_frames=8):
+    """
+    Run detection, landmarks and head pose over a recorded video.
+    
+    Frames are sampled on a fixed grid of media timestamps (aligned to 0, so
+    adjacent time ranges sample exactly the frames a single pass would).
+    Head pose is batched across `batch_frames` frames. Face tracks and
+    cached poses start empty on every call, so with --track-interval or
+    --pose-cache a time range can come out slightly different from the same
+    frames inside a longer pass.
+    
+    Args:
+        path: Video file path
+        start: Media time in seconds to start at
+        end: Media time in seconds to stop before (None = end of video)
+        sample_rate: Frames per second of media time to analyse (0 = all)
+        batch_frames: Frames whose faces share one pose inference
+        
+    Returns:
+        tuple: (list of (timestamp, faces) per analysed frame, counters dict)
+    """
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {path}")
+
+    # Tracks and cached poses belong to faces of whatever was measured before
+    if face_tracker is not None:
+        face_tracker.reset()
+    if pose_cache is not None:
+        pose_cache.reset()
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    interval = 1.0 / sample_rate if sample_rate else 0.0
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000.0)
+    first_index = int(round(cap.get(cv2.CAP_PROP_POS_FRAMES)))
+
+    frames = []
+    pending = []
+
+    def flush():
+        pose_stage_batch(pending)
+        frames.extend((job['timestamp'], job_faces(job)) for job in pending)
+        pending.clear()
+
+    decoded = 0
+    next_time = np.ceil(start / interval - 1e-6) * interval if interval else start
+    media_time = start
+    try:
+        while cap.grab():
+            decoded += 1
+            media_time = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if media_time <= 0 and first_index + decoded > 1 and fps > 0:
+                # Some backends don't report timestamps; fall back to frame index
+                media_time = (first_index + decoded - 1) / fps
+            if end is not None and media_time >= end - 1e-6:
+                break
+
+            # Sample on a fixed media-time grid
+            if media_time + 1e-6 < next_time:
+                continue
+            if interval:
+                while next_time <= media_time + 1e-6:
+                    next_time += interval
+
+            ret, frame = cap.retrieve()
+            if not ret:
+                continue
+
+            frame, gray = prepare_frame(frame)
+            job = landmark_stage(detect_stage(
+                {'timestamp': media_time, 'frame': frame, 'gray': gray}))
+            pending.append(job)
+            if len(pending) >= batch_frames:
+                flush()
+        flush()
+    finally:
+        cap.release()
+
+    return frames, {'frames_decoded': decoded, 'media_end': media_time}
+
+
+def video_duration(path):
+    """
+    Return the length of a video in seconds from its frame count and FPS.
+    
+    Args:
+        path: Video file path
+        
+    Returns:
+        float: Duration, or 0 if the container doesn't report it
+    """
+    cap = cv2.VideoCapture(str(path))
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        count = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+        return count / fps if fps > 0 else 0.0
+    finally:
+        cap.release()
+
+
+def replay_frames(userid, frames):
+    """
+    Run the blink, yawn and focus state machines over measured frames.
+    
+    Args:
+        userid: User identifier written into each record
+        frames: (timestamp, faces) pairs in media-time order
+        
+    Returns:
+        list: Record dicts
+    """
+    tracker = AttentionTracker(userid, EYE_CLOSED_THRESHOLD, YAWN_THRESHOLD,
+                               FOCUS_YAW_THRESHOLD)
+    records = []
+    for timestamp, faces in frames:
+        records.extend(tracker.update(timestamp, faces))
+    return records
+
+
+def analyse_video(path, userid, output=None, sample_rate=FRAME_RATE, batch_frames=8):
+    """
+    Analyse a recorded video as fast as the CPU allows.
+    
+    Frames are sampled by media timestamp rather than wall-clock time, and
+    all durations in the records are media time, so results don't depend on
+    how fast the machine is. Nothing is published or displayed.
+    
+    Args:
+        path: Video file path
+        userid: User identifier written into each record
+        output: Optional .npz/.parquet path for the records (see recordio)
+        sample_rate: Frames per second of media time to analyse (0 = all)
+        batch_frames: Frames whose faces share one pose inference
+        
+    Returns:
+        tuple: (records as a dict of columns, throughput report dict)
+    """
+    start = time.perf_counter()
+    frames, counters = measure_video(path, sample_rate=sample_rate, batch_frames=batch_frames)
+    records = replay_frames(userid, frames)
+    wall_time = time.perf_counter() - start
+
+    decoded, media_time = counters['frames_decoded'], counters['media_end']
+    columns = records_to_columns(records)
+    report = {
+        'video': str(path),
+        'frames_decoded': decoded,
+        'frames_analysed': len(frames),
+        'records': len(records),
+        'media_duration': media_time,
+        'wall_time': wall_time,
+        'decode_fps': decoded / wall_time if wall_time else 0.0,
+        'analysis_fps': len(frames) / wall_time if wall_time else 0.0,
+        'realtime_factor': media_time / wall_time if wall_time else 0.0,
+    }
+    if output is not None:
+        report['output'] = str(write_columns(output, columns))
+    return columns, report
+
+
 # ============================================================================
 # Visualization Helpers
 # ============================================================================
@@ -444,59 +1071,79 @@ def publish(image, data):
     """
     Publish frame and data via ZeroMQ.
     
+    With a FrameSender running, the metrics and the frame are queued on
+    their channels for its thread to encode and send, subject to each
+    channel's backpressure policy; otherwise they are sent from the calling
+    thread.
+    
     Args:
-        image: BGR image
+        image: BGR image, or None to publish only the metrics
         data: Dictionary with metrics
     """
-    if image.flags['C_CONTIGUOUS']:
-        socket.send_array(image, data, copy=False)
+    captured = data.get('captured')
+    video = None if image is None else {'id': data['id'], 'captured': captured}
+    if frame_sender is not None:
+        frame_sender.put(METRICS, (data,), captured)
+        if video is not None:
+            frame_sender.put(VIDEO, (image, video), captured)
     else:
-        image = np.ascontiguousarray(image)
-        socket.send_array(image, data, copy=False)
-
-
-def draw_metrics(frame, blink_count, yawn_count, lost_focus_count,
-                lost_focus_duration, face_not_present_duration):
-    """Draw attention metrics on frame"""
-    y_offset = 20
-    metrics = [
-        f"Blink Count: {blink_count}",
-        f"Yawn Count: {yawn_count}",
-        f"Lost Focus Count: {lost_focus_count}",
-        f"Lost Focus Duration: {lost_focus_duration:.1f}s",
-        f"Face Not Present: {face_not_present_duration:.1f}s"
-    ]
+        send_metrics(data)
+        if video is not None:
+            send_video(image, video)
 
-    for metric in metrics:
-        cv2.putText(frame, metric, (10, y_offset),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
-        y_offset += 20
 
+def send_metrics(data, flags=0):
+    """
+    Send a metrics message on metrics/<userid>.
+    
+    Args:
+        data: Dictionary with metrics; its 'sent' time is set here
+        flags: zmq send flags (zmq.NOBLOCK raises zmq.Again when the socket is full)
+    """
+    data['sent'] = time.time()
+    socket.send_record(topic(METRICS, data['id']), data, flags)
+
+
+def send_video(image, video, flags=0):
+    """
+    Send a frame on video/<userid>, encoded with the video socket's codec.
+    
+    Args:
+        image: Image to send
+        video: Dictionary with the user id and the capture time of the
+            metrics the frame belongs to; its 'sent' time is set here
+        flags: zmq send flags
+    """
+    video['sent'] = time.time()
+    video_socket.send_array(np.ascontiguousarray(image), video, flags=flags, copy=False,
+                            topic=topic(VIDEO, video['id']))
 
-def draw_border(img, pt1, pt2, color, thickness, r, d):
-    """Draw rounded rectangle border on image"""
-    x1, y1 = pt1
-    x2, y2 = pt2
 
-    # Top left
-    cv2.line(img, (x1 + r, y1), (x1 + r + d, y1), color, thickness)
-    cv2.line(img, (x1, y1 + r), (x1, y1 + r + d), color, thickness)
-    cv2.ellipse(img, (x1 + r, y1 + r), (r, r), 180, 0, 90, color, thickness)
+def render(job, tracker, renderer):
+    """
+    Draw metrics, landmarks and head pose for an analysed frame and show it.
+    
+    Draws straight into job['frame'], which is no longer needed once the
+    frame has been published.
+    
+    Args:
+        job: Analysed frame job
+        tracker: AttentionTracker holding the current counters
+        renderer: OverlayRenderer
+    """
+    frame_display = job['frame']
 
-    # Top right
-    cv2.line(img, (x2 - r, y1), (x2 - r - d, y1), color, thickness)
-    cv2.line(img, (x2, y1 + r), (x2, y1 + r + d), color, thickness)
-    cv2.ellipse(img, (x2 - r, y1 + r), (r, r), 270, 0, 90, color, thickness)
+    # Draw metrics on display frame
+    renderer.draw_metrics(frame_display, *tracker.counters())
 
-    # Bottom left
-    cv2.line(img, (x1 + r, y2), (x1 + r + d, y2), color, thickness)
-    cv2.line(img, (x1, y2 - r), (x1, y2 - r - d), color, thickness)
-    cv2.ellipse(img, (x1 + r, y2 - r), (r, r), 90, 0, 90, color, thickness)
+    # Draw landmarks and pose of the last face if available
+    rects, shapes = job['rects'], job['shapes']
+    if HAVE_DLIB and len(shapes) > 0:
+        yaw, pitch, roll = job['poses'][-1]
+        renderer.draw_face(frame_display, rects[-1], shapes[-1],
+                           yaw.item(), pitch.item(), roll.item())
 
-    # Bottom right
-    cv2.line(img, (x2 - r, y2), (x2 - r - d, y2), color, thickness)
-    cv2.line(img, (x2, y2 - r), (x2, y2 - r - d), color, thickness)
-    cv2.ellipse(img, (x2 - r, y2 - r), (r, r), 0, 0, 90, color, thickness)
+    cv2.imshow('Attention Monitor', cv2.cvtColor(frame_display, cv2.COLOR_RGB2BGR))
 
 
 # ============================================================================
@@ -509,7 +1156,100 @@ if __name__ == '__main__':
     )
     parser.add_argument('--userid', help='User ID', required=True)
     parser.add_argument('--host', help='ZeroMQ server host', default="localhost")
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Run analysis stages on separate worker threads')
+    parser.add_argument('--workers', default=None,
+                        help='Per-stage worker counts for --pipeline, e.g. "detect=2,pose=2"')
+    parser.add_argument('--track-interval', type=int, default=0,
+                        help='Run face detection every N frames and track faces in between')
+    parser.add_argument('--tracker', choices=['correlation', 'landmarks'], default='correlation',
+                        help='Tracker used between detections')
+    parser.add_argument('--detect-scales', default=None,
+                        help='Face detection downscale factors tried in order, e.g. "0.5,1.0"')
+    parser.add_argument('--pose-backend', choices=pose_models.names(), default=None,
+                        help='Head pose model (default: hopenet when available)')
+    parser.add_argument('--hopenet-backend', default=None,
+                        choices=['eager', 'torchscript', 'int8-dynamic', 'int8-static', 'onnx', 'auto'],
+                        help='Hopenet inference backend; run export_pose.py first for all but eager')
+    parser.add_argument('--pose-input-size', type=int, default=None,
+                        help='Hopenet face crop size, e.g. 112 or 160 for small faces (default 224)')
+    parser.add_argument('--pose-cache', type=float, default=0.0,
+                        help='Reuse head poses of faces that changed less than this '
+                             '(e.g. 0.02 for landmarks, 0.03 for pixels; 0 = off)')
+    parser.add_argument('--pose-cache-max-age', type=int, default=10,
+                        help='Re-estimate cached head poses after this many frames')
+    parser.add_argument('--pose-cache-measure', choices=['landmarks', 'pixels'],
+                        default='landmarks', help='How face change is measured for --pose-cache')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help='Serve Prometheus-style stage metrics on 127.0.0.1:<port>/metrics')
+    parser.add_argument('--stats-interval', type=float, default=0,
+                        help='Print a stage latency summary every N seconds')
+    parser.add_argument('--record-timing', action='store_true',
+                        help='Publish per-stage latencies with every record')
+    parser.add_argument('--codec', choices=CODECS, default='raw',
+                        help='Codec for published frames; jpeg cuts bandwidth about tenfold')
+    parser.add_argument('--quality', type=int, default=None,
+                        help='JPEG/WebP quality (0-100) or PNG compression level (0-9)')
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help='Frame bandwidth budget in KB/s; lowers quality, then skips frames')
+    parser.add_argument('--video-rate', type=float, default=None,
+                        help='Frames per second published on video/<userid> '
+                             '(default: every analysed frame, 0: metrics only)')
+    parser.add_argument('--record-format', choices=RECORD_FORMATS, default='json',
+                        help='Encoding of metrics messages; binary is about a quarter the size')
+    parser.add_argument('--metrics-policy', choices=POLICIES, default='drop-oldest',
+                        help='What happens to metrics when the server falls behind')
+    parser.add_argument('--video-policy', choices=POLICIES, default='latest',
+                        help='What happens to frames when the server falls behind')
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="Messages queued per 'drop-oldest' or 'block' channel")
+    parser.add_argument('--late-after', type=float, default=0.5,
+                        help='Count messages sent this many seconds after capture as late')
+    parser.add_argument('--headless', action='store_true',
+                        help='Run without a preview window (for unattended capture nodes)')
+    parser.add_argument('--video', default=None,
+                        help='Analyse a recorded video offline instead of the camera')
+    parser.add_argument('--output', default=None,
+                        help='Columnar output for --video (.npz or .parquet)')
+    parser.add_argument('--sample-rate', type=float, default=FRAME_RATE,
+                        help='Frames per second of media time analysed with --video (0 = all)')
+    parser.add_argument('--batch-frames', type=int, default=8,
+                        help='Frames batched per head pose inference with --video')
 
     args = parser.parse_args()
-
-    main(args.userid, args.host)
+    detect_scales = None
+    if args.detect_scales:
+        try:
+            detect_scales = parse_scales(args.detect_scales)
+        except ValueError as e:
+            parser.error(f"--detect-scales: {e}")
+
+    if args.video:
+        configure(args.track_interval, args.tracker, detect_scales, args.pose_backend,
+                  args.hopenet_backend, args.pose_input_size, args.pose_cache,
+                  args.pose_cache_max_age, args.pose_cache_measure)
+        load_pose_model()
+        output = args.output or str(Path(args.video).with_suffix('.npz'))
+        _, report = analyse_video(args.video, args.userid, output=output,
+                                  sample_rate=args.sample_rate,
+                                  batch_frames=args.batch_frames)
+        print(f"Analysed {report['frames_analysed']} of {report['frames_decoded']} frames "
+              f"({report['media_duration']:.1f}s of video) in {report['wall_time']:.1f}s: "
+              f"{report['analysis_fps']:.1f} fps analysed, {report['decode_fps']:.1f} fps decoded, "
+              f"{report['realtime_factor']:.1f}x realtime")
+        print(f"Wrote {report['records']} records to {report['output']}")
+        if pose_cache is not None:
+            print(f"Pose cache: {pose_cache.stats()}")
+    else:
+        main(args.userid, args.host, pipelined=args.pipeline, workers=parse_workers(args.workers),
+             track_interval=args.track_interval, tracker_backend=args.tracker,
+             detect_scales=detect_scales, headless=args.headless,
+             pose_backend=args.pose_backend, hopenet_backend=args.hopenet_backend,
+             pose_input_size=args.pose_input_size, pose_cache_threshold=args.pose_cache,
+             pose_cache_max_age=args.pose_cache_max_age,
+             pose_cache_measure=args.pose_cache_measure, metrics_port=args.metrics_port,
+             stats_interval=args.stats_interval, record_timing=args.record_timing,
+             codec=args.codec, quality=args.quality, bandwidth=args.bandwidth,
+             video_rate=args.video_rate, record_format=args.record_format,
+             metrics_policy=args.metrics_policy, video_policy=args.video_policy,
+             queue_size=args.queue_size, late_after=args.late_after)
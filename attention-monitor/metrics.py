@@ -0,0 +1,311 @@
+"""
+Per-stage timing instrumentation for the client.
+
+ClientMetrics keeps, for every stage (capture, detect, landmarks, pose,
+publish, render), a latency histogram with fixed buckets. Each histogram has
+a cumulative part, exported in Prometheus text format, and a rolling part
+made of one bucket array per `slot_seconds`, from which recent percentiles
+are estimated. Recording a sample is one bisect and two increments under a
+lock, so the instrumentation can stay on in production.
+
+Frame drop counters (capture slot overwrites, pipeline drops) are not
+counted per frame; their owners' stats() are registered as sources and read
+only when metrics are exported.
+
+The data can be served at http://127.0.0.1:<port>/metrics (MetricsServer)
+or printed periodically (StatsLogger).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds (Prometheus 'le' labels)
+BUCKETS = (0.0005, 0.001, 0.002, 0.003, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03, 0.05,
+           0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0)
+
+PREFIX = 'ocat'
+
+
+class StageHistogram:
+    """
+    Cumulative and rolling latency histogram for one stage.
+
+    Args:
+        window: Seconds covered by the rolling histogram
+        slot_seconds: Granularity of the rolling window
+    """
+
+    def __init__(self, window=60.0, slot_seconds=5.0):
+        self.slot_seconds = slot_seconds
+        self.slots = max(1, int(round(window / slot_seconds)))
+        # One extra bucket for samples above the last bound (+Inf)
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.n = 0
+        self._rolling = [[0] * (len(BUCKETS) + 1) for _ in range(self.slots)]
+        self._rolling_sum = [0.0] * self.slots
+        self._slot_ids = [-1] * self.slots
+
+    def observe(self, seconds, now):
+        bucket = bisect_left(BUCKETS, seconds)
+        self.counts[bucket] += 1
+        self.total += seconds
+        self.n += 1
+
+        slot_id = int(now // self.slot_seconds)
+        index = slot_id % self.slots
+        if self._slot_ids[index] != slot_id:
+            self._slot_ids[index] = slot_id
+            self._rolling[index] = [0] * (len(BUCKETS) + 1)
+            self._rolling_sum[index] = 0.0
+        self._rolling[index][bucket] += 1
+        self._rolling_sum[index] += seconds
+
+    def rolling(self, now):
+        """Return (bucket counts, sum) over the slots still inside the window."""
+        current = int(now // self.slot_seconds)
+        counts = [0] * (len(BUCKETS) + 1)
+        total = 0.0
+        for index, slot_id in enumerate(self._slot_ids):
+            if current - self.slots < slot_id <= current:
+                for bucket, count in enumerate(self._rolling[index]):
+                    counts[bucket] += count
+                total += self._rolling_sum[index]
+        return counts, total
+
+
+def _percentile(counts, q):
+    """
+    Estimate a percentile from bucket counts.
+
+    Interpolates linearly inside the bucket holding the requested rank, as
+    Prometheus' histogram_quantile does; samples above the last bound are
+    reported as the last bound.
+    """
+    n = sum(counts)
+    if n == 0:
+        return 0.0
+    rank = q / 100.0 * n
+    seen = 0
+    for bucket, count in enumerate(counts):
+        if count and seen + count >= rank:
+            if bucket >= len(BUCKETS):
+                return BUCKETS[-1]
+            lower = BUCKETS[bucket - 1] if bucket > 0 else 0.0
+            return lower + (BUCKETS[bucket] - lower) * (rank - seen) / count
+        seen += count
+    return BUCKETS[-1]
+
+
+class ClientMetrics:
+    """
+    Collect per-stage latency and frame counters for one client.
+
+    Args:
+        window: Seconds covered by rolling percentiles
+        slot_seconds: Granularity of the rolling window
+    """
+
+    def __init__(self, window=60.0, slot_seconds=5.0):
+        self.window = window
+        self.slot_seconds = slot_seconds
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._sources = {}
+
+    def observe(self, stage, seconds):
+        """Record one stage latency sample."""
+        now = time.monotonic()
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = StageHistogram(self.window, self.slot_seconds)
+            histogram.observe(seconds, now)
+
+    @contextmanager
+    def time(self, stage):
+        """Time the enclosed block as one sample of `stage`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage, fn):
+        """
+        Wrap a job handler so each call is timed as `stage`.
+
+        The latency is also stored in job['timings'][stage] (seconds) so it
+        can be published with the frame's record.
+        """
+        def run(job):
+            start = time.perf_counter()
+            job = fn(job)
+            elapsed = time.perf_counter() - start
+            job.setdefault('timings', {})[stage] = elapsed
+            self.observe(stage, elapsed)
+            return job
+        return run
+
+    def count(self, name, n=1):
+        """Increment a frame counter, e.g. 'published'."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def add_source(self, name, stats):
+        """
+        Register a callable returning a dict of numeric counters.
+
+        Sources are only read when metrics are exported, e.g.
+        add_source('capture', capture.stats).
+        """
+        with self._lock:
+            self._sources[name] = stats
+
+    def summary(self):
+        """
+        Return rolling per-stage latency and current counters.
+
+        Returns:
+            dict: {'stages': {stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}},
+                   'counters': {...}, source name: {...}}
+        """
+        now = time.monotonic()
+        with self._lock:
+            stages = {}
+            for stage, histogram in self._stages.items():
+                counts, total = histogram.rolling(now)
+                n = sum(counts)
+                stages[stage] = {
+                    'count': n,
+                    'mean_ms': total / n * 1e3 if n else 0.0,
+                    'p50_ms': _percentile(counts, 50) * 1e3,
+                    'p95_ms': _percentile(counts, 95) * 1e3,
+                    'p99_ms': _percentile(counts, 99) * 1e3,
+                }
+            summary = {'stages': stages, 'counters': dict(self._counters)}
+            sources = dict(self._sources)
+        for name, stats in sources.items():
+            summary[name] = _numeric(stats())
+        return summary
+
+    def prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = [f"# HELP {PREFIX}_stage_latency_seconds Client stage latency",
+                 f"# TYPE {PREFIX}_stage_latency_seconds histogram"]
+        with self._lock:
+            stages = {stage: (list(h.counts), h.total, h.n) for stage, h in self._stages.items()}
+            counters = dict(self._counters)
+            sources = dict(self._sources)
+
+        for stage, (counts, total, n) in sorted(stages.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, counts):
+                cumulative += count
+                lines.append(f'{PREFIX}_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} '
+                             f'{cumulative}')
+            lines.append(f'{PREFIX}_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {n}')
+            lines.append(f'{PREFIX}_stage_latency_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{PREFIX}_stage_latency_seconds_count{{stage="{stage}"}} {n}')
+
+        lines.append(f"# TYPE {PREFIX}_frames_total counter")
+        for name, value in sorted(counters.items()):
+            lines.append(f'{PREFIX}_frames_total{{event="{name}"}} {value}')
+        for source, stats in sorted(sources.items()):
+            for name, value in sorted(_numeric(stats()).items()):
+                lines.append(f'{PREFIX}_{source}_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _numeric(stats):
+    """Flatten a stats dict to its top-level numeric values."""
+    return {name: value for name, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+def frame_timing(job):
+    """
+    Compact per-frame timing summary for publishing with a record.
+
+    Returns:
+        dict: stage -> milliseconds, rounded to 0.1 ms
+    """
+    return {stage: round(seconds * 1e3, 1) for stage, seconds in job.get('timings', {}).items()}
+
+
+class MetricsServer:
+    """
+    Serve ClientMetrics.prometheus() at http://<host>:<port>/metrics.
+
+    Args:
+        metrics: ClientMetrics to export
+        port: TCP port
+        host: Interface to bind; localhost by default
+    """
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('/metrics', ''):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        name='Metrics Server', daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StatsLogger(threading.Thread):
+    """
+    Print a one-line-per-stage metrics summary every `interval` seconds.
+
+    Args:
+        metrics: ClientMetrics to report
+        interval: Seconds between reports
+    """
+
+    def __init__(self, metrics, interval=30.0):
+        super().__init__(name='Stats Logger', daemon=True)
+        self.metrics = metrics
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            summary = self.metrics.summary()
+            stages = ', '.join(
+                f"{stage} p50 {s['p50_ms']:.0f}/p95 {s['p95_ms']:.0f} ms ({s['count']})"
+                for stage, s in summary.pop('stages').items())
+            print(f"[stats] {stages}")
+            for name, values in summary.items():
+                if values:
+                    print(f"[stats] {name}: {values}")
+
+    def stop(self):
+        self._stop_event.set()
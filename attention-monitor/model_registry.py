@@ -0,0 +1,187 @@
+"""
+Process-wide registry for pose models.
+
+Loading Hopenet means building a ResNet-50 and reading its weights from
+disk, so it must happen once per process rather than once per face. The
+registry keeps one shared, warmed-up instance per registered name, records
+how long each load took and how much resident memory it added, and lets the
+active model or backend be swapped at runtime without restarting the client.
+A load that fails is remembered, so a missing weights file costs one attempt
+rather than one per frame, until the name is registered or activated again.
+"""
+
+import os
+import sys
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def resident_memory():
+    """
+    Return the resident set size of this process in bytes.
+
+    Uses psutil when available and falls back to the peak RSS reported by
+    the resource module, which is the best we can do without psutil.
+
+    Returns:
+        int: Resident memory in bytes, or 0 if it cannot be determined
+    """
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return rss if sys.platform == 'darwin' else rss * 1024
+    return 0
+
+
+class ModelRegistry:
+    """
+    Lazily load, warm up and share model instances by name.
+
+    Factories are registered under a name and only called the first time
+    that name is requested. Later calls return the same instance. Loading is
+    serialized so concurrent callers never build the same model twice. If a
+    factory raises, later calls fail with a RuntimeError chained to that
+    error without retrying.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._factories = {}
+        self._models = {}
+        self._stats = {}
+        self._failures = {}
+        self._active = None
+
+    def register(self, name, factory, activate=False):
+        """
+        Register (or replace) a model factory.
+
+        Replacing a factory drops any instance already loaded under that
+        name, and any failure to load it, so the next get() builds the new
+        model.
+
+        Args:
+            name: Registry key, e.g. 'hopenet'
+            factory: Zero-argument callable returning a model instance
+            activate: Make this the model returned by get() with no name
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+            self._failures.pop(name, None)
+            if activate or self._active is None:
+                self._active = name
+
+    def activate(self, name):
+        """
+        Select the model returned by get() when no name is given.
+
+        Clears a previous failure to load it, so the next get() retries.
+
+        Args:
+            name: A registered model name
+        """
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Unknown model: {name}")
+            self._failures.pop(name, None)
+            self._active = name
+
+    @property
+    def active(self):
+        return self._active
+
+    def names(self):
+        """Return the registered model names in registration order."""
+        with self._lock:
+            return list(self._factories)
+
+    def get(self, name=None):
+        """
+        Return the shared instance for a model, loading it on first use.
+
+        Args:
+            name: Registered model name (defaults to the active model)
+
+        Returns:
+            The loaded model instance
+
+        Raises:
+            The factory's exception on the failed load, then RuntimeError
+            (caused by it) on every call until the model is registered or
+            activated again
+        """
+        name = name or self._active
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+            if name not in self._factories:
+                raise KeyError(f"Unknown model: {name}")
+            cached = self._failures.get(name)
+            if cached is not None:
+                # A fresh exception per call; re-raising the cached one would
+                # grow its traceback (and keep its frames alive) every time
+                raise RuntimeError(f"Loading model {name!r} failed: {cached}") \
+                    from cached.with_traceback(None)
+
+            rss_before = resident_memory()
+            try:
+                start = time.perf_counter()
+                model = self._factories[name]()
+                load_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                warmup = getattr(model, 'warmup', None)
+                if callable(warmup):
+                    warmup()
+                warmup_time = time.perf_counter() - start
+            except Exception as e:
+                self._failures[name] = e
+                raise
+
+            self._stats[name] = {
+                'load_time': load_time,
+                'warmup_time': warmup_time,
+                'rss_delta': resident_memory() - rss_before,
+            }
+            self._models[name] = model
+            return model
+
+    def unload(self, name):
+        """Drop the loaded instance or failure for a model; it reloads on next get()."""
+        with self._lock:
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+            self._failures.pop(name, None)
+
+    def stats(self):
+        """
+        Return load statistics for every loaded model.
+
+        Returns:
+            dict: name -> {'load_time', 'warmup_time', 'rss_delta'}
+        """
+        with self._lock:
+            return {name: dict(stat) for name, stat in self._stats.items()}
+
+
+# Shared registry used by the client
+pose_models = ModelRegistry()
@@ -0,0 +1,151 @@
+"""
+Overlay renderer for the client preview window.
+
+Draws the metrics panel, face border, pose axes and the 68 landmarks.
+Landmarks are stamped in one vectorized NumPy assignment instead of one
+cv2.circle call per point, and the text panel is rasterized once and reused
+until the values it shows change.
+"""
+
+import cv2
+import numpy as np
+
+from utils import draw_axis
+
+# Landmark dot colours (RGB frame): all points, then eyes and mouth on top
+POINT_COLOR = (255, 255, 0)
+EYE_COLOR = (255, 0, 255)
+MOUTH_COLOR = (0, 255, 255)
+
+PANEL_COLOR = (255, 0, 0)
+PANEL_LINE_HEIGHT = 20
+
+
+def _landmark_colors():
+    colors = np.empty((68, 3), dtype=np.uint8)
+    colors[:] = POINT_COLOR
+    colors[36:48] = EYE_COLOR
+    colors[60:68] = MOUTH_COLOR
+    return colors
+
+
+def _disk_offsets(radius):
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    inside = dx * dx + dy * dy <= radius * radius
+    return dy[inside], dx[inside]
+
+
+class OverlayRenderer:
+    """
+    Draw attention overlays onto RGB frames.
+
+    Args:
+        radius: Landmark dot radius in pixels
+    """
+
+    def __init__(self, radius=2):
+        self._colors = _landmark_colors()
+        self._dy, self._dx = _disk_offsets(radius)
+        self._panel_key = None
+        self._panel = None
+        self._panel_mask = None
+
+    def draw_landmarks(self, frame, shape):
+        """
+        Stamp every landmark dot in a single indexed assignment.
+
+        Args:
+            frame: HxWx3 uint8 image, modified in place
+            shape: (68, 2) landmark array of (x, y)
+        """
+        h, w = frame.shape[:2]
+        ys = (shape[:, 1, None] + self._dy).ravel()
+        xs = (shape[:, 0, None] + self._dx).ravel()
+        colors = np.repeat(self._colors[:len(shape)], len(self._dy), axis=0)
+        inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+        frame[ys[inside], xs[inside]] = colors[inside]
+
+    def draw_metrics(self, frame, blink_count, yawn_count, lost_focus_count,
+                     lost_focus_duration, face_not_present_duration):
+        """
+        Blit the metrics panel, re-rasterizing it only when its text changes.
+
+        Args:
+            frame: HxWx3 uint8 image, modified in place
+        """
+        lines = (
+            f"Blink Count: {blink_count}",
+            f"Yawn Count: {yawn_count}",
+            f"Lost Focus Count: {lost_focus_count}",
+            f"Lost Focus Duration: {lost_focus_duration:.1f}s",
+            f"Face Not Present: {face_not_present_duration:.1f}s"
+        )
+        if lines != self._panel_key:
+            self._render_panel(lines)
+            self._panel_key = lines
+
+        ph = min(self._panel.shape[0], frame.shape[0])
+        pw = min(self._panel.shape[1], frame.shape[1])
+        np.copyto(frame[:ph, :pw], self._panel[:ph, :pw],
+                  where=self._panel_mask[:ph, :pw, None])
+
+    def draw_face(self, frame, rect, shape, yaw, pitch, roll):
+        """
+        Draw border, pose axes and landmarks for one dlib face rectangle.
+
+        Args:
+            frame: HxWx3 uint8 image, modified in place
+        """
+        center_x = (rect.left() + rect.right()) / 2
+        center_y = (rect.top() + rect.bottom()) / 2
+        draw_border(frame, (rect.left(), rect.top()),
+                    (rect.left() + rect.width(), rect.top() + rect.height()),
+                    (255, 255, 255), 1, 10, 20)
+        draw_axis(frame, yaw, pitch, roll, tdx=int(center_x), tdy=int(center_y), size=100)
+        self.draw_landmarks(frame, shape)
+
+    def _render_panel(self, lines):
+        width = 0
+        for line in lines:
+            (text_w, _), _ = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+            width = max(width, text_w)
+        height = PANEL_LINE_HEIGHT * len(lines) + 10
+
+        panel = np.zeros((height, width + 20, 3), dtype=np.uint8)
+        mask = np.zeros((height, width + 20), dtype=np.uint8)
+        y_offset = PANEL_LINE_HEIGHT
+        for line in lines:
+            cv2.putText(panel, line, (10, y_offset),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, PANEL_COLOR, 1)
+            cv2.putText(mask, line, (10, y_offset),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, 255, 1)
+            y_offset += PANEL_LINE_HEIGHT
+
+        self._panel = panel
+        self._panel_mask = mask.astype(bool)
+
+
+def draw_border(img, pt1, pt2, color, thickness, r, d):
+    """Draw rounded rectangle border on image"""
+    x1, y1 = pt1
+    x2, y2 = pt2
+
+    # Top left
+    cv2.line(img, (x1 + r, y1), (x1 + r + d, y1), color, thickness)
+    cv2.line(img, (x1, y1 + r), (x1, y1 + r + d), color, thickness)
+    cv2.ellipse(img, (x1 + r, y1 + r), (r, r), 180, 0, 90, color, thickness)
+
+    # Top right
+    cv2.line(img, (x2 - r, y1), (x2 - r - d, y1), color, thickness)
+    cv2.line(img, (x2, y1 + r), (x2, y1 + r + d), color, thickness)
+    cv2.ellipse(img, (x2 - r, y1 + r), (r, r), 270, 0, 90, color, thickness)
+
+    # Bottom left
+    cv2.line(img, (x1 + r, y2), (x1 + r + d, y2), color, thickness)
+    cv2.line(img, (x1, y2 - r), (x1, y2 - r - d), color, thickness)
+    cv2.ellipse(img, (x1 + r, y2 - r), (r, r), 90, 0, 90, color, thickness)
+
+    # Bottom right
+    cv2.line(img, (x2 - r, y2), (x2 - r - d, y2), color, thickness)
+    cv2.line(img, (x2, y2 - r), (x2, y2 - r - d), color, thickness)
+    cv2.ellipse(img, (x2 - r, y2 - r), (r, r), 0, 0, 90, color, thickness)
@@ -0,0 +1,201 @@
+"""
+Multi-stage frame pipeline.
+
+Each stage runs on its own pool of worker threads and is connected to the
+next by a bounded queue, so stage N+1 of frame k overlaps with stage N of
+frame k+1. Jobs are numbered when they enter the pipeline and a single sink
+thread releases them strictly in that order, which keeps anything stateful
+(blink/yawn/focus tracking, publishing) seeing frames in capture order even
+when a stage runs several workers.
+"""
+
+import threading
+import time
+from queue import Queue, Empty, Full
+
+# How often blocked workers wake up to check for shutdown
+POLL_INTERVAL = 0.1
+
+
+class Stage:
+    """
+    A pipeline stage: a handler run by one or more worker threads.
+
+    Args:
+        name: Stage name used in stats
+        handler: Callable taking a job dict and returning the job
+        workers: Number of worker threads
+        maxsize: Capacity of the stage's input queue
+    """
+
+    def __init__(self, name, handler, workers=1, maxsize=2):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = Queue(maxsize=maxsize)
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self._lock = threading.Lock()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'depth': self.queue.qsize(),
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'busy_time': self.busy_time,
+            }
+
+
+class Pipeline:
+    """
+    Run jobs through a chain of stages and deliver them in order to a sink.
+
+    submit() never blocks: when the first stage is full the oldest queued
+    job is dropped so the pipeline keeps working on fresh frames. Jobs are
+    never dropped between stages; a slow stage backs up the ones before it,
+    which shows up in their queue depth.
+
+    Args:
+        stages: List of Stage objects, in order
+        sink: Callable receiving each finished job, in submission order
+        maxsize: Capacity of the sink's reorder queue
+    """
+
+    def __init__(self, stages, sink, maxsize=8):
+        self.stages = stages
+        self.sink = sink
+        self._sink_queue = Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._threads = []
+        self._seq = 0
+        self._skipped = set()
+        self._skip_lock = threading.Lock()
+        self.delivered = 0
+        self.reordered = 0
+
+    def start(self):
+        for index, stage in enumerate(self.stages):
+            out = self.stages[index + 1].queue if index + 1 < len(self.stages) else self._sink_queue
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(stage, out),
+                                          name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        thread = threading.Thread(target=self._deliver, name='sink', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def submit(self, job):
+        """
+        Number a job and hand it to the first stage. Call from one thread.
+
+        Args:
+            job: dict carrying the frame and anything stages need
+
+        Returns:
+            int: The job's sequence number
+        """
+        first = self.stages[0]
+        job['seq'] = self._seq
+        self._seq += 1
+        while True:
+            try:
+                first.queue.put_nowait(job)
+                return job['seq']
+            except Full:
+                try:
+                    stale = first.queue.get_nowait()
+                except Empty:
+                    continue
+                self._skip(stale['seq'])
+                with first._lock:
+                    first.dropped += 1
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def stats(self):
+        """
+        Return per-stage queue depth, throughput and drop counters.
+
+        Returns:
+            dict: stage name -> counters, plus a 'sink' entry
+        """
+        stats = {stage.name: stage.stats() for stage in self.stages}
+        stats['sink'] = {
+            'depth': self._sink_queue.qsize(),
+            'delivered': self.delivered,
+            'reordered': self.reordered,
+        }
+        return stats
+
+    def _skip(self, seq):
+        with self._skip_lock:
+            self._skipped.add(seq)
+
+    def _put(self, queue, job):
+        while not self._stop.is_set():
+            try:
+                queue.put(job, timeout=POLL_INTERVAL)
+                return
+            except Full:
+                continue
+
+    def _work(self, stage, out):
+        while not self._stop.is_set():
+            try:
+                job = stage.queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                continue
+
+            start = time.perf_counter()
+            try:
+                job = stage.handler(job)
+            except Exception as e:
+                print(f"WARNING: {stage.name} stage failed on frame {job['seq']}: {e}")
+                with stage._lock:
+                    stage.errors += 1
+                self._skip(job['seq'])
+                continue
+            with stage._lock:
+                stage.processed += 1
+                stage.busy_time += time.perf_counter() - start
+
+            self._put(out, job)
+
+    def _deliver(self):
+        pending = {}
+        next_seq = 0
+        while not self._stop.is_set():
+            try:
+                job = self._sink_queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                job = None
+
+            if job is not None:
+                if job['seq'] != next_seq:
+                    self.reordered += 1
+                pending[job['seq']] = job
+
+            # Release every job that is next in line, skipping dropped ones
+            while True:
+                if next_seq in pending:
+                    try:
+                        self.sink(pending.pop(next_seq))
+                    except Exception as e:
+                        print(f"WARNING: sink failed on frame {next_seq}: {e}")
+                    self.delivered += 1
+                elif next_seq in self._skipped:
+                    with self._skip_lock:
+                        self._skipped.discard(next_seq)
+                else:
+                    break
+                next_seq += 1
@@ -0,0 +1,98 @@
+"""
+Landmark-based head pose with cv2.solvePnP.
+
+Fits a canonical 3D face model to six of the 68 dlib landmarks the client
+already computes, instead of running a ResNet-50 over a 224x224 crop. The
+camera is approximated as a pinhole with focal length equal to the frame
+width and no distortion, which is adequate for webcams.
+
+Angles follow the Hopenet convention used by the rest of the client and by
+utils.draw_axis: positive yaw turns the face towards the left of the image,
+positive pitch tilts it up and positive roll lowers its right-hand side.
+"""
+
+import cv2
+import numpy as np
+
+# Canonical 3D face model (arbitrary units; x right, y up, z out of the face)
+MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),           # Nose tip
+    (0.0, -330.0, -65.0),      # Chin
+    (-225.0, 170.0, -135.0),   # Left eye, outer corner (image left)
+    (225.0, 170.0, -135.0),    # Right eye, outer corner (image right)
+    (-150.0, -150.0, -125.0),  # Mouth, left corner
+    (150.0, -150.0, -125.0),   # Mouth, right corner
+], dtype=np.float64)
+
+# Matching indices in the 68-point dlib layout
+LANDMARK_INDICES = [30, 8, 36, 45, 48, 54]
+
+
+class PnPPose:
+    """
+    Head pose estimator working from 68-point landmarks.
+
+    Exposes the same predict_batch-style interface as Facepose, but takes
+    landmarks instead of image crops; callers check `uses_landmarks`.
+    """
+
+    uses_landmarks = True
+
+    def __init__(self):
+        self._dist = np.zeros((4, 1))
+
+    def warmup(self):
+        shape = np.zeros((68, 2))
+        shape[LANDMARK_INDICES] = MODEL_POINTS[:, :2] * [1, -1] * 0.3 + 200
+        self.predict_landmarks([shape], (480, 640))
+
+    def camera_matrix(self, frame_shape):
+        h, w = frame_shape[:2]
+        return np.array([[w, 0, w / 2.0],
+                         [0, w, h / 2.0],
+                         [0, 0, 1]], dtype=np.float64)
+
+    def predict_landmarks(self, shapes, frame_shape):
+        """
+        Estimate yaw, pitch and roll for several faces.
+
+        Args:
+            shapes: List of (68, 2) landmark arrays
+            frame_shape: Shape of the frame the landmarks came from
+
+        Returns:
+            tuple: (yaw, pitch, roll) float32 arrays in degrees; NaN for
+            faces solvePnP could not fit
+        """
+        camera = self.camera_matrix(frame_shape)
+        angles = np.full((3, len(shapes)), np.nan, dtype=np.float32)
+        for i, shape in enumerate(shapes):
+            try:
+                image_points = np.asarray(shape, dtype=np.float64)[LANDMARK_INDICES]
+                ok, rvec, _ = cv2.solvePnP(MODEL_POINTS, image_points, camera, self._dist,
+                                           flags=cv2.SOLVEPNP_ITERATIVE)
+            except (cv2.error, IndexError, ValueError):
+                # Degenerate or malformed landmarks; leave this face's pose unknown
+                continue
+            if ok:
+                angles[:, i] = rotation_to_angles(cv2.Rodrigues(rvec)[0])
+        return angles[0], angles[1], angles[2]
+
+
+def rotation_to_angles(rotation):
+    """
+    Convert a model-to-camera rotation matrix to (yaw, pitch, roll) degrees.
+
+    Args:
+        rotation: 3x3 rotation from solvePnP (camera x right, y down, z forward)
+
+    Returns:
+        tuple: (yaw, pitch, roll)
+    """
+    # Direction the face points (model +z) and its left-to-right axis (model +x)
+    forward = rotation[:, 2]
+    across = rotation[:, 0]
+    yaw = np.degrees(np.arctan2(-forward[0], -forward[2]))
+    pitch = np.degrees(np.arctan2(-forward[1], np.hypot(forward[0], forward[2])))
+    roll = np.degrees(np.arctan2(across[1], across[0]))
+    return yaw, pitch, roll
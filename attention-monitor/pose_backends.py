@@ -0,0 +1,255 @@
+"""
+CPU inference backends for Hopenet.
+
+Facepose runs the network through one of these backends instead of calling
+the eager PyTorch module directly. Every backend takes a preprocessed
+(N, 3, H, W) float32 batch and returns the (3, N, 66) yaw/pitch/roll logits:
+
+    eager         float32 nn.Module, as trained
+    torchscript   traced and frozen; optimized for inference when loaded
+    int8-dynamic  Linear layers quantized to int8 at runtime (TorchScript)
+    int8-static   convolutions and Linear layers quantized to int8 with
+                  activation ranges calibrated on face crops (TorchScript)
+    onnx          ONNX Runtime, when onnxruntime is installed
+
+export_pose.py builds the non-eager variants from the trained weights and
+writes a manifest recording each variant's angle error against the eager
+model and its latency on the exporting machine, so a deployment can pick
+the fastest variant whose error it can accept (see select_backend).
+"""
+
+import copy
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+try:
+    import onnxruntime
+    HAVE_ONNXRUNTIME = True
+except ImportError:
+    HAVE_ONNXRUNTIME = False
+
+SCRIPT_DIR = Path(__file__).parent
+EXPORT_DIR = SCRIPT_DIR.parent / "model" / "hopenet_export"
+MANIFEST_NAME = "manifest.json"
+
+BACKENDS = ('eager', 'torchscript', 'int8-dynamic', 'int8-static', 'onnx')
+
+# Exported file for every backend except eager
+BACKEND_FILES = {
+    'torchscript': 'hopenet_torchscript.pt',
+    'int8-dynamic': 'hopenet_int8_dynamic.pt',
+    'int8-static': 'hopenet_int8_static.pt',
+    'onnx': 'hopenet.onnx',
+}
+
+
+class TorchBackend:
+    """
+    Run an nn.Module or TorchScript module on NumPy batches.
+
+    Args:
+        module: Model returning (yaw, pitch, roll) logits
+    """
+
+    def __init__(self, module):
+        self.module = module
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            yaw, pitch, roll = self.module(torch.from_numpy(batch))
+            return torch.stack((yaw, pitch, roll)).numpy()
+
+
+class OnnxBackend:
+    """
+    Run an exported ONNX model with ONNX Runtime.
+
+    Args:
+        path: .onnx file written by export_onnx
+        threads: Intra-op threads (0 lets ONNX Runtime decide)
+    """
+
+    def __init__(self, path, threads=0):
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(str(path), options,
+                                                    providers=['CPUExecutionProvider'])
+
+    def __call__(self, batch):
+        return np.stack(self.session.run(None, {'input': np.ascontiguousarray(batch)}))
+
+
+def logits_to_angles(logits):
+    """
+    Convert (3, N, 66) bin logits to expected angles in degrees.
+
+    Args:
+        logits: Backend output
+
+    Returns:
+        ndarray: (3, N) yaw, pitch and roll
+    """
+    logits = logits - logits.max(axis=2, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=2, keepdims=True)
+    return probs @ np.arange(logits.shape[2], dtype=np.float32) * 3 - 99
+
+
+def export_torchscript(model, example):
+    """Trace and freeze the eager model."""
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(model, example))
+
+
+def export_int8_dynamic(model, example):
+    """Quantize the Linear layers to int8; activations stay float."""
+    from torch.ao.quantization import quantize_dynamic
+
+    quantized = quantize_dynamic(copy.deepcopy(model), {torch.nn.Linear}, dtype=torch.qint8)
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(quantized, example))
+
+
+def export_int8_static(model, example, calibration):
+    """
+    Quantize weights and activations to int8 with FX graph mode.
+
+    Args:
+        model: Eager float32 model
+        example: Example input batch for tracing
+        calibration: (N, 3, H, W) float32 face batches used to observe
+            activation ranges
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    qconfig = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    prepared = prepare_fx(copy.deepcopy(model), qconfig, example_inputs=(example,))
+    with torch.no_grad():
+        for batch in calibration:
+            prepared(torch.from_numpy(batch))
+        quantized = convert_fx(prepared)
+        return torch.jit.freeze(torch.jit.trace(quantized, example))
+
+
+def export_onnx(model, example, path):
+    """Export the eager model to ONNX with dynamic batch and input size."""
+    torch.onnx.export(model, example, str(path),
+                      input_names=['input'], output_names=['yaw', 'pitch', 'roll'],
+                      dynamic_axes={'input': {0: 'batch', 2: 'height', 3: 'width'}},
+                      opset_version=17)
+
+
+def load_backend(name, model=None, export_dir=EXPORT_DIR, threads=0):
+    """
+    Load an inference backend.
+
+    Args:
+        name: One of BACKENDS
+        model: Eager model, required for 'eager'
+        export_dir: Directory written by export_pose.py
+        threads: Intra-op threads for ONNX Runtime (0 = default)
+
+    Returns:
+        Callable mapping a float32 batch to (3, N, 66) logits
+    """
+    if name == 'eager':
+        if model is None:
+            raise ValueError("The eager backend needs the trained model")
+        return TorchBackend(model)
+    if name not in BACKEND_FILES:
+        raise KeyError(f"Unknown pose backend: {name}")
+
+    path = Path(export_dir) / BACKEND_FILES[name]
+    if not path.exists():
+        raise FileNotFoundError(f"{path} not found; run export_pose.py first")
+    if name == 'onnx':
+        if not HAVE_ONNXRUNTIME:
+            raise ImportError("onnxruntime is not installed")
+        return OnnxBackend(path, threads)
+    module = torch.jit.load(str(path), map_location='cpu')
+    if name == 'torchscript':
+        # The optimized graph uses MKLDNN ops that can't be serialized, so the
+        # optimization pass runs here rather than at export
+        module = torch.jit.optimize_for_inference(module)
+    return TorchBackend(module)
+
+
+def measure_error(backend, reference, batches):
+    """
+    Compare a backend's angles against a reference backend.
+
+    Args:
+        backend: Backend under test
+        reference: Usually the eager backend
+        batches: Preprocessed face batches
+
+    Returns:
+        dict: Mean absolute error per angle and the overall max, in degrees
+    """
+    errors = np.concatenate([
+        np.abs(logits_to_angles(backend(batch)) - logits_to_angles(reference(batch)))
+        for batch in batches], axis=1)
+    return {
+        'yaw_error': float(errors[0].mean()),
+        'pitch_error': float(errors[1].mean()),
+        'roll_error': float(errors[2].mean()),
+        'mean_error': float(errors.mean()),
+        'max_error': float(errors.max()),
+    }
+
+
+def measure_latency(backend, batch, iterations=20, warmup=3):
+    """
+    Time repeated inference on one batch.
+
+    Returns:
+        ndarray: Per-call latency in seconds
+    """
+    for _ in range(warmup):
+        backend(batch)
+    latency = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        backend(batch)
+        latency[i] = time.perf_counter() - start
+    return latency
+
+
+def read_manifest(export_dir=EXPORT_DIR):
+    """Return the export manifest, or an empty dict if nothing was exported."""
+    path = Path(export_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def select_backend(max_error=2.0, export_dir=EXPORT_DIR, input_size=None):
+    """
+    Pick the fastest exported backend whose worst angle error is acceptable.
+
+    Each angle is checked on its own, so a variant that is accurate on yaw
+    and pitch can't hide a large roll error in the average.
+
+    Args:
+        max_error: Largest acceptable mean absolute error of any one angle, in degrees
+        export_dir: Directory written by export_pose.py
+        input_size: Input size the model will run at; exports made at
+            another size don't qualify (None accepts any)
+
+    Returns:
+        str: Backend name ('eager' if nothing faster qualifies)
+    """
+    manifest = read_manifest(export_dir)
+    if input_size is not None and manifest.get('input_size', 224) != input_size:
+        return 'eager'
+    candidates = [(entry['latency_p50'], name)
+                  for name, entry in manifest.get('backends', {}).items()
+                  if max(entry['yaw_error'], entry['pitch_error'], entry['roll_error']) <= max_error
+                  and (name != 'onnx' or HAVE_ONNXRUNTIME)]
+    return min(candidates)[1] if candidates else 'eager'
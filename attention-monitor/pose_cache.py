@@ -0,0 +1,203 @@
+"""
+Per-face head pose cache.
+
+A student who sits still produces nearly identical face crops frame after
+frame, and each one would otherwise cost a full Hopenet inference. PoseCache
+follows faces from frame to frame by their position and reuses a face's last
+yaw/pitch/roll while its appearance has changed less than a threshold since
+the pose was computed. Change is measured either as
+
+- 'landmarks': mean displacement of the 68 landmarks, after removing
+  translation and dividing by the face width (so 0.02 is 2% of the face), or
+- 'pixels': mean absolute difference of 16x16 grayscale thumbnails of the
+  face crop, as a fraction of full scale, after removing the mean brightness.
+
+Every pose is recomputed after at most `max_age` frames regardless, so slow
+drift below the threshold can't go unnoticed indefinitely.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+MEASURES = ('landmarks', 'pixels')
+
+THUMBNAIL_SIZE = 16
+
+
+def _box(rect):
+    """Return (x0, y0, x1, y1) for a dlib rectangle or a Haar (x, y, w, h) row."""
+    if hasattr(rect, 'left'):
+        return rect.left(), rect.top(), rect.right(), rect.bottom()
+    x, y, w, h = (int(v) for v in rect[:4])
+    return x, y, x + w, y + h
+
+
+class PoseCache:
+    """
+    Reuse head poses for faces whose crops haven't changed.
+
+    Args:
+        threshold: Largest change (see module docstring) that still reuses
+            the cached pose
+        max_age: Recompute a face's pose after this many frames of reuse
+        measure: 'landmarks' or 'pixels'; 'landmarks' falls back to
+            'pixels' for frames without landmarks
+    """
+
+    def __init__(self, threshold=0.02, max_age=10, measure='landmarks'):
+        if measure not in MEASURES:
+            raise ValueError(f"Unknown change measure: {measure}")
+        self.threshold = threshold
+        self.max_age = max(1, int(max_age))
+        self.measure = measure
+
+        self._lock = threading.Lock()
+        # One entry per face of the last frame: center, width, signature
+        # kind, signature at the last refresh, pose, frames since refresh
+        self._entries = []
+
+        self.lookups = 0
+        self.hits = 0
+        self.refreshes = {'new': 0, 'changed': 0, 'max_age': 0}
+        self._estimate_time = 0.0
+        self._estimated = 0
+        self._overhead_time = 0.0
+
+    def __call__(self, frame, rects, shapes, estimate, roi=None):
+        """
+        Return one pose per face, estimating only the faces that changed.
+
+        Args:
+            frame: RGB frame
+            rects: Face rectangles
+            shapes: (68, 2) landmarks per rect, or None
+            estimate: Callable taking a list of face indices and returning
+                their (yaw, pitch, roll) tuples
+            roi: Optional callable (frame, rect) -> RGB crop, for the
+                'pixels' measure
+
+        Returns:
+            list: One (yaw, pitch, roll) tuple per rect
+        """
+        start = time.perf_counter()
+        use_landmarks = (self.measure == 'landmarks' and shapes is not None
+                         and len(shapes) == len(rects))
+        kind = 'landmarks' if use_landmarks else 'pixels'
+        signatures = [self._landmark_signature(shape) for shape in shapes] if use_landmarks \
+            else [self._pixel_signature(frame, rect, roi) for rect in rects]
+        boxes = [_box(rect) for rect in rects]
+        centers = [((x0 + x1) / 2.0, (y0 + y1) / 2.0) for x0, y0, x1, y1 in boxes]
+        widths = [max(x1 - x0, 1) for x0, _, x1, _ in boxes]
+
+        with self._lock:
+            matches = self._match(centers, widths)
+            poses = [None] * len(rects)
+            refresh = []
+            for i, entry in enumerate(matches):
+                self.lookups += 1
+                if entry is None or entry['kind'] != kind:
+                    self.refreshes['new'] += 1
+                elif entry['age'] + 1 >= self.max_age:
+                    self.refreshes['max_age'] += 1
+                elif self._change(kind, entry['signature'], signatures[i]) > self.threshold:
+                    self.refreshes['changed'] += 1
+                else:
+                    self.hits += 1
+                    poses[i] = entry['pose']
+                    continue
+                refresh.append(i)
+            self._overhead_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        if refresh:
+            for i, pose in zip(refresh, estimate(refresh)):
+                poses[i] = pose
+        estimate_time = time.perf_counter() - start
+
+        with self._lock:
+            self._estimate_time += estimate_time
+            self._estimated += len(refresh)
+            entries = []
+            refreshed = set(refresh)
+            for i, entry in enumerate(matches):
+                if i in refreshed:
+                    entry = {'kind': kind, 'signature': signatures[i], 'pose': poses[i], 'age': 0}
+                else:
+                    # Keep the signature from the last refresh so slow drift
+                    # accumulates against it
+                    entry = dict(entry, age=entry['age'] + 1)
+                entry.update(center=centers[i], width=widths[i])
+                entries.append(entry)
+            self._entries = entries
+        return poses
+
+    def reset(self):
+        """Forget every cached face."""
+        with self._lock:
+            self._entries = []
+
+    def stats(self):
+        """
+        Return hit rate and the inference time the cache saved.
+
+        Saved time assumes every hit would have cost the mean per-face time
+        of the estimates that did run; overhead is the time spent computing
+        signatures and matching faces.
+
+        Returns:
+            dict: Counters and timings (seconds)
+        """
+        with self._lock:
+            per_face = self._estimate_time / self._estimated if self._estimated else 0.0
+            return {
+                'measure': self.measure,
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+                'refreshes': dict(self.refreshes),
+                'estimate_time': self._estimate_time,
+                'overhead_time': self._overhead_time,
+                'saved_time': self.hits * per_face - self._overhead_time,
+            }
+
+    def _match(self, centers, widths):
+        """Pair each face with the nearest cached face within half a face width."""
+        available = dict(enumerate(self._entries))
+        matches = []
+        for (x, y), width in zip(centers, widths):
+            best, best_distance = None, 0.5 * width
+            for key, entry in available.items():
+                distance = np.hypot(entry['center'][0] - x, entry['center'][1] - y)
+                if distance <= best_distance:
+                    best, best_distance = key, distance
+            matches.append(available.pop(best) if best is not None else None)
+        return matches
+
+    @staticmethod
+    def _landmark_signature(shape):
+        shape = np.asarray(shape, dtype=np.float32)
+        width = max(float(np.ptp(shape[:, 0])), 1.0)
+        return (shape - shape.mean(axis=0)) / width
+
+    @staticmethod
+    def _pixel_signature(frame, rect, roi):
+        if roi is not None:
+            crop = roi(frame, rect)
+        else:
+            x0, y0, x1, y1 = _box(rect)
+            crop = frame[max(y0, 0):max(y1, 0), max(x0, 0):max(x1, 0)]
+        if crop.size == 0:
+            return np.zeros((THUMBNAIL_SIZE, THUMBNAIL_SIZE), dtype=np.float32)
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY) if crop.ndim == 3 else crop
+        thumb = cv2.resize(gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE),
+                           interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+        return thumb - thumb.mean()
+
+    @staticmethod
+    def _change(kind, old, new):
+        if kind == 'landmarks':
+            return float(np.linalg.norm(new - old, axis=1).mean())
+        return float(np.abs(new - old).mean())
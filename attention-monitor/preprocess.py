@@ -0,0 +1,81 @@
+"""
+NumPy/OpenCV preprocessing for Hopenet inputs.
+
+Equivalent to the torchvision pipeline used by Facepose
+(Resize -> CenterCrop -> ToTensor -> Normalize) but works directly on the
+RGB ndarrays returned by crop_img, without a PIL round trip, and writes into
+a preallocated NCHW float32 buffer that is reused across calls.
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class FacePreprocessor:
+    """
+    Resize, center-crop and normalize face ROIs into a reusable batch buffer.
+
+    The returned array is a view into a buffer owned by the preprocessor, so
+    it is only valid until the next call from the same thread. Each thread
+    gets its own buffer, which keeps a shared instance safe to use from
+    several pose workers.
+    """
+
+    def __init__(self, size=224, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        self.size = size
+        std = np.asarray(std, dtype=np.float32)
+        # ToTensor scales to [0, 1] before Normalize; fold both into one
+        # multiply-add per pixel
+        self._scale = (1.0 / (255.0 * std)).reshape(3, 1, 1)
+        self._offset = (-np.asarray(mean, dtype=np.float32) / std).reshape(3, 1, 1)
+        self._local = threading.local()
+
+    def _buffer(self, n):
+        buf = getattr(self._local, 'buf', None)
+        if buf is None or buf.shape[0] < n:
+            buf = np.empty((n, 3, self.size, self.size), dtype=np.float32)
+            self._local.buf = buf
+        return buf[:n]
+
+    def resize_crop(self, roi):
+        """
+        Resize the short side to `size` and center-crop to a square.
+
+        Cropping the source square first and resizing once gives the same
+        framing as Resize + CenterCrop while touching fewer pixels.
+
+        Args:
+            roi: HxWx3 uint8 RGB image
+
+        Returns:
+            ndarray: size x size x 3 uint8 image
+        """
+        h, w = roi.shape[:2]
+        short = min(h, w)
+        top = int(round((h - short) / 2.0))
+        left = int(round((w - short) / 2.0))
+        square = roi[top:top + short, left:left + short]
+        interp = cv2.INTER_AREA if short > self.size else cv2.INTER_LINEAR
+        return cv2.resize(square, (self.size, self.size), interpolation=interp)
+
+    def __call__(self, rois):
+        """
+        Preprocess a list of face ROIs into an NCHW float32 batch.
+
+        Args:
+            rois: List of HxWx3 uint8 RGB images
+
+        Returns:
+            ndarray: (N, 3, size, size) float32 view into the reused buffer
+        """
+        batch = self._buffer(len(rois))
+        for out, roi in zip(batch, rois):
+            img = self.resize_crop(roi).transpose(2, 0, 1)
+            np.multiply(img, self._scale, out=out)
+            out += self._offset
+        return batch
@@ -0,0 +1,92 @@
+"""
+Columnar storage for attention records.
+
+Offline analysis writes one column per record field instead of one JSON
+object per frame. Files ending in .parquet are written with pyarrow when it
+is installed; everything else is written as a compressed NumPy .npz.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+# Record schema published by the client, in column order
+RECORD_FIELDS = (
+    ('id', str),
+    ('sortKey', str),
+    ('timestamp', np.float64),
+    ('yaw', np.float32),
+    ('pitch', np.float32),
+    ('roll', np.float32),
+    ('ear', np.float32),
+    ('blink_count', np.int32),
+    ('mar', np.float32),
+    ('yawn_count', np.int32),
+    ('lost_focus_count', np.int32),
+    ('lost_focus_duration', np.float64),
+    ('face_not_present_duration', np.float64),
+)
+
+
+def records_to_columns(records):
+    """
+    Convert a list of record dicts into one array per field.
+
+    Args:
+        records: Records as produced by AttentionTracker.update
+
+    Returns:
+        dict: Field name -> ndarray
+    """
+    return {name: np.array([record[name] for record in records], dtype=dtype)
+            for name, dtype in RECORD_FIELDS}
+
+
+def write_columns(path, columns):
+    """
+    Write columns to a .parquet or .npz file, chosen by extension.
+
+    Args:
+        path: Output file path
+        columns: Field name -> ndarray
+
+    Returns:
+        Path: The file actually written (.npz when Parquet is unavailable)
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        if HAVE_PYARROW:
+            pq.write_table(pa.table({name: np.asarray(col) for name, col in columns.items()}),
+                           str(path))
+            return path
+        print("WARNING: pyarrow is not installed, writing .npz instead of .parquet")
+        path = path.with_suffix('.npz')
+    elif path.suffix != '.npz':
+        path = path.with_suffix(path.suffix + '.npz')
+    np.savez_compressed(str(path), **columns)
+    return path
+
+
+def read_columns(path):
+    """
+    Read columns written by write_columns.
+
+    Args:
+        path: .parquet or .npz file
+
+    Returns:
+        dict: Field name -> ndarray
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        table = pq.read_table(str(path))
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    with np.load(str(path)) as data:
+        return {name: data[name] for name in data.files}
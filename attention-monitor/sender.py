@@ -0,0 +1,239 @@
+"""
+Background frame sender with per-channel backpressure.
+
+Encoding a frame as JPEG or WebP costs a few to a few tens of milliseconds,
+which would otherwise be spent on the thread that publishes records. The
+FrameSender thread owns the ZeroMQ sockets (sockets must not be shared
+between threads), encodes with them and sends.
+
+Each channel has its own queue, socket and policy for when the server or
+network can't keep up:
+
+    latest       keep only the newest message; a new one replaces it (video)
+    drop-oldest  bounded queue; when full, the oldest message is dropped
+                 (metrics: every record carries the cumulative counters)
+    block        bounded queue; put() waits for room, nothing is dropped
+                 (durable sinks)
+
+Channel sockets are set up with apply_policy(): a high-water mark sized to
+the policy, and XPUB_NODROP so that a full socket refuses a send instead
+of dropping it silently. A refused message stays at the head of its
+channel's queue and is retried, so the policy decides what is dropped and
+every drop is counted. Messages sent more than `late_after` seconds after
+capture are counted as late. On close() refused messages keep being retried
+until its timeout; only what is still queued then is dropped.
+"""
+
+import threading
+import time
+from collections import deque
+
+import zmq
+
+POLICIES = ('latest', 'drop-oldest', 'block')
+
+# Kernel send buffer of 'latest' sockets, in bytes
+LATEST_SNDBUF = 64 * 1024
+
+# How long the sender waits before retrying a socket that refused a send
+RETRY_INTERVAL = 0.005
+
+
+def apply_policy(socket, policy, maxsize):
+    """
+    Set up a PUB socket for a channel's policy. Call before connecting.
+
+    Args:
+        socket: PUB socket that will only carry this channel
+        policy: One of POLICIES
+        maxsize: The channel's queue size
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown backpressure policy: {policy}")
+    if policy == 'latest':
+        # Stale messages shouldn't pile up inside ZeroMQ or the kernel either
+        socket.setsockopt(zmq.SNDHWM, 1)
+        socket.setsockopt(zmq.SNDBUF, LATEST_SNDBUF)
+    else:
+        socket.setsockopt(zmq.SNDHWM, maxsize)
+    socket.setsockopt(zmq.XPUB_NODROP, 1)
+
+
+class Channel:
+    """
+    Queue, backpressure policy and counters of one channel.
+
+    Args:
+        send: Callable (item, flags) that sends one item on the channel's
+            socket; raises zmq.Again when the socket is full. Only ever
+            called from the sender thread
+        policy: One of POLICIES
+        maxsize: Messages that may wait (always 1 for 'latest')
+        late_after: Seconds after capture a sent message counts as late
+        timeout: Seconds put() waits for room under 'block' (None = forever)
+    """
+
+    def __init__(self, send, policy='drop-oldest', maxsize=64, late_after=0.5, timeout=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.send = send
+        self.policy = policy
+        self.maxsize = 1 if policy == 'latest' else maxsize
+        self.late_after = late_after
+        self.timeout = timeout
+        self.queue = deque()
+        # The head entry while the sender thread is sending it; put() never drops it
+        self.inflight = None
+        self.sent = 0
+        self.dropped = 0
+        self.late = 0
+        self.refused = 0
+        self.errors = 0
+        self.blocked_time = 0.0
+
+
+class FrameSender(threading.Thread):
+    """
+    Send queued messages of several channels from a dedicated thread.
+
+    Args:
+        channels: Dict of channel name -> Channel, in priority order
+    """
+
+    def __init__(self, channels):
+        super().__init__(name='Sender Thread', daemon=True)
+        self.channels = channels
+        self._cond = threading.Condition()
+        self._closed = False
+        # perf_counter() time close() gives up at (None = never)
+        self._deadline = None
+
+    def put(self, channel, item, captured=None):
+        """
+        Queue a message on a channel, applying its policy when the queue is full.
+
+        Args:
+            channel: Channel name
+            item: Passed to the channel's send callable
+            captured: Capture time of the message, for the late counter
+
+        Returns:
+            bool: False if the message was dropped
+        """
+        channel = self.channels[channel]
+        with self._cond:
+            if channel.policy == 'block' and len(channel.queue) >= channel.maxsize:
+                start = time.perf_counter()
+                room = self._cond.wait_for(
+                    lambda: len(channel.queue) < channel.maxsize or self._closed,
+                    channel.timeout)
+                channel.blocked_time += time.perf_counter() - start
+                if not room or self._closed:
+                    channel.dropped += 1
+                    return False
+            elif len(channel.queue) >= channel.maxsize:
+                self._drop_oldest(channel)
+            channel.queue.append((item, captured))
+            self._cond.notify_all()
+        return True
+
+    def run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or any(c.queue for c in self.channels.values()))
+                pending = [c for c in self.channels.values() if c.queue]
+                if not pending:
+                    return
+                if self._closed and self._deadline is not None \
+                        and time.perf_counter() >= self._deadline:
+                    # The server is gone or stuck; don't hang on shutdown
+                    for channel in pending:
+                        channel.dropped += len(channel.queue)
+                        channel.queue.clear()
+                    return
+                # Send the head of each channel; it is only removed once sent
+                heads = []
+                for channel in pending:
+                    channel.inflight = channel.queue[0]
+                    heads.append((channel, channel.inflight))
+
+            progressed = False
+            for channel, head in heads:
+                item, captured = head
+                try:
+                    channel.send(item, zmq.NOBLOCK)
+                except zmq.Again:
+                    with self._cond:
+                        channel.refused += 1
+                        channel.inflight = None
+                        # put() may have queued past the in-flight head meanwhile
+                        while len(channel.queue) > channel.maxsize:
+                            channel.queue.popleft()
+                            channel.dropped += 1
+                    continue
+                except Exception as e:
+                    channel.errors += 1
+                    print(f"WARNING: could not send frame: {e}")
+                else:
+                    channel.sent += 1
+                    if captured is not None and time.time() - captured > channel.late_after:
+                        channel.late += 1
+                progressed = True
+                with self._cond:
+                    channel.queue.popleft()
+                    channel.inflight = None
+                    self._cond.notify_all()
+
+            if not progressed:
+                with self._cond:
+                    wait = RETRY_INTERVAL
+                    if self._closed and self._deadline is not None:
+                        wait = max(0.0, min(wait, self._deadline - time.perf_counter()))
+                    self._cond.wait(wait)
+
+    @staticmethod
+    def _drop_oldest(channel):
+        """Drop the oldest queued message that isn't being sent. Call with the lock held."""
+        queue = channel.queue
+        if queue[0] is not channel.inflight:
+            queue.popleft()
+        elif len(queue) > 1:
+            del queue[1]
+        else:
+            # Only the in-flight message is queued; it makes room once sent
+            return
+        channel.dropped += 1
+
+    def close(self, timeout=1.0):
+        """
+        Send what is still queued, then stop.
+
+        Refused messages are retried until `timeout` seconds have passed;
+        whatever is still queued then is dropped and counted.
+
+        Args:
+            timeout: Seconds to keep retrying (None = until everything is sent)
+        """
+        with self._cond:
+            self._closed = True
+            if timeout is not None:
+                self._deadline = time.perf_counter() + timeout
+            self._cond.notify_all()
+        # The thread gives up by itself at the deadline, after at most one
+        # more round of sends
+        self.join()
+
+    def stats(self):
+        stats = {}
+        for name, channel in self.channels.items():
+            stats.update({
+                f"{name}_sent": channel.sent,
+                f"{name}_dropped": channel.dropped,
+                f"{name}_late": channel.late,
+                f"{name}_refused": channel.refused,
+                f"{name}_errors": channel.errors,
+                f"{name}_queued": len(channel.queue),
+                f"{name}_blocked_seconds": channel.blocked_time,
+            })
+        return stats
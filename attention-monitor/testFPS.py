@@ -1,25 +1,485 @@
-import cv2
+"""
+End-to-end latency and throughput harness for the client.
+
+Runs the client's capture -> detect -> landmarks -> pose -> publish path on
+frames from a camera, a video file or a synthetic source. The published
+messages are received on a local SUB socket that stands in for the server.
+Every message carries its frame's capture time ('captured') and send time
+('sent'), and each run reports:
+
+    achieved fps      frames received per second after warm-up
+    sustained fps     throughput held in 90% of the 1 s windows after warm-up
+    capture->publish  p50/p95/p99 latency, capture to send_array
+    capture->server   p50/p95/p99 latency, capture to receipt of the metrics message
+    dropped           frames the capture thread overwrote before analysis
+
+--codec, --quality and --bandwidth set the frame codec as in main.py; frames
+are then encoded on a FrameSender thread as they are live.
+
+Every combination of --rates (the client's FRAME_RATE) and --resolutions is
+run in turn. For each resolution the harness reports the highest rate the
+client kept up with (achieved at least 90% of it) and the first rate at
+which it saturated.
+
+Video files and synthetic frames are delivered at --source-fps like a
+camera, and the video loops. Synthetic frames show image/lena.jpg with a
+little motion, so the detectors and the pose model see a real face.
+
+Usage:
+    python testFPS.py --source synthetic --rates 5,10,15,20,30 --resolutions 640x480,1280x720
+    python testFPS.py --source video --video recordings/lecture.mp4 --pipeline
+    python testFPS.py --source camera --rates 5 --duration 30
+"""
+
+import argparse
+import json
+import threading
 import time
-def main():
-    cap = cv2.VideoCapture(0)
-    frame_rate = 3
-    prev = 0
+from pathlib import Path
+
+import cv2
+import numpy as np
+import zmq
+
+import main as client
+from attention import AttentionTracker
+from capture import CaptureThread
+from sender import Channel, FrameSender
+from zeromq.SerializingContext import CODECS, METRICS, VIDEO, SerializingContext
+
+IMAGE_PATH = Path(__file__).parent.parent / "image" / "lena.jpg"
+
+# The client keeps up with a rate when at least this fraction of it arrives
+KEEP_UP = 0.9
+
+
+# ============================================================================
+# Frame Sources
+# ============================================================================
+
+class PacedCapture:
+    """
+    cv2.VideoCapture look-alike that delivers frames at a fixed rate.
+
+    grab() blocks until the next frame is due, as it would with a camera,
+    so CaptureThread behaves the same as it does live.
+
+    Args:
+        fps: Frames per second delivered by grab()
+    """
+
+    def __init__(self, fps):
+        self.interval = 1.0 / fps
+        self._next = None
+
+    def isOpened(self):
+        return True
+
+    def grab(self):
+        now = time.perf_counter()
+        if self._next is None:
+            self._next = now
+        if self._next > now:
+            time.sleep(self._next - now)
+        # Don't build up a backlog if the caller fell behind
+        self._next = max(self._next + self.interval, time.perf_counter() - self.interval)
+        return self._advance()
+
+    def release(self):
+        pass
+
+    def _advance(self):
+        return True
+
+
+class SyntheticCapture(PacedCapture):
+    """
+    A face on a plain background, drifting slowly.
+
+    Args:
+        size: (width, height) of the frames
+        fps: Frames per second delivered by grab()
+    """
+
+    def __init__(self, size, fps):
+        super().__init__(fps)
+        width, height = size
+        image = cv2.imread(str(IMAGE_PATH))
+        if image is None:
+            raise IOError(f"Could not read {IMAGE_PATH}")
+        side = int(min(width, height) * 0.6)
+        self.face = cv2.resize(image, (side, side))
+        self.background = np.full((height, width, 3), 96, dtype=np.uint8)
+        self.frames = 0
+
+    def _advance(self):
+        self.frames += 1
+        return True
+
+    def retrieve(self):
+        frame = self.background.copy()
+        height, width = frame.shape[:2]
+        side = self.face.shape[0]
+        # Move the face around a small circle so consecutive frames differ
+        angle = self.frames * 0.2
+        left = (width - side) // 2 + int(10 * np.cos(angle))
+        top = (height - side) // 2 + int(10 * np.sin(angle))
+        frame[top:top + side, left:left + side] = self.face
+        return True, frame
+
+
+class VideoFileCapture(PacedCapture):
+    """
+    Loop a video file at a fixed rate, resized to `size`.
+
+    Args:
+        path: Video file
+        size: (width, height) of the frames
+        fps: Frames per second delivered by grab()
+    """
+
+    def __init__(self, path, size, fps):
+        super().__init__(fps)
+        self.cap = cv2.VideoCapture(str(path))
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open {path}")
+        self.size = size
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def _advance(self):
+        if self.cap.grab():
+            return True
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return self.cap.grab()
+
+    def retrieve(self):
+        ret, frame = self.cap.retrieve()
+        if ret and (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return ret, frame
 
-    while (True):
+    def release(self):
+        self.cap.release()
 
-        time_elapsed = time.time() - prev
-        res, image = cap.read()
 
-        if time_elapsed > 1. / frame_rate:
-            prev = time.time()
+def open_source(source, size, fps, video=None):
+    """
+    Open a frame source at the requested resolution.
 
-            cv2.imshow('frame', cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+    Args:
+        source: 'camera', 'video' or 'synthetic'
+        size: (width, height)
+        fps: Delivery rate for video and synthetic sources
+        video: Video file for the 'video' source
 
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+    Returns:
+        VideoCapture-like object, or None if no camera could be opened
+    """
+    if source == 'synthetic':
+        return SyntheticCapture(size, fps)
+    if source == 'video':
+        return VideoFileCapture(video, size, fps)
 
-            # Do something with your image here.
+    cap = client.open_camera()
+    if cap is not None:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    return cap
+
+
+# ============================================================================
+# Server Stand-in
+# ============================================================================
+
+class Receiver(threading.Thread):
+    """
+    SUB socket that timestamps every metrics message on arrival.
+
+    Video messages are received (and decoded) but not sampled. Only
+    messages whose id matches the current run are kept, so stragglers from
+    the previous run don't pollute the next one.
+
+    Args:
+        port: TCP port to bind on 127.0.0.1
+    """
+
+    def __init__(self, port):
+        super().__init__(name='Receiver', daemon=True)
+        self.context = SerializingContext()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.setsockopt(zmq.SUBSCRIBE, b'')
+        self.socket.bind(f"tcp://127.0.0.1:{port}")
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._running.set()
+        self.run_id = None
+        self.samples = []
+
+    def run(self):
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        while self._running.is_set():
+            if not poller.poll(100):
+                continue
+            topic, data, _ = self.socket.recv_message()
+            received = time.time()
+            if topic is not None and not topic.startswith(METRICS):
+                continue
+            with self._lock:
+                if data.get('id') == self.run_id and 'captured' in data:
+                    self.samples.append((data['captured'], data['sent'], received))
+
+    def begin(self, run_id):
+        with self._lock:
+            self.run_id = run_id
+            self.samples = []
+
+    def collect(self):
+        """Return and clear the (captured, sent, received) samples of this run."""
+        with self._lock:
+            samples, self.samples = self.samples, []
+        return np.array(samples, dtype=np.float64).reshape(-1, 3)
+
+    def stop(self):
+        self._running.clear()
+        self.join(timeout=1.0)
+        self.socket.close()
+        self.context.term()
+
+
+# ============================================================================
+# Runs
+# ============================================================================
+
+def percentiles(values):
+    if len(values) == 0:
+        return {'p50_ms': float('nan'), 'p95_ms': float('nan'), 'p99_ms': float('nan')}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1e3
+    return {'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+
+
+def summarise(samples, start, end):
+    """
+    Reduce one run's samples to throughput and latency figures.
+
+    Args:
+        samples: (N, 3) array of captured, sent, received times
+        start: Wall time the measurement window opened (after warm-up)
+        end: Wall time the measurement window closed
+
+    Returns:
+        dict: achieved/sustained fps and latency percentiles
+    """
+    samples = samples[(samples[:, 0] >= start) & (samples[:, 0] < end)]
+    seconds = end - start
+    windows = np.histogram(samples[:, 2], bins=max(1, int(seconds)),
+                           range=(start, start + max(1, int(seconds))))[0]
+    return {
+        'frames': len(samples),
+        'achieved_fps': len(samples) / seconds,
+        'sustained_fps': float(np.percentile(windows, 100 * (1 - KEEP_UP))),
+        'capture_to_publish': percentiles(samples[:, 1] - samples[:, 0]),
+        'capture_to_server': percentiles(samples[:, 2] - samples[:, 0]),
+    }
+
+
+def run(receiver, cap, rate, duration, warmup, pipelined=False, workers=None, video_rate=None):
+    """
+    Drive the client pipeline on one source at one frame rate.
+
+    Args:
+        receiver: Receiver collecting the published messages
+        cap: Opened frame source
+        rate: Client FRAME_RATE (0 = as fast as frames arrive)
+        duration: Seconds to measure, after warm-up
+        warmup: Seconds discarded at the start
+        pipelined: Use the threaded pipeline instead of the serial loop
+        workers: Optional dict of stage name -> worker count (pipelined only)
+        video_rate: Frames per second published on the video channel
+
+    Returns:
+        dict: Results of summarise() plus capture drop counters
+    """
+    run_id = f"fps-{rate:g}-{time.time():.0f}"
+    receiver.begin(run_id)
+    tracker = AttentionTracker(run_id, client.EYE_CLOSED_THRESHOLD, client.YAWN_THRESHOLD,
+                               client.FOCUS_YAW_THRESHOLD)
+    publisher = client.RecordPublisher(run_id, tracker, video_rate=video_rate)
+
+    capture = CaptureThread(cap, rate, prepare=client.prepare_frame)
+    capture.start()
+    start = time.time() + warmup
+    end = start + duration
+
+    pipeline = None
+    if pipelined:
+        pipeline = client.build_pipeline(publisher, workers)
+        pipeline.start()
+
+    try:
+        while time.time() < end:
+            item = capture.read(timeout=1.0)
+            if item is None:
+                if not capture.is_alive():
+                    print("WARNING: source stopped delivering frames")
+                    end = min(end, time.time())
+                    break
+                continue
+            timestamp, (frame, gray) = item
+            job = {'timestamp': timestamp, 'frame': frame, 'gray': gray}
+            if pipeline is not None:
+                pipeline.submit(job)
+            else:
+                publisher(client.analyse_frame(job))
+    finally:
+        capture.stop()
+        capture.join(timeout=1.0)
+        if pipeline is not None:
+            pipeline.stop()
+
+    # Let in-flight messages arrive
+    time.sleep(0.2)
+    result = summarise(receiver.collect(), start, end)
+    result.update(rate=rate, capture=capture.stats())
+    if pipeline is not None:
+        result['pipeline'] = pipeline.stats()
+    return result
+
+
+def report(result):
+    publish, server = result['capture_to_publish'], result['capture_to_server']
+    rate = f"{result['rate']:g}" if result['rate'] else 'max'
+    print(f"{result['resolution']:>10} {rate:>5} {result['achieved_fps']:>8.1f} "
+          f"{result['sustained_fps']:>9.1f} "
+          f"{publish['p50_ms']:>7.1f} {publish['p95_ms']:>7.1f} {publish['p99_ms']:>7.1f} "
+          f"{server['p50_ms']:>7.1f} {server['p95_ms']:>7.1f} {server['p99_ms']:>7.1f} "
+          f"{result['capture']['dropped']:>7}")
+
+
+def saturation(results):
+    """
+    Find, per resolution, the highest rate sustained and the first one that wasn't.
+
+    Returns:
+        dict: resolution -> (highest rate kept up with or None,
+            first saturated rate or None, best sustained fps)
+    """
+    points = {}
+    for resolution in dict.fromkeys(r['resolution'] for r in results):
+        runs = sorted((r for r in results if r['resolution'] == resolution and r['rate']),
+                      key=lambda r: r['rate'])
+        kept, saturated = None, None
+        for r in runs:
+            if r['achieved_fps'] >= KEEP_UP * r['rate']:
+                kept = r['rate']
+            elif saturated is None:
+                saturated = r['rate']
+        best = max(r['sustained_fps'] for r in results if r['resolution'] == resolution)
+        points[resolution] = (kept, saturated, best)
+    return points
+
+
+def main(source, rates, resolutions, duration, warmup, source_fps, video=None, port=5557,
+         pipelined=False, workers=None, output=None, codec='raw', quality=None, bandwidth=0,
+         video_rate=None):
+    if client.socket is None:
+        # main.py only creates its sockets when dlib is available
+        client.socket = client.context.socket(zmq.PUB)
+        client.video_socket = client.context.socket(zmq.PUB)
+    receiver = Receiver(port)
+    receiver.start()
+    client.socket.connect(f"tcp://127.0.0.1:{port}")
+    client.video_socket.connect(f"tcp://127.0.0.1:{port}")
+    client.video_socket.set_codec(codec, quality, bandwidth * 1000 or None)
+    if codec != 'raw' or bandwidth:
+        client.frame_sender = FrameSender({
+            METRICS: Channel(lambda item, flags: client.send_metrics(*item, flags=flags),
+                             'drop-oldest', maxsize=2),
+            VIDEO: Channel(lambda item, flags: client.send_video(*item, flags=flags), 'latest'),
+        })
+        client.frame_sender.start()
+    # Give the SUB socket time to connect before the first message
+    time.sleep(0.5)
+
+    client.load_pose_model()
+    results = []
+    print(f"{'size':>10} {'rate':>5} {'achieved':>8} {'sustained':>9} "
+          f"{'pub p50':>7} {'p95':>7} {'p99':>7} {'srv p50':>7} {'p95':>7} {'p99':>7} "
+          f"{'dropped':>7}")
+    try:
+        for size in resolutions:
+            for rate in rates:
+                if source != 'camera' and rate > source_fps:
+                    print(f"WARNING: rate {rate:g} is above the source's {source_fps} fps")
+                cap = open_source(source, size, source_fps, video)
+                if cap is None:
+                    print("ERROR: Could not open a camera. Try setting CAM_INDEX=0 or 1.")
+                    return results
+                try:
+                    result = run(receiver, cap, rate, duration, warmup, pipelined, workers,
+                                 video_rate)
+                finally:
+                    cap.release()
+                result['resolution'] = f"{size[0]}x{size[1]}"
+                results.append(result)
+                report(result)
+    finally:
+        if client.frame_sender is not None:
+            client.frame_sender.close()
+            client.frame_sender = None
+        receiver.stop()
+
+    for resolution, (kept, saturated, best) in saturation(results).items():
+        line = f"{resolution}: " + (f"keeps up to {kept:g} fps" if kept is not None
+                                     else "keeps up with none of the tested rates")
+        if saturated is not None:
+            line += f", saturates at {saturated:g} fps"
+        print(f"{line} (best sustained {best:.1f} fps)")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'source': source, 'pipelined': pipelined, 'codec': codec,
+                       'results': results},
+                      f, indent=2, default=float)
+        print(f"Wrote {output}")
+    return results
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='End-to-end client latency and throughput')
+    parser.add_argument('--source', choices=['camera', 'video', 'synthetic'], default='synthetic')
+    parser.add_argument('--video', default=None, help='Video file for --source video')
+    parser.add_argument('--rates', default=f"{client.FRAME_RATE},10,15,20,30",
+                        help='Comma-separated client frame rates to sweep (0 = unthrottled)')
+    parser.add_argument('--resolutions', default='640x480',
+                        help='Comma-separated WIDTHxHEIGHT capture resolutions to sweep')
+    parser.add_argument('--source-fps', type=float, default=30,
+                        help='Frame rate of video and synthetic sources')
+    parser.add_argument('--duration', type=float, default=10, help='Measured seconds per run')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds discarded per run')
+    parser.add_argument('--port', type=int, default=5557, help='Local port for the receiver')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Use the threaded pipeline (see main.py --pipeline)')
+    parser.add_argument('--workers', default=None,
+                        help='Per-stage worker counts for --pipeline, e.g. "detect=2,pose=2"')
+    parser.add_argument('--pose-backend', choices=client.pose_models.names(), default=None,
+                        help='Head pose model (see main.py --pose-backend)')
+    parser.add_argument('--codec', choices=CODECS, default='raw', help='Frame codec')
+    parser.add_argument('--quality', type=int, default=None, help='Codec quality')
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help='Frame bandwidth budget in KB/s (0 = unlimited)')
+    parser.add_argument('--video-rate', type=float, default=None,
+                        help='Frames per second on the video channel (default: every frame)')
+    parser.add_argument('--output', default=None, help='Write the results as JSON')
+    args = parser.parse_args()
+
+    if args.source == 'video' and not args.video:
+        parser.error('--source video needs --video')
+    client.configure(pose_backend=args.pose_backend)
+    main(args.source, [float(r) for r in args.rates.split(',')],
+         [tuple(int(v) for v in r.lower().split('x')) for r in args.resolutions.split(',')],
+         args.duration, args.warmup, args.source_fps, args.video, args.port, args.pipeline,
+         client.parse_workers(args.workers), args.output, args.codec, args.quality,
+         args.bandwidth, args.video_rate)
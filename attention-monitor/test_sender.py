@@ -0,0 +1,96 @@
+"""
+Accounting checks for FrameSender under random send refusals.
+
+Every message offered to put() must end up sent, dropped or still queued,
+whatever the interleaving of put(), refusals and close().
+"""
+
+import random
+import threading
+import time
+
+import pytest
+
+zmq = pytest.importorskip('zmq')
+
+from sender import POLICIES, Channel, FrameSender  # noqa: E402
+
+
+def flaky_send(refuse_rate, seed):
+    """Return a send callable that raises zmq.Again at random."""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def send(item, flags):
+        with lock:
+            refused = rng.random() < refuse_rate
+        if refused:
+            raise zmq.Again()
+
+    return send
+
+
+def refused_send(item, flags):
+    raise zmq.Again()
+
+
+def assert_accounted(channel, offered):
+    assert channel.sent + channel.dropped + len(channel.queue) == offered
+
+
+@pytest.mark.parametrize('policy', POLICIES)
+def test_every_message_is_accounted_for(policy):
+    offered = 2000
+    channels = {name: Channel(flaky_send(0.5, seed), policy, maxsize=8)
+                for seed, name in enumerate(('metrics', 'video'))}
+    sender = FrameSender(channels)
+    sender.start()
+
+    def produce(name):
+        for i in range(offered):
+            sender.put(name, i, captured=time.time())
+            if i % 100 == 0:
+                time.sleep(0.001)
+
+    producers = [threading.Thread(target=produce, args=(name,)) for name in channels]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    sender.close(timeout=10.0)
+
+    assert not sender.is_alive()
+    for channel in channels.values():
+        assert_accounted(channel, offered)
+        assert channel.inflight is None
+        if policy == 'block':
+            assert channel.dropped == 0
+            assert channel.sent == offered
+
+
+def test_close_drains_block_channel_before_deadline():
+    channel = Channel(flaky_send(0.5, 1), 'block', maxsize=64)
+    sender = FrameSender({'records': channel})
+    for i in range(64):
+        sender.put('records', i)
+    sender.start()
+    sender.close(timeout=10.0)
+
+    assert channel.dropped == 0
+    assert channel.sent == 64
+    assert not channel.queue
+
+
+def test_close_drops_what_is_left_at_the_deadline():
+    channel = Channel(refused_send, 'block', maxsize=16)
+    sender = FrameSender({'records': channel})
+    for i in range(16):
+        sender.put('records', i)
+    sender.start()
+    began = time.perf_counter()
+    sender.close(timeout=0.2)
+
+    assert time.perf_counter() - began >= 0.2
+    assert channel.sent == 0
+    assert channel.dropped == 16
+    assert_accounted(channel, 16)
@@ -0,0 +1,243 @@
+"""
+Detect-then-track face localisation.
+
+Running the HOG detector over the full frame is the biggest fixed cost per
+frame. FaceTracker runs it only every `interval` frames, or sooner when
+tracking becomes unreliable, and follows the faces in between with a cheap
+tracker:
+
+- 'correlation': one dlib correlation tracker per face; its peak-to-side-lobe
+  ratio is used as the tracking confidence
+- 'landmarks': the box is derived from the landmarks of the previous frame,
+  using the detector-box/landmark-box relationship measured at detection time
+
+Tracking needs dlib; without it every frame goes through the detector.
+"""
+
+import threading
+
+import numpy as np
+
+try:
+    import dlib
+    HAVE_DLIB = True
+except ImportError:
+    HAVE_DLIB = False
+
+BACKENDS = ('correlation', 'landmarks')
+
+
+def _center(rect):
+    return ((rect.left() + rect.right()) / 2.0, (rect.top() + rect.bottom()) / 2.0)
+
+
+def _landmark_box(shape):
+    xs, ys = shape[:, 0], shape[:, 1]
+    return float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max())
+
+
+class FaceTracker:
+    """
+    Decide per frame whether to detect or track, and return face rects.
+
+    Args:
+        detect: Callable taking a grayscale frame and returning dlib rectangles
+        interval: Run full detection at least every `interval` frames
+        min_confidence: Re-detect when any correlation tracker's confidence
+            falls below this value
+        backend: 'correlation' or 'landmarks'
+    """
+
+    def __init__(self, detect, interval=10, min_confidence=7.0, backend='correlation'):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown tracker backend: {backend}")
+        self.detect = detect
+        self.interval = max(1, int(interval))
+        self.min_confidence = min_confidence
+        self.backend = backend if HAVE_DLIB else None
+
+        self._lock = threading.Lock()
+        self._rects = []
+        self._trackers = []
+        self._calibration = []
+        self._shapes = None
+        self._since_detect = 0
+        # Frame numbers (1-based, see `frames`) of the last detection and of
+        # the landmarks in _shapes, so observations can be matched to frames
+        self._detect_frame = 0
+        self._detect_rects = []
+        self._observed_frame = 0
+        self._started = False
+
+        self.frames = 0
+        self.detections = 0
+        self.triggers = {'start': 0, 'interval': 0, 'confidence': 0,
+                         'landmarks_lost': 0, 'no_faces': 0}
+        self._drift_count = 0
+        self._drift_sum = 0.0
+        self._drift_max = 0.0
+
+    def __call__(self, gray):
+        """
+        Locate faces in a grayscale frame.
+
+        Args:
+            gray: Grayscale frame
+
+        Returns:
+            list: Face rectangles
+        """
+        with self._lock:
+            self.frames += 1
+            if self.backend is None:
+                return self._detect(gray, 'interval')
+
+            trigger = self._trigger()
+            if trigger is None:
+                rects = self._track(gray)
+                if rects is not None:
+                    self._rects = rects
+                    self._since_detect += 1
+                    return rects
+                trigger = 'confidence' if self.backend == 'correlation' else 'landmarks_lost'
+            return self._detect(gray, trigger)
+
+    def observe(self, shapes, frame=None):
+        """
+        Feed back the landmarks computed for the rects of a frame.
+
+        Only used by the 'landmarks' backend, which builds the next frame's
+        boxes from them. Observations older than the last detection or than
+        an observation already seen are ignored, so landmarks arriving late
+        from a pipeline never calibrate against the wrong frame.
+
+        Args:
+            shapes: List of (68, 2) landmark arrays, one per rect
+            frame: `frames` as it was right after the rects were returned
+                (default: the rects last returned)
+        """
+        if self.backend != 'landmarks':
+            return
+        with self._lock:
+            if frame is None:
+                frame = self.frames
+            if frame < self._detect_frame or frame <= self._observed_frame:
+                return
+            if frame == self._detect_frame:
+                if len(shapes) != len(self._detect_rects):
+                    return
+                # Remember where the detector put its box relative to the
+                # landmark box so tracked boxes keep the same framing
+                self._calibration = []
+                for rect, shape in zip(self._detect_rects, shapes):
+                    x0, y0, x1, y1 = _landmark_box(shape)
+                    w, h = max(x1 - x0, 1.0), max(y1 - y0, 1.0)
+                    self._calibration.append(((rect.left() - x0) / w, (rect.top() - y0) / h,
+                                              (rect.right() - x1) / w, (rect.bottom() - y1) / h))
+            elif len(shapes) != len(self._calibration):
+                return
+            self._shapes = [np.asarray(shape) for shape in shapes]
+            self._observed_frame = frame
+
+    def reset(self):
+        """
+        Forget every tracked face so the next frame runs full detection.
+
+        Counters and drift statistics are kept.
+        """
+        with self._lock:
+            self._rects = []
+            self._trackers = []
+            self._calibration = []
+            self._shapes = None
+            self._since_detect = 0
+            self._detect_rects = []
+            self._started = False
+
+    def stats(self):
+        """
+        Return detection cadence, re-detection triggers and tracker drift.
+
+        Drift is the distance in pixels between where a face was being
+        tracked and where the detector found it on the next re-detection.
+
+        Returns:
+            dict: Counters and drift summary
+        """
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'frames': self.frames,
+                'detections': self.detections,
+                'detection_rate': self.detections / self.frames if self.frames else 0.0,
+                'triggers': dict(self.triggers),
+                'mean_drift': self._drift_sum / self._drift_count if self._drift_count else 0.0,
+                'max_drift': self._drift_max,
+            }
+
+    def _trigger(self):
+        if not self._started:
+            return 'start'
+        if not self._rects:
+            return 'no_faces'
+        if self._since_detect + 1 >= self.interval:
+            return 'interval'
+        return None
+
+    def _detect(self, gray, trigger):
+        rects = list(self.detect(gray))
+        self.detections += 1
+        self.triggers[trigger] += 1
+        if self.backend is not None:
+            self._record_drift(rects)
+            if self.backend == 'correlation':
+                self._trackers = []
+                for rect in rects:
+                    tracker = dlib.correlation_tracker()
+                    tracker.start_track(gray, rect)
+                    self._trackers.append(tracker)
+        self._rects = rects
+        self._detect_rects = rects
+        self._detect_frame = self.frames
+        self._started = True
+        self._shapes = None
+        self._calibration = []
+        self._since_detect = 0
+        return rects
+
+    def _track(self, gray):
+        if self.backend == 'correlation':
+            rects = []
+            for tracker in self._trackers:
+                if tracker.update(gray) < self.min_confidence:
+                    return None
+                pos = tracker.get_position()
+                rects.append(dlib.rectangle(int(pos.left()), int(pos.top()),
+                                            int(pos.right()), int(pos.bottom())))
+            return rects
+
+        # Landmark backend: wait for landmarks of the previous frame
+        if self._shapes is None or len(self._calibration) != len(self._shapes):
+            return None
+        height, width = gray.shape[:2]
+        rects = []
+        for shape, (dl, dt, dr, db) in zip(self._shapes, self._calibration):
+            x0, y0, x1, y1 = _landmark_box(shape)
+            w, h = x1 - x0, y1 - y0
+            left, top = int(x0 + dl * w), int(y0 + dt * h)
+            right, bottom = int(x1 + dr * w), int(y1 + db * h)
+            if right <= 0 or bottom <= 0 or left >= width or top >= height:
+                return None
+            rects.append(dlib.rectangle(left, top, right, bottom))
+        return rects
+
+    def _record_drift(self, detected):
+        # Nothing was tracked if the previous frame's rects came from the detector
+        if not self._rects or self._detect_frame == self.frames - 1 or not detected:
+            return
+        centers = np.array([_center(rect) for rect in detected])
+        for rect in self._rects:
+            drift = float(np.min(np.linalg.norm(centers - _center(rect), axis=1)))
+            self._drift_count += 1
+            self._drift_sum += drift
+            self._drift_max = max(self._drift_max, drift)
@@ -1,16 +1,22 @@
 import  numpy as np
 from math import cos, sin
 import cv2
-from scipy.spatial import distance as dist
+
+
+def _euclidean(p, q):
+    # same result as scipy.spatial.distance.euclidean without importing scipy
+    d = np.asarray(p, dtype=np.float64) - np.asarray(q, dtype=np.float64)
+    return float(np.sqrt(np.dot(d, d)))
+
 
 def eye_aspect_ratio(eye):
     # compute the euclidean distances between the two sets of
     # vertical eye landmarks (x, y)-coordinates
-    A = dist.euclidean(eye[1], eye[5])
-    B = dist.euclidean(eye[2], eye[4])
+    A = _euclidean(eye[1], eye[5])
+    B = _euclidean(eye[2], eye[4])
     # compute the euclidean distance between the horizontal
     # eye landmark (x, y)-coordinates
-    C = dist.euclidean(eye[0], eye[3])
+    C = _euclidean(eye[0], eye[3])
     # compute the eye aspect ratio
     ear = (A + B) / (2.0 * C)
     # return the eye aspect ratio
@@ -20,15 +26,69 @@ def eye_aspect_ratio(eye):
 def mouth_aspect_ratio(mouth):
     # compute the euclidean distances between the two sets of
     # vertical eye landmarks (x, y)-coordinates
-    A = dist.euclidean(mouth[2], mouth[6])
+    A = _euclidean(mouth[2], mouth[6])
     # compute the euclidean distance between the horizontal
     # eye landmark (x, y)-coordinates
-    B = dist.euclidean(mouth[0], mouth[4])
+    B = _euclidean(mouth[0], mouth[4])
     # compute the eye aspect ratio
     mar = A / B
     # return the eye aspect ratio
     return mar
 
+
+# Landmark index pairs (68-point dlib layout) for every distance the EAR/MAR
+# formulas need: left eye A, B, C, right eye A, B, C, mouth A, B
+_RATIO_PAIRS = np.array([
+    [37, 41], [38, 40], [36, 39],
+    [43, 47], [44, 46], [42, 45],
+    [62, 66], [60, 64],
+])
+
+
+def aspect_ratios(shapes):
+    # vectorized EAR/MAR over stacked landmarks of shape (..., 68, 2), e.g.
+    # (N, 68, 2) for the faces in a frame or (T, N, 68, 2) for a recording.
+    # Returns left EAR, right EAR, average EAR and MAR, each shaped (...),
+    # matching eye_aspect_ratio / mouth_aspect_ratio point for point
+    pts = np.asarray(shapes, dtype=np.float64)
+    diff = pts[..., _RATIO_PAIRS[:, 0], :] - pts[..., _RATIO_PAIRS[:, 1], :]
+    d = np.sqrt(np.einsum('...i,...i->...', diff, diff))
+
+    left_ear = (d[..., 0] + d[..., 1]) / (2.0 * d[..., 2])
+    right_ear = (d[..., 3] + d[..., 4]) / (2.0 * d[..., 5])
+    ear = (left_ear + right_ear) / 2.0
+    mar = d[..., 6] / d[..., 7]
+    return left_ear, right_ear, ear, mar
+
+def parse_scales(scales):
+    """
+    Validate face detection downscale factors.
+
+    Args:
+        scales: Comma-separated string (e.g. "0.5,1.0") or iterable of numbers
+
+    Returns:
+        tuple: The factors as floats
+
+    Raises:
+        ValueError: If a factor isn't a number in (0, 1]
+    """
+    if isinstance(scales, str):
+        scales = [x for x in scales.split(',') if x.strip()]
+    parsed = []
+    for scale in scales:
+        try:
+            value = float(scale)
+        except (TypeError, ValueError):
+            raise ValueError(f"Detection scale {scale!r} is not a number") from None
+        if not 0.0 < value <= 1.0:
+            raise ValueError(f"Detection scale {value:g} is outside (0, 1]")
+        parsed.append(value)
+    if not parsed:
+        raise ValueError("No detection scales given")
+    return tuple(parsed)
+
+
 def rec_to_roi_box(rect):
     bbox = [rect.left(), rect.top(), rect.right(), rect.bottom()]
 
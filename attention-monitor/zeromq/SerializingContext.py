@@ -1,29 +1,344 @@
+import json
+import struct
+import time
+import uuid
+
 import zmq
 import numpy as np
+import cv2
+
+# Frame codecs. The codec name travels in the JSON metadata header, so a
+# receiver decodes whatever each sender chose. 'raw' messages carry no codec
+# key and stay readable by receivers that predate codecs.
+CODECS = ('raw', 'jpeg', 'webp', 'png')
+
+# cv2.imencode extension and quality parameter per codec. PNG's "quality" is
+# its zlib compression level (0-9); it is lossless at every level.
+_ENCODERS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 80),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 80),
+    'png': ('.png', cv2.IMWRITE_PNG_COMPRESSION, 3),
+}
+
+# Lowest quality a bandwidth budget may push the lossy codecs down to
+MIN_QUALITY = 20
+
+# Channels. Messages on a channel start with a topic frame such as
+# b'metrics/<userid>', so SUB sockets can filter them by prefix:
+#   metrics/<userid>  [topic, JSON data]
+#   video/<userid>    [topic, JSON metadata, image payload]
+# Messages sent without a topic ([metadata, payload]) are still received.
+# ZMQ matches prefixes, so a subscription to b'metrics/1' also receives
+# b'metrics/10'; compare the received topic to select exactly one user.
+METRICS = 'metrics'
+VIDEO = 'video'
+
+
+def topic(channel, userid):
+    """Return the topic of a user's messages on a channel."""
+    return f"{channel}/{userid}"
+
+
+# Record formats for send_record. 'binary' packs the client's metrics
+# message into a fixed struct layout tagged with a schema id; messages it
+# can't represent fall back to JSON. Receivers tell the two apart by the
+# first byte ('{' for JSON, RECORD_MAGIC for binary), so JSON-only senders
+# and readers keep working.
+RECORD_FORMATS = ('json', 'binary')
+RECORD_MAGIC = 0xA7
+RECORD_SCHEMA = 2
+
+# Schema 2. Header: magic, schema id, presence flags, captured, sent,
+# then the user id as a length-prefixed UTF-8 string.
+# Head pose angles are packed as float32, so a binary reader sees e.g.
+# 12.300000190734863 where a JSON reader sees 12.3 (well below the models'
+# accuracy). Everything else round-trips exactly; schema 1 also packed ear
+# and mar as float32.
+_RECORD_HEADER = struct.Struct('<BBBdd')
+_HAS_RECORD, _HAS_CAPTURED, _HAS_SENT, _HAS_TIMING = 1, 2, 4, 8
+# Record body: sortKey as 16 uuid bytes, then these fields in order
+_RECORD_FIELDS = (
+    ('timestamp', 'd'), ('yaw', 'f'), ('pitch', 'f'), ('roll', 'f'), ('ear', 'd'),
+    ('blink_count', 'I'), ('mar', 'd'), ('yawn_count', 'I'), ('lost_focus_count', 'I'),
+    ('lost_focus_duration', 'd'), ('face_not_present_duration', 'd'),
+)
+_RECORD_BODY = struct.Struct('<16s' + ''.join(code for _, code in _RECORD_FIELDS))
+_RECORD_KEYS = {'id', 'sortKey'} | {name for name, _ in _RECORD_FIELDS}
+_MESSAGE_KEYS = {'id', 'record', 'captured', 'sent', 'timing'}
+# Optional stage timings: count, then (name length, name, milliseconds)
+_TIMING = struct.Struct('<f')
+
+
+def _pack_string(value):
+    raw = value.encode('utf-8')
+    if len(raw) > 255:
+        raise ValueError('string too long')
+    return bytes((len(raw),)) + raw
+
+
+def encode_record(data):
+    """Pack a metrics message with schema RECORD_SCHEMA.
+
+    Returns:
+      bytes, or None if the message has fields the schema can't hold.
+    """
+    if not _MESSAGE_KEYS.issuperset(data):
+        return None
+    record = data.get('record')
+    timing = data.get('timing')
+    flags = ((_HAS_RECORD if record is not None else 0)
+             | (_HAS_CAPTURED if data.get('captured') is not None else 0)
+             | (_HAS_SENT if data.get('sent') is not None else 0)
+             | (_HAS_TIMING if timing else 0))
+    try:
+        parts = [_RECORD_HEADER.pack(RECORD_MAGIC, RECORD_SCHEMA, flags,
+                                     data.get('captured') or 0.0, data.get('sent') or 0.0),
+                 _pack_string(str(data['id']))]
+        if record is not None:
+            if set(record) != _RECORD_KEYS or str(record['id']) != str(data['id']):
+                return None
+            parts.append(_RECORD_BODY.pack(uuid.UUID(record['sortKey']).bytes,
+                                           *(record[name] for name, _ in _RECORD_FIELDS)))
+        if timing:
+            parts.append(bytes((len(timing),)))
+            for name, ms in timing.items():
+                parts.append(_pack_string(name) + _TIMING.pack(ms))
+    except (KeyError, TypeError, ValueError, struct.error):
+        return None
+    return b''.join(parts)
+
+
+def decode_record(buf):
+    """Unpack a message packed by encode_record."""
+    buf = bytes(buf)
+    magic, schema, flags, captured, sent = _RECORD_HEADER.unpack_from(buf)
+    if magic != RECORD_MAGIC or schema != RECORD_SCHEMA:
+        raise ValueError(f"Unsupported record schema: {schema}")
+    offset = _RECORD_HEADER.size
+    length = buf[offset]
+    userid = buf[offset + 1:offset + 1 + length].decode('utf-8')
+    offset += 1 + length
+
+    data = {'id': userid}
+    if flags & _HAS_RECORD:
+        values = _RECORD_BODY.unpack_from(buf, offset)
+        offset += _RECORD_BODY.size
+        key = values[0].hex()
+        # Same text as str(uuid.UUID(bytes=...)), without building a UUID
+        record = {'id': userid,
+                  'sortKey': f"{key[:8]}-{key[8:12]}-{key[12:16]}-{key[16:20]}-{key[20:]}"}
+        record.update(zip((name for name, _ in _RECORD_FIELDS), values[1:]))
+        data['record'] = record
+    if flags & _HAS_CAPTURED:
+        data['captured'] = captured
+    if flags & _HAS_SENT:
+        data['sent'] = sent
+    if flags & _HAS_TIMING:
+        timing = {}
+        count, offset = buf[offset], offset + 1
+        for _ in range(count):
+            length = buf[offset]
+            name = buf[offset + 1:offset + 1 + length].decode('utf-8')
+            offset += 1 + length
+            # Timings are published rounded to 0.1 ms
+            timing[name] = round(_TIMING.unpack_from(buf, offset)[0], 1)
+            offset += _TIMING.size
+        data['timing'] = timing
+    return data
+
+
+def load_header(buf):
+    """Parse a JSON or binary-record frame."""
+    if len(buf) and buf[0] == RECORD_MAGIC:
+        return decode_record(buf)
+    return json.loads(buf)
+
+
+def encode_frame(A, codec='raw', quality=None):
+    """Encode an image; returns (payload, metadata entries for the header).
+
+    Colour channels are encoded in whatever order they are in and decoded
+    back in the same order, so RGB frames stay RGB.
+    """
+    if codec == 'raw':
+        return A, {}
+    if codec not in _ENCODERS:
+        raise ValueError(f"Unknown frame codec: {codec}")
+    ext, param, default = _ENCODERS[codec]
+    quality = default if quality is None else int(quality)
+    ok, buf = cv2.imencode(ext, A, [param, quality])
+    if not ok:
+        raise ValueError(f"Could not encode a {A.shape} {A.dtype} frame as {codec}")
+    return buf, {'codec': codec, 'quality': quality}
+
+
+def decode_frame(msg, md):
+    """Decode a payload described by a metadata header; returns the image or None."""
+    codec = md.get('codec', 'raw')
+    if codec == 'raw':
+        return np.frombuffer(msg, dtype=md['dtype']).reshape(md['shape'])
+    if codec == 'none':
+        # Frame withheld by the sender's bandwidth budget
+        return None
+    if codec not in _ENCODERS:
+        raise ValueError(f"Unknown frame codec: {codec}")
+    flags = cv2.IMREAD_UNCHANGED if len(md['shape']) == 2 else cv2.IMREAD_COLOR
+    return cv2.imdecode(np.frombuffer(msg, dtype=np.uint8), flags)
+
+
+class BandwidthBudget:
+    """Token bucket limiting the frame bytes a socket sends per second.
+
+    Frames are sent while the bucket has tokens; the bucket may go into debt
+    by one frame, after which frames are withheld until it refills. Lossy
+    codecs also have their quality lowered while the bucket is running low
+    and raised again once it recovers, so a client that is slightly over
+    budget sends smaller frames rather than fewer.
+
+    Arguments:
+      rate: Bytes per second.
+      burst: Seconds of rate the bucket holds.
+    """
+
+    def __init__(self, rate, burst=1.0):
+        self.rate = float(rate)
+        self.capacity = self.rate * burst
+        self.tokens = self.capacity
+        self.quality = None
+        self.sent_bytes = 0
+        self.sent_frames = 0
+        self.withheld = 0
+        self._last = time.monotonic()
+
+    def admit(self):
+        """Refill the bucket; returns False when the next frame must be withheld."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self.tokens <= 0:
+            self.withheld += 1
+            return False
+        return True
+
+    def charge(self, nbytes):
+        self.tokens -= nbytes
+        self.sent_bytes += nbytes
+        self.sent_frames += 1
+
+    def adjust(self, quality):
+        """Return the quality to encode the next frame at, given the configured one."""
+        if self.quality is None:
+            self.quality = quality
+        if self.tokens < 0.25 * self.capacity:
+            self.quality = max(MIN_QUALITY, self.quality - 10)
+        elif self.tokens > 0.75 * self.capacity:
+            self.quality = min(quality, self.quality + 5)
+        return self.quality
+
+    def stats(self):
+        return {
+            'sent_frames': self.sent_frames,
+            'sent_bytes': self.sent_bytes,
+            'withheld': self.withheld,
+            'quality': self.quality,
+        }
+
 
 class SerializingSocket(zmq.Socket):
     """Numpy array serialization methods.
     Modelled on PyZMQ serialization examples.
     Used for sending / receiving OpenCV images, which are Numpy arrays.
     Also used for sending / receiving jpg compressed OpenCV images.
+
+    Images are sent raw unless set_codec() selects a compressed codec; the
+    codec is recorded in the metadata header and recv_array decodes it.
+    send_record and send_array(topic=...) publish on topic channels.
     """
 
-    def send_array(self, A, data=None, flags=0, copy=True, track=False):
+    # pyzmq sockets only allow attributes declared on the class
+    codec = 'raw'
+    quality = None
+    budget = None
+    record_format = 'json'
+
+    def set_codec(self, codec='raw', quality=None, budget=None):
+        """Choose how send_array encodes images.
+
+        Arguments:
+          codec: One of CODECS.
+          quality: JPEG/WebP quality (0-100) or PNG compression level (0-9);
+            None uses the codec default.
+          budget: Frame bytes per second this socket may send, or None.
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown frame codec: {codec}")
+        self.codec = codec
+        self.quality = quality
+        self.budget = BandwidthBudget(budget) if budget else None
+
+    def set_record_format(self, record_format='json'):
+        """Choose how send_record encodes data: one of RECORD_FORMATS."""
+        if record_format not in RECORD_FORMATS:
+            raise ValueError(f"Unknown record format: {record_format}")
+        self.record_format = record_format
+
+    def send_record(self, topic, data, flags=0):
+        """Send a JSON-serialisable dict on a topic, without an image."""
+        self.send_string(topic, flags | zmq.SNDMORE)
+        if self.record_format == 'binary':
+            packed = encode_record(data)
+            if packed is not None:
+                return self.send(packed, flags)
+        return self.send_json(data, flags)
+
+    def send_array(self, A, data=None, flags=0, copy=True, track=False, topic=None):
+        if topic is not None:
+            self.send_string(topic, flags | zmq.SNDMORE)
         md = dict(
             data=data,
             dtype=str(A.dtype),
             shape=A.shape,
         )
+        budget = self.budget
+        if budget is not None and not budget.admit():
+            md['codec'] = 'none'
+            self.send_json(md, flags | zmq.SNDMORE)
+            return self.send(b'', flags)
+
+        quality = self.quality
+        if budget is not None and self.codec in ('jpeg', 'webp'):
+            quality = budget.adjust(_ENCODERS[self.codec][2] if quality is None else quality)
+        payload, codec_md = encode_frame(A, self.codec, quality)
+        md.update(codec_md)
+        if budget is not None:
+            budget.charge(payload.nbytes)
         self.send_json(md, flags | zmq.SNDMORE)
-        return self.send(A, flags, copy=copy, track=track)
+        return self.send(payload, flags, copy=copy, track=track)
 
-    def recv_array(self, flags=0, copy=True, track=False):
+    def recv_message(self, flags=0, copy=True, track=False):
+        """Receive a message from any channel.
 
-        md = self.recv_json(flags=flags)
+        Returns:
+          topic: e.g. 'metrics/<userid>', or None if sent without a topic.
+          data: The message's data dict.
+          image: Decoded image, or None for messages without one.
+        """
+        first = self.recv(flags=flags)
+        if first.startswith(b'{'):
+            topic, header = None, first
+        else:
+            topic, header = first.decode('utf-8'), self.recv(flags=flags)
+        if not self.getsockopt(zmq.RCVMORE):
+            return topic, load_header(header), None
+        md = json.loads(header)
         msg = self.recv(flags=flags, copy=copy, track=track)
-        A = np.frombuffer(msg, dtype=md['dtype'])
-        return (md['data'], A.reshape(md['shape']))
+        return topic, md['data'], decode_frame(msg, md)
+
+    def recv_array(self, flags=0, copy=True, track=False):
+
+        _, data, image = self.recv_message(flags=flags, copy=copy, track=track)
+        return (data, image)
 
 
 class SerializingContext(zmq.Context):
-    _socket_class = SerializingSocket
\ No newline at end of file
+    _socket_class = SerializingSocket
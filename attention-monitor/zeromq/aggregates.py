@@ -0,0 +1,259 @@
+"""
+Incremental per-user rolling aggregates.
+
+The API recomputes per-minute blink/yawn/lost-focus deltas and the focus
+and face-present ratios from a user's whole history on every request. Here
+they are maintained as records arrive instead, so reading them costs the
+same however long the session has been running.
+
+Records carry cumulative counters. Each record contributes its increase
+over the user's previous record (a decrease means the client restarted,
+and the new value counts as the increase) and whether lost_focus_duration
+and face_not_present_duration stayed unchanged, which is how the API
+counts focused and face-present records. A record older than the newest
+one seen arrived out of order: it counts as a record but contributes no
+increases or ratio samples, since the newer records already did. Contributions are summed into
+fixed-size rings of time slots:
+
+    1m        60 s window of 5 s slots
+    5m        300 s window of 5 s slots
+    session   everything since the user's first record
+    minutes   the last HISTORY_MINUTES one-minute slots, for per-minute series
+
+Every window keeps running totals that are updated when a record is added
+and when a slot expires, so a snapshot reads the totals without scanning
+the ring. A record that crosses a slot boundary counts in the slot it was
+recorded in. The API's max - min per minute would drop it instead. A record
+that arrives after the longest rolling window has moved past it is late and
+is left out of every aggregate, the session included, so all windows agree.
+"""
+
+import time
+
+# Cumulative record fields whose increases are aggregated
+FIELDS = ('blink_count', 'yawn_count', 'lost_focus_count', 'lost_focus_duration',
+          'face_not_present_duration')
+
+# Per-slot statistics: records, ratio samples, focused, face present, then FIELDS
+_RECORDS, _SAMPLES, _FOCUSED, _PRESENT = range(4)
+_FIRST_FIELD = 4
+_STATS = _FIRST_FIELD + len(FIELDS)
+
+# name -> (window seconds, slot seconds)
+WINDOWS = {
+    '1m': (60, 5),
+    '5m': (300, 5),
+}
+
+HISTORY_MINUTES = 240
+
+
+class RollingWindow:
+    """
+    Running totals over the last `slots` slots of `slot_seconds` each.
+
+    Arguments:
+        slots: Number of slots in the ring
+        slot_seconds: Length of one slot
+    """
+
+    def __init__(self, slots, slot_seconds):
+        self.slot_seconds = slot_seconds
+        self.ring = [[0.0] * _STATS for _ in range(slots)]
+        self.totals = [0.0] * _STATS
+        self.head = None
+
+    def expired(self, timestamp):
+        """Whether `timestamp` is older than the whole window."""
+        return self.head is not None and \
+            int(timestamp // self.slot_seconds) <= self.head - len(self.ring)
+
+    def add(self, timestamp, stats):
+        slot = int(timestamp // self.slot_seconds)
+        self.advance(slot)
+        if self.expired(timestamp):
+            return
+        values = self.ring[slot % len(self.ring)]
+        for i, value in enumerate(stats):
+            values[i] += value
+            self.totals[i] += value
+
+    def advance(self, slot):
+        """Expire the slots that fall out of the window when `slot` becomes current."""
+        if self.head is None:
+            self.head = slot
+            return
+        if slot <= self.head:
+            return
+        size = len(self.ring)
+        for expired in range(max(self.head + 1, slot - size + 1), slot + 1):
+            values = self.ring[expired % size]
+            for i, value in enumerate(values):
+                self.totals[i] -= value
+                values[i] = 0.0
+        self.head = slot
+
+    def series(self):
+        """Return (slot start time, stats) for every non-empty slot, oldest first."""
+        if self.head is None:
+            return []
+        size = len(self.ring)
+        return [(slot * self.slot_seconds, list(self.ring[slot % size]))
+                for slot in range(self.head - size + 1, self.head + 1)
+                if self.ring[slot % size][_RECORDS]]
+
+
+def summarise(stats):
+    """Turn a stats vector into named deltas and ratios."""
+    records, samples = stats[_RECORDS], stats[_SAMPLES]
+    summary = {'records': int(round(records))}
+    for i, name in enumerate(FIELDS):
+        value = stats[_FIRST_FIELD + i]
+        # Rounded, as running totals pick up float error when slots expire
+        summary[name] = int(round(value)) if name.endswith('_count') else round(value, 3)
+    focus = stats[_FOCUSED] / samples if samples else None
+    present = stats[_PRESENT] / samples if samples else None
+    summary.update(
+        focus_ratio=focus,
+        lost_focus_ratio=None if focus is None else 1 - focus,
+        face_present_ratio=present,
+        face_absent_ratio=None if present is None else 1 - present,
+    )
+    return summary
+
+
+class UserWindows:
+    """
+    Rolling and session aggregates of one user's records.
+
+    Arguments:
+        userid: User ID
+    """
+
+    def __init__(self, userid):
+        self.userid = userid
+        self.windows = {name: RollingWindow(window // slot, slot)
+                        for name, (window, slot) in WINDOWS.items()}
+        self.minutes = RollingWindow(HISTORY_MINUTES, 60)
+        # Records older than this window are late and not aggregated
+        self._longest = max(self.windows.values(),
+                            key=lambda window: len(window.ring) * window.slot_seconds)
+        self.session = [0.0] * _STATS
+        self.late = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._last_received = None
+        self._previous = None
+
+    def add(self, record, received=None):
+        """
+        Fold one record into every window.
+
+        Arguments:
+            record: Record dict as published by the client
+            received: time.monotonic() when it arrived (default: now)
+
+        Returns:
+            bool: False if the record was late and left out
+        """
+        timestamp = float(record['timestamp'])
+        if self._longest.expired(timestamp):
+            self.late += 1
+            return False
+        stats = [0.0] * _STATS
+        stats[_RECORDS] = 1
+        if self.last_timestamp is None or timestamp >= self.last_timestamp:
+            values = [float(record.get(name) or 0) for name in FIELDS]
+            previous = self._previous
+            if previous is not None:
+                stats[_SAMPLES] = 1
+                stats[_FOCUSED] = values[3] == previous[3]
+                stats[_PRESENT] = values[4] == previous[4]
+            for i, value in enumerate(values):
+                before = previous[i] if previous is not None else 0.0
+                # A counter going backwards means the client started over
+                stats[_FIRST_FIELD + i] = value - before if value >= before else value
+            self._previous = values
+
+        for window in self.windows.values():
+            window.add(timestamp, stats)
+        self.minutes.add(timestamp, stats)
+        for i, value in enumerate(stats):
+            self.session[i] += value
+        if self.first_timestamp is None or timestamp < self.first_timestamp:
+            self.first_timestamp = timestamp
+        if self.last_timestamp is None or timestamp >= self.last_timestamp:
+            self.last_timestamp = timestamp
+            self._last_received = time.monotonic() if received is None else received
+        return True
+
+    def now(self):
+        """
+        Current time on the client's clock.
+
+        Windows are slotted by record timestamps, so they are expired
+        against the last record's timestamp plus the time since it arrived,
+        whatever the offset between client and server clocks.
+        """
+        if self.last_timestamp is None:
+            return None
+        return self.last_timestamp + (time.monotonic() - self._last_received)
+
+    def snapshot(self):
+        """
+        Current 1m, 5m and session aggregates.
+
+        Returns:
+            dict: {'id', 'first_timestamp', 'last_timestamp', 'late_records',
+                   'windows': {name: summary}}
+        """
+        now = self.now()
+        windows = {}
+        for name, window in self.windows.items():
+            if now is not None:
+                window.advance(int(now // window.slot_seconds))
+            windows[name] = dict(summarise(window.totals), seconds=WINDOWS[name][0])
+        windows['session'] = dict(
+            summarise(self.session),
+            seconds=(self.last_timestamp - self.first_timestamp)
+            if self.first_timestamp is not None else 0.0)
+        return {
+            'id': self.userid,
+            'first_timestamp': self.first_timestamp,
+            'last_timestamp': self.last_timestamp,
+            'late_records': self.late,
+            'windows': windows,
+        }
+
+    def per_minute(self):
+        """
+        Per-minute deltas for the last HISTORY_MINUTES minutes.
+
+        Returns:
+            list: {'minute': start timestamp, ...summary} per minute with records
+        """
+        return [dict(summarise(stats), minute=start) for start, stats in self.minutes.series()]
+
+
+class AggregateStore:
+    """UserWindows for every user seen, keyed by user ID."""
+
+    def __init__(self):
+        self.users = {}
+
+    def add(self, userid, record, received=None):
+        windows = self.users.get(userid)
+        if windows is None:
+            windows = self.users[userid] = UserWindows(userid)
+        windows.add(record, received)
+        return windows
+
+    def snapshot(self, userid, series=False):
+        """Return a user's snapshot (with per-minute series if asked), or None."""
+        windows = self.users.get(userid)
+        if windows is None:
+            return None
+        snapshot = windows.snapshot()
+        if series:
+            snapshot['per_minute'] = windows.per_minute()
+        return snapshot
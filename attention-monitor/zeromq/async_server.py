@@ -0,0 +1,385 @@
+"""
+asyncio ZeroMQ server with WebSocket fan-out for the web dashboard
+
+server.py and broker.py's subscribers are blocking loops built around
+cv2.waitKey, and browsers can't speak ZeroMQ. This server ingests metrics
+with zmq.asyncio and pushes per-user updates to dashboards over WebSocket,
+all on one event loop:
+
+    clients (PUB) --> SUB :5556 (and/or --connect to broker.py :5557)
+                        | ingest: record -> aggregates.AggregateStore
+                        v
+                  dirty users, flushed every --flush-interval seconds
+                        | one Batch per flush, serialised once
+                        v
+             Connection.offer() per browser --> writer task --> WebSocket
+
+Each flush builds one Batch of the users that changed; every connection
+that is idle gets that same Batch and its JSON text, so a flush costs one
+serialisation however many browsers are connected. A connection whose
+browser is still receiving an earlier update keeps a single dict of
+pending updates, and newer updates for the same user replace older ones.
+After each message the writer waits for the browser's pong (browsers
+answer pings themselves, without page code), so no more than one message
+per connection is ever in flight in socket buffers. A slow browser or
+network therefore gets the latest values when it catches up, not a
+backlog, and the server holds at most one update per user for it.
+
+Browsers connect to ws://<host>:8765/, optionally with ?users=a,b to
+receive only those users, and get messages of the form
+
+    {"type": "update", "users": {"<userid>": {"record": {...}, "captured": ...,
+                                              "windows": {"1m": ..., "5m": ..., "session": ...}}}}
+
+The first message after connecting holds the latest update of every user.
+Only topic-based clients (metrics/<userid>) are ingested; video is not.
+
+Usage:
+    python async_server.py
+    python async_server.py --bind-port 0 --connect tcp://localhost:5557
+    python bench_ws.py --connections 2000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import zmq
+import zmq.asyncio
+from SerializingContext import METRICS, load_header
+from aggregates import AggregateStore
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    from websockets.asyncio.server import serve
+    from websockets.exceptions import ConnectionClosed
+    HAVE_WEBSOCKETS = True
+except ImportError:
+    HAVE_WEBSOCKETS = False
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+# One line per dashboard connection is too many
+logging.getLogger('websockets').setLevel(logging.WARNING)
+
+# ZeroMQ Configuration
+ZMQ_HOST = "*"
+ZMQ_PORT = 5556
+ZMQ_PROTOCOL = "tcp"
+
+# WebSocket Configuration
+WS_HOST = "0.0.0.0"
+WS_PORT = 8765
+
+FLUSH_INTERVAL = 0.25
+
+
+def encode_updates(updates):
+    """Serialise per-user updates as one WebSocket message."""
+    return json.dumps({'type': 'update', 'users': updates}, separators=(',', ':'))
+
+
+class Batch:
+    """
+    The updates of one flush, serialised at most once.
+
+    Arguments:
+        updates: Dict of user ID -> update
+    """
+
+    __slots__ = ('updates', '_text', '_subsets')
+
+    def __init__(self, updates):
+        self.updates = updates
+        self._text = None
+        self._subsets = {}
+
+    def text(self):
+        if self._text is None:
+            self._text = encode_updates(self.updates)
+        return self._text
+
+    def subset(self, users):
+        """
+        The updates of `users` only, or None if none of them changed.
+
+        Connections with the same filter share the subset, and so its text.
+
+        Arguments:
+            users: frozenset of user IDs
+        """
+        try:
+            return self._subsets[users]
+        except KeyError:
+            pass
+        if len(users) < len(self.updates):
+            updates = {u: self.updates[u] for u in users if u in self.updates}
+        else:
+            updates = {u: v for u, v in self.updates.items() if u in users}
+        batch = None
+        if len(updates) == len(self.updates):
+            batch = self
+        elif updates:
+            batch = Batch(updates)
+        self._subsets[users] = batch
+        return batch
+
+
+class Connection:
+    """
+    One browser connection and its coalescing buffer.
+
+    Arguments:
+        websocket: Server-side WebSocket connection
+        users: frozenset of user IDs to send, or None for all users
+    """
+
+    def __init__(self, websocket, users=None):
+        self.websocket = websocket
+        self.users = users
+        # None, a shared Batch, or a private dict of merged updates
+        self.pending = None
+        self.wakeup = asyncio.Event()
+        self.sent = 0
+        self.coalesced = 0
+
+    def offer(self, batch):
+        """Queue a flush's updates, merging them into anything not yet sent."""
+        if self.users is not None:
+            batch = batch.subset(self.users)
+            if batch is None:
+                return
+
+        pending = self.pending
+        if pending is None:
+            self.pending = batch
+        else:
+            merged = pending if isinstance(pending, dict) else dict(pending.updates)
+            before = len(merged)
+            merged.update(batch.updates)
+            self.coalesced += before + len(batch.updates) - len(merged)
+            self.pending = merged
+        self.wakeup.set()
+
+    async def writer(self):
+        """Send pending updates, one message at a time, until the connection closes."""
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                pending, self.pending = self.pending, None
+                if pending is None:
+                    continue
+                text = pending.text() if isinstance(pending, Batch) else encode_updates(pending)
+                await self.websocket.send(text)
+                self.sent += 1
+                # The pong comes back once the browser has read the update, so
+                # at most one is ever in flight; offers merge meanwhile
+                await (await self.websocket.ping())
+        except ConnectionClosed:
+            pass
+
+
+class Hub:
+    """
+    Latest per-user state and the set of dashboard connections.
+
+    Arguments:
+        flush_interval: Seconds between fan-outs of changed users
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.connections = set()
+        self.aggregates = AggregateStore()
+        self.latest = {}
+        self.dirty = {}
+        self.received = 0
+        self.errors = 0
+        self.batches = 0
+        self.sent = 0
+        self.coalesced = 0
+
+    def ingest(self, topic, data):
+        """Fold one metrics message into the user's aggregates and mark the user changed."""
+        self.received += 1
+        record = data.get('record')
+        if record is None:
+            return
+        userid = data.get('id') or topic.split('/', 1)[-1]
+        self.aggregates.add(userid, record, time.monotonic())
+        self.dirty[userid] = data
+
+    def update(self, userid, data):
+        return {
+            'record': data['record'],
+            'captured': data.get('captured'),
+            'sent': data.get('sent'),
+            'windows': self.aggregates.users[userid].snapshot()['windows'],
+        }
+
+    async def flush(self):
+        """Every flush_interval, offer the users that changed to every connection."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self.dirty:
+                continue
+            dirty, self.dirty = self.dirty, {}
+            updates = {userid: self.update(userid, data) for userid, data in dirty.items()}
+            self.latest.update(updates)
+            batch = Batch(updates)
+            self.batches += 1
+            for connection in self.connections:
+                connection.offer(batch)
+
+    async def handler(self, websocket):
+        """Serve one dashboard connection."""
+        query = parse_qs(urlsplit(websocket.request.path).query)
+        users = None
+        if 'users' in query:
+            users = frozenset(u for value in query['users'] for u in value.split(',') if u)
+        connection = Connection(websocket, users)
+        if self.latest:
+            connection.offer(Batch(dict(self.latest)))
+        self.connections.add(connection)
+        writer = asyncio.create_task(connection.writer())
+        try:
+            # Dashboards don't send anything; this returns when they disconnect
+            await websocket.wait_closed()
+        finally:
+            self.connections.discard(connection)
+            writer.cancel()
+            self.sent += connection.sent
+            self.coalesced += connection.coalesced
+
+    def stats(self):
+        return {
+            'connections': len(self.connections),
+            'users': len(self.aggregates.users),
+            'received': self.received,
+            'errors': self.errors,
+            'batches': self.batches,
+            'sent': self.sent + sum(c.sent for c in self.connections),
+            'coalesced': self.coalesced + sum(c.coalesced for c in self.connections),
+        }
+
+
+async def ingest(socket, hub):
+    """Receive metrics messages from one SUB socket into the hub."""
+    while True:
+        parts = await socket.recv_multipart()
+        if len(parts) != 2:
+            # Frames and topic-less clients aren't forwarded to dashboards
+            continue
+        try:
+            hub.ingest(parts[0].decode('utf-8'), load_header(parts[1]))
+        except Exception as e:
+            hub.errors += 1
+            logger.error(f"Error processing message: {e}")
+
+
+async def log_stats(hub, interval):
+    previous = hub.stats()
+    while True:
+        await asyncio.sleep(interval)
+        stats = hub.stats()
+        logger.info(
+            f"{stats['connections']} dashboards, {stats['users']} users, "
+            f"{(stats['received'] - previous['received']) / interval:.0f} msg/s in, "
+            f"{(stats['sent'] - previous['sent']) / interval:.0f} WebSocket msg/s out, "
+            f"{stats['coalesced'] - previous['coalesced']} updates coalesced"
+        )
+        previous = stats
+
+
+def raise_open_files_limit():
+    """Every dashboard connection is a file descriptor; allow as many as the OS does."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def serve_dashboards(bind_port=ZMQ_PORT, connect=(), ws_host=WS_HOST, ws_port=WS_PORT,
+                           flush_interval=FLUSH_INTERVAL, stats_interval=10.0, hub=None):
+    """
+    Run the server until cancelled.
+
+    Arguments:
+        bind_port: Port clients publish to (0 = don't bind)
+        connect: Addresses to subscribe to as well, e.g. broker.py's backend
+        ws_host: WebSocket listen address
+        ws_port: WebSocket port
+        flush_interval: Seconds between updates to dashboards
+        stats_interval: Seconds between stats log lines (0 = off)
+        hub: Optional Hub to use, e.g. to read its stats
+    """
+    hub = hub or Hub(flush_interval)
+    context = zmq.asyncio.Context()
+    sockets = []
+    if bind_port:
+        socket = context.socket(zmq.SUB)
+        socket.bind(f"{ZMQ_PROTOCOL}://{ZMQ_HOST}:{bind_port}")
+        sockets.append(socket)
+    for address in connect:
+        socket = context.socket(zmq.SUB)
+        socket.connect(address)
+        sockets.append(socket)
+    for socket in sockets:
+        socket.setsockopt(zmq.SUBSCRIBE, f"{METRICS}/".encode())
+
+    tasks = [ingest(socket, hub) for socket in sockets] + [hub.flush()]
+    if stats_interval:
+        tasks.append(log_stats(hub, stats_interval))
+    try:
+        # Compression would cost CPU per connection for every message
+        async with serve(hub.handler, ws_host, ws_port, compression=None):
+            logger.info(f"Ingesting metrics from "
+                        f"{', '.join(s.getsockopt_string(zmq.LAST_ENDPOINT) for s in sockets)}")
+            logger.info(f"Dashboards connect to ws://{ws_host}:{ws_port}/")
+            await asyncio.gather(*tasks)
+    finally:
+        for socket in sockets:
+            socket.close(linger=0)
+        context.term()
+
+
+def main(bind_port, connect, ws_host, ws_port, flush_interval, stats_interval):
+    if not HAVE_WEBSOCKETS:
+        logger.error("The websockets package is required: pip install websockets")
+        return
+    raise_open_files_limit()
+    try:
+        asyncio.run(serve_dashboards(bind_port, connect, ws_host, ws_port, flush_interval,
+                                     stats_interval))
+    except KeyboardInterrupt:
+        logger.info("Server stopped.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Attention monitor asyncio server for dashboards')
+    parser.add_argument('--bind-port', type=int, default=ZMQ_PORT,
+                        help='Port clients publish to (0 = only --connect)')
+    parser.add_argument('--connect', action='append', default=[],
+                        help='Also subscribe to this address, e.g. tcp://localhost:5557')
+    parser.add_argument('--ws-host', default=WS_HOST)
+    parser.add_argument('--ws-port', type=int, default=WS_PORT)
+    parser.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL,
+                        help='Seconds between updates to dashboards')
+    parser.add_argument('--stats-interval', type=float, default=10.0,
+                        help='Seconds between stats log lines (0 = off)')
+    args = parser.parse_args()
+    main(args.bind_port, args.connect, args.ws_host, args.ws_port, args.flush_interval,
+         args.stats_interval)
@@ -0,0 +1,143 @@
+"""
+Load test for the broker tier.
+
+Starts a Broker (see broker.py) and --clients simulated clients, spread
+over --procs processes with one PUB socket per client. Each client
+publishes a realistic metrics message on metrics/<userid> --rate times per
+second (0 = as fast as it can). The workers' stats/ messages are collected
+from the broker's backend, and the run reports:
+
+    offered     messages per second the clients sent
+    sustained   messages per second the workers processed
+    dropped     messages the dispatcher dropped because a worker was full,
+                and messages lost earlier when a socket's high-water mark
+                was reached
+    latency     client send to worker receipt, p50/p95 bucket bounds and mean
+
+Usage:
+    python bench_broker.py --clients 500 --rate 5 --workers 4
+    python bench_broker.py --clients 500 --rate 0 --duration 20
+"""
+
+import argparse
+import multiprocessing
+import time
+import uuid
+
+import zmq
+from SerializingContext import METRICS, RECORD_FORMATS, SerializingContext, topic
+from broker import STATS, Broker, latency_percentile
+
+
+def client_process(first, count, frontend_address, rate, duration, record_format, start_at,
+                   results):
+    """Publish for `count` clients from one process; reports how many messages were sent."""
+    context = SerializingContext()
+    sockets = []
+    for client in range(first, first + count):
+        socket = context.socket(zmq.PUB)
+        socket.set_record_format(record_format)
+        socket.connect(frontend_address)
+        sockets.append((f"student{client:04d}", socket))
+
+    time.sleep(max(0.0, start_at - time.time()))
+    interval = 1.0 / rate if rate else 0.0
+    sent = 0
+    tick = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        now = time.time()
+        for userid, socket in sockets:
+            data = {'id': userid, 'captured': now - 0.05, 'sent': now, 'record': {
+                'id': userid, 'sortKey': str(uuid.uuid1()), 'timestamp': now - 0.05,
+                'yaw': 3.5, 'pitch': -7.25, 'roll': 1.0, 'ear': 0.31, 'blink_count': tick // 20,
+                'mar': 0.12, 'yawn_count': tick // 300, 'lost_focus_count': tick // 100,
+                'lost_focus_duration': 0.4 * (tick // 100), 'face_not_present_duration': 0.0}}
+            socket.send_record(topic(METRICS, userid), data)
+            sent += 1
+        tick += 1
+        if interval:
+            delay = start + tick * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    results.put(sent)
+    for _, socket in sockets:
+        socket.close(linger=2000)
+    context.term()
+
+
+def collect_stats(socket, until):
+    """Keep the latest stats/worker<i> message per worker until `until`."""
+    workers = {}
+    while time.time() < until:
+        if socket.poll(100):
+            name, data, _ = socket.recv_message()
+            workers[name] = data
+    return workers
+
+
+def main(clients, procs, rate, duration, workers, record_format, frontend_port, backend_port):
+    broker = Broker(workers, frontend_port, backend_port, interval=1.0, host='127.0.0.1').start()
+    context = SerializingContext.instance()
+    stats = context.socket(zmq.SUB)
+    stats.setsockopt(zmq.SUBSCRIBE, f"{STATS}/".encode())
+    stats.connect(f"tcp://127.0.0.1:{backend_port}")
+
+    # Give every client time to connect before anyone sends
+    start_at = time.time() + 2.0 + clients / 500
+    results = multiprocessing.Queue()
+    per_proc = -(-clients // procs)
+    processes = []
+    for first in range(0, clients, per_proc):
+        process = multiprocessing.Process(
+            target=client_process,
+            args=(first, min(per_proc, clients - first), f"tcp://127.0.0.1:{frontend_port}",
+                  rate, duration, record_format, start_at, results))
+        process.start()
+        processes.append(process)
+
+    before = collect_stats(stats, start_at)
+    sent = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    # Let the workers drain and publish once more
+    after = collect_stats(stats, time.time() + 2.5)
+    dispatch = broker.stats()
+    broker.stop()
+    stats.close()
+
+    processed = sum(s['processed'] for s in after.values()) - \
+        sum(s['processed'] for s in before.values())
+    histogram = [sum(column) for column in zip(*(s['latency'] for s in after.values()))]
+    latency_sum = sum(s['latency_sum_ms'] for s in after.values())
+    observed = sum(histogram)
+
+    print(f"{clients} clients x {rate or 'max'} msg/s, {workers} workers, {record_format}, "
+          f"{duration:g}s")
+    print(f"offered:   {sent / duration:10.0f} msg/s ({sent} sent)")
+    print(f"sustained: {processed / duration:10.0f} msg/s ({processed} processed, "
+          f"{100 * processed / sent if sent else 0:.1f}%)")
+    dropped = sum(dispatch['dropped'])
+    print(f"dropped:   {dropped:10d} at the dispatcher, "
+          f"{max(0, sent - processed - dropped)} before it")
+    if observed:
+        print(f"latency:   p50 <= {latency_percentile(histogram, 50)} ms, "
+              f"p95 <= {latency_percentile(histogram, 95)} ms, "
+              f"mean {latency_sum / observed:.1f} ms")
+    return processed / duration
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the broker tier')
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--procs', type=int, default=4, help='Client processes')
+    parser.add_argument('--rate', type=float, default=5,
+                        help='Messages per second per client (0 = unthrottled)')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2, help='Aggregation workers')
+    parser.add_argument('--record-format', choices=RECORD_FORMATS, default='json')
+    parser.add_argument('--frontend-port', type=int, default=5566)
+    parser.add_argument('--backend-port', type=int, default=5567)
+    args = parser.parse_args()
+    main(args.clients, args.procs, args.rate, args.duration, args.workers, args.record_format,
+         args.frontend_port, args.backend_port)
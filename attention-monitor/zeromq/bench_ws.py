@@ -0,0 +1,180 @@
+"""
+Load test for async_server.py's WebSocket fan-out.
+
+Runs async_server in its own process, publishes --users simulated clients'
+metrics to it at --rate messages per second each, and opens --connections
+dashboard connections from this process. A --slow fraction of them read
+one message every --slow-delay seconds. With --per-user each dashboard
+follows a single user (?users=<userid>), as a student's own view would.
+For fast and slow dashboards separately the run reports messages per
+connection per second and the age of the newest record in each message
+when it arrived (p50/p95/max). It also reports the server's ingest rate,
+WebSocket messages sent and updates coalesced for slow browsers. A slow
+dashboard's age should stay around one --slow-delay instead of growing
+with the run.
+
+The dashboards run in this process, so on a small machine they, rather
+than the server, may be what runs out of CPU.
+
+Usage:
+    python bench_ws.py --connections 2000 --users 50 --rate 5
+    python bench_ws.py --connections 500 --slow 0.5 --slow-delay 2
+    python bench_ws.py --connections 5000 --per-user
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+
+import numpy as np
+import zmq
+from websockets.asyncio.client import connect
+from SerializingContext import METRICS, SerializingContext, topic
+from async_server import Hub, raise_open_files_limit, serve_dashboards
+
+
+def server_process(bind_port, ws_port, flush_interval, duration, results):
+    hub = Hub(flush_interval)
+
+    async def run():
+        try:
+            await asyncio.wait_for(
+                serve_dashboards(bind_port, ws_host='127.0.0.1', ws_port=ws_port,
+                                 flush_interval=flush_interval, stats_interval=0, hub=hub),
+                duration)
+        except asyncio.TimeoutError:
+            pass
+
+    raise_open_files_limit()
+    asyncio.run(run())
+    results.put(hub.stats())
+
+
+def publisher_process(bind_port, users, rate, duration, start_at):
+    context = SerializingContext()
+    socket = context.socket(zmq.PUB)
+    socket.connect(f"tcp://127.0.0.1:{bind_port}")
+    time.sleep(max(0.0, start_at - time.time()))
+    interval = 1.0 / rate
+    tick = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        now = time.time()
+        for user in range(users):
+            userid = f"student{user:04d}"
+            socket.send_record(topic(METRICS, userid), {
+                'id': userid, 'captured': now, 'sent': now,
+                'record': {'id': userid, 'timestamp': now, 'yaw': 3.5, 'pitch': -7.25,
+                           'roll': 1.0, 'ear': 0.31, 'blink_count': tick // 20, 'mar': 0.12,
+                           'yawn_count': tick // 300, 'lost_focus_count': tick // 100,
+                           'lost_focus_duration': 0.4 * (tick // 100),
+                           'face_not_present_duration': 0.0}})
+        tick += 1
+        delay = start + tick * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    socket.close(linger=1000)
+    context.term()
+
+
+async def dashboard(url, delay, until, samples):
+    """Read updates until `until`; append the newest record's age of each message."""
+    messages = 0
+    # A slow browser: one message buffered, the rest stays in the server's coalescing
+    async with connect(url, compression=None, max_queue=1 if delay else 16,
+                       open_timeout=60) as websocket:
+        while time.time() < until:
+            try:
+                text = await asyncio.wait_for(websocket.recv(), until - time.time())
+            except asyncio.TimeoutError:
+                break
+            received = time.time()
+            updates = json.loads(text)['users']
+            samples.append(received - max(u['captured'] for u in updates.values()))
+            messages += 1
+            if delay:
+                await asyncio.sleep(delay)
+    return messages
+
+
+async def run_dashboards(url, connections, users, per_user, slow, slow_delay, until):
+    samples = {'fast': [], 'slow': []}
+    n_slow = int(round(connections * slow))
+    tasks = []
+    for i in range(connections):
+        kind = 'slow' if i < n_slow else 'fast'
+        address = f"{url}?users=student{i % users:04d}" if per_user else url
+        tasks.append((kind, asyncio.create_task(
+            dashboard(address, slow_delay if kind == 'slow' else 0, until, samples[kind]))))
+    counts = {'fast': [], 'slow': []}
+    for kind, task in tasks:
+        try:
+            counts[kind].append(await task)
+        except Exception as e:
+            print(f"WARNING: dashboard connection failed: {e}")
+    return samples, counts
+
+
+def main(connections, users, rate, slow, slow_delay, duration, flush_interval, bind_port,
+         ws_port, per_user=False):
+    raise_open_files_limit()
+    # Dashboards need time to connect before publishing starts
+    setup = 3.0 + connections / 500
+    results = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=server_process,
+        args=(bind_port, ws_port, flush_interval, setup + duration + 2.0, results))
+    server.start()
+    time.sleep(1.0)
+    start_at = time.time() + setup
+    publisher = multiprocessing.Process(target=publisher_process,
+                                        args=(bind_port, users, rate, duration, start_at))
+    publisher.start()
+
+    until = start_at + duration
+    samples, counts = asyncio.run(run_dashboards(f"ws://127.0.0.1:{ws_port}/", connections,
+                                                 users, per_user, slow, slow_delay, until))
+    publisher.join()
+    stats = results.get()
+    server.join()
+
+    print(f"{connections} {'per-user ' if per_user else ''}dashboards "
+          f"({slow:.0%} slow, {slow_delay:g}s per message), "
+          f"{users} users x {rate:g} msg/s, flush every {flush_interval:g}s, {duration:g}s")
+    print(f"server: {stats['received'] / duration:.0f} msg/s ingested, "
+          f"{stats['sent'] / duration:.0f} WebSocket msg/s sent, "
+          f"{stats['coalesced']} updates coalesced, {stats['errors']} errors")
+    print(f"{'kind':>5} {'conns':>6} {'msg/s/conn':>10} {'age p50':>8} {'p95':>8} {'max':>8}")
+    for kind in ('fast', 'slow'):
+        if not counts[kind]:
+            continue
+        if not samples[kind]:
+            print(f"{kind:>5} {len(counts[kind]):>6} {'no messages received':>37}")
+            continue
+        ages = np.array(samples[kind]) * 1e3
+        print(f"{kind:>5} {len(counts[kind]):>6} {np.mean(counts[kind]) / duration:>10.2f} "
+              f"{np.percentile(ages, 50):>8.0f} {np.percentile(ages, 95):>8.0f} "
+              f"{ages.max():>8.0f}")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the WebSocket dashboard fan-out')
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=50, help='Publishing clients')
+    parser.add_argument('--rate', type=float, default=5, help='Messages per second per client')
+    parser.add_argument('--slow', type=float, default=0.1,
+                        help='Fraction of dashboards that read slowly')
+    parser.add_argument('--slow-delay', type=float, default=1.0,
+                        help='Seconds a slow dashboard takes per message')
+    parser.add_argument('--per-user', action='store_true',
+                        help='Each dashboard follows one user instead of all of them')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--flush-interval', type=float, default=0.25)
+    parser.add_argument('--bind-port', type=int, default=5576)
+    parser.add_argument('--ws-port', type=int, default=8775)
+    args = parser.parse_args()
+    main(args.connections, args.users, args.rate, args.slow, args.slow_delay, args.duration,
+         args.flush_interval, args.bind_port, args.ws_port, args.per_user)
@@ -0,0 +1,424 @@
+"""
+ZeroMQ broker tier for the Attention Monitor
+
+server.py does everything on one thread: it receives every message, logs
+each record and shows each frame, and falls behind at a few dozen
+students. The broker splits that work up:
+
+    clients (PUB) --> XSUB :5556 ==proxy==> XPUB :5557 --> subscribers
+                                              |
+                                  dispatcher (SUB metrics/)
+                                              | crc32(userid) % workers
+                                  PUSH --> aggregation worker processes
+                                              |
+                      PUB --> XSUB: summary/<userid>, stats/worker<i>
+
+Clients connect to port 5556 exactly as they do to server.py. The proxy
+forwards every topic to whoever subscribes on port 5557, so display and
+logging are ordinary subscribers (the 'display' and 'log' commands below)
+rather than work on the receive path. Each user's records always go to the
+same worker, which keeps that user's aggregate, including rolling 1m, 5m
+and session windows (see aggregates.py), and publishes it every
+--interval seconds on summary/<userid>. Workers also publish their
+counters on stats/worker<i>.
+
+Clients that publish without topics are not dispatched to workers; use
+server.py for those.
+
+Usage:
+    python broker.py run --workers 4
+    python broker.py display
+    python broker.py log --interval 10
+"""
+
+import argparse
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+import zlib
+
+import zmq
+import cv2
+from SerializingContext import METRICS, VIDEO, SerializingContext, topic
+from aggregates import UserWindows
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ZeroMQ Configuration
+FRONTEND_PORT = 5556
+BACKEND_PORT = 5557
+
+# Channels published by the workers
+SUMMARY = 'summary'
+STATS = 'stats'
+
+# Upper bounds (ms) of the worker latency histogram; the last bucket is open
+LATENCY_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+# ============================================================================
+# Aggregation Workers
+# ============================================================================
+
+class UserAggregate:
+    """
+    Running summary of one user's records, with rolling 1m/5m/session
+    windows maintained by aggregates.UserWindows.
+
+    Arguments:
+        userid: User ID
+    """
+
+    def __init__(self, userid):
+        self.userid = userid
+        self.messages = 0
+        self.first_seen = None
+        self.last_seen = None
+        self.last_record = None
+        self.windows = UserWindows(userid)
+
+    def update(self, data, now):
+        self.messages += 1
+        if self.first_seen is None:
+            self.first_seen = now
+        self.last_seen = now
+        record = data.get('record')
+        if record is not None:
+            self.last_record = record
+            self.windows.add(record)
+
+    def snapshot(self):
+        record = self.last_record or {}
+        return {
+            'id': self.userid,
+            'messages': self.messages,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'blink_count': record.get('blink_count'),
+            'yawn_count': record.get('yawn_count'),
+            'lost_focus_count': record.get('lost_focus_count'),
+            'yaw': record.get('yaw'),
+            'windows': self.windows.snapshot()['windows'],
+        }
+
+
+class WorkerStats:
+    """Message counters and a capture-to-worker latency histogram."""
+
+    def __init__(self, index):
+        self.index = index
+        self.processed = 0
+        self.errors = 0
+        self.latency = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+        self.latency_sum = 0.0
+
+    def observe(self, seconds):
+        ms = seconds * 1e3
+        bucket = 0
+        while bucket < len(LATENCY_BOUNDS_MS) and ms > LATENCY_BOUNDS_MS[bucket]:
+            bucket += 1
+        self.latency[bucket] += 1
+        self.latency_sum += ms
+
+    def snapshot(self, users):
+        return {
+            'worker': self.index,
+            'users': users,
+            'processed': self.processed,
+            'errors': self.errors,
+            'latency': list(self.latency),
+            'latency_sum_ms': self.latency_sum,
+            'time': time.time(),
+        }
+
+
+def latency_percentile(histogram, q):
+    """Upper bound (ms) of the bucket holding the q-th percentile, or None."""
+    total = sum(histogram)
+    if total == 0:
+        return None
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if seen >= q / 100.0 * total:
+            return LATENCY_BOUNDS_MS[bucket] if bucket < len(LATENCY_BOUNDS_MS) else float('inf')
+    return float('inf')
+
+
+def worker(index, dispatch_address, frontend_address, interval, stop):
+    """
+    Aggregate the records of one partition of users.
+
+    Runs in its own process. Summaries of the users that sent records since
+    the last publish go out every `interval` seconds, with the worker's
+    counters.
+
+    Arguments:
+        index: Worker number
+        dispatch_address: Address of this worker's PUSH socket on the broker
+        frontend_address: Broker XSUB address to publish summaries to
+        interval: Seconds between summary publishes
+        stop: multiprocessing.Event ending the worker
+    """
+    # Ctrl+C reaches the whole process group; the broker stops workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    context = SerializingContext()
+    inbox = context.socket(zmq.PULL)
+    inbox.connect(dispatch_address)
+    outbox = context.socket(zmq.PUB)
+    outbox.connect(frontend_address)
+
+    aggregates = {}
+    changed = set()
+    stats = WorkerStats(index)
+
+    def publish():
+        for userid in changed:
+            outbox.send_record(topic(SUMMARY, userid), aggregates[userid].snapshot())
+        changed.clear()
+        outbox.send_record(topic(STATS, f"worker{index}"), stats.snapshot(len(aggregates)))
+
+    next_publish = time.monotonic() + interval
+    try:
+        while not stop.is_set():
+            if inbox.poll(100):
+                try:
+                    _, data, _ = inbox.recv_message()
+                    now = time.time()
+                    userid = data['id']
+                    aggregate = aggregates.get(userid)
+                    if aggregate is None:
+                        aggregate = aggregates[userid] = UserAggregate(userid)
+                    aggregate.update(data, now)
+                    changed.add(userid)
+                    stats.processed += 1
+                    if 'sent' in data:
+                        stats.observe(now - data['sent'])
+                except Exception as e:
+                    stats.errors += 1
+                    logger.error(f"Worker {index}: bad message: {e}")
+            if time.monotonic() >= next_publish:
+                publish()
+                next_publish += interval
+        publish()
+    finally:
+        inbox.close(linger=0)
+        outbox.close(linger=1000)
+        context.term()
+
+
+# ============================================================================
+# Broker
+# ============================================================================
+
+class Broker:
+    """
+    XSUB/XPUB proxy with a pool of aggregation worker processes.
+
+    Arguments:
+        workers: Number of aggregation worker processes
+        frontend_port: Port clients publish to
+        backend_port: Port subscribers connect to
+        interval: Seconds between worker summary publishes
+        host: Interface to bind
+    """
+
+    def __init__(self, workers=2, frontend_port=FRONTEND_PORT, backend_port=BACKEND_PORT,
+                 interval=5.0, host='*'):
+        self.context = SerializingContext()
+        # Don't hold shutdown up on undelivered messages
+        self.context.linger = 0
+        self.frontend = self.context.socket(zmq.XSUB)
+        self.frontend.bind(f"tcp://{host}:{frontend_port}")
+        self.backend = self.context.socket(zmq.XPUB)
+        self.backend.bind(f"tcp://{host}:{backend_port}")
+        self.backend.bind(f"inproc://broker-backend-{id(self)}")
+        self.frontend_port = frontend_port
+        self.backend_port = backend_port
+
+        self.pushes = []
+        self.dispatched = [0] * workers
+        self.dropped = [0] * workers
+        self._stop = multiprocessing.Event()
+        self.processes = []
+        for index in range(workers):
+            push = self.context.socket(zmq.PUSH)
+            port = push.bind_to_random_port('tcp://127.0.0.1')
+            self.pushes.append(push)
+            self.processes.append(multiprocessing.Process(
+                target=worker, name=f"Worker {index}", daemon=True,
+                args=(index, f"tcp://127.0.0.1:{port}", f"tcp://127.0.0.1:{frontend_port}",
+                      interval, self._stop)))
+        self._threads = [
+            threading.Thread(target=self._proxy, name='Proxy Thread', daemon=True),
+            threading.Thread(target=self._dispatch, name='Dispatch Thread', daemon=True),
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Broker: clients -> :{self.frontend_port}, subscribers <- :{self.backend_port}, "
+                    f"{len(self.processes)} workers")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for process in self.processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        # Terminating the context interrupts the proxy and dispatcher,
+        # which close their sockets on the way out
+        self.context.term()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def stats(self):
+        return {'dispatched': list(self.dispatched), 'dropped': list(self.dropped)}
+
+    def _proxy(self):
+        try:
+            zmq.proxy(self.frontend, self.backend)
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            self.frontend.close()
+            self.backend.close()
+
+    def _dispatch(self):
+        inbox = self.context.socket(zmq.SUB)
+        inbox.setsockopt(zmq.SUBSCRIBE, f"{METRICS}/".encode())
+        inbox.connect(f"inproc://broker-backend-{id(self)}")
+        prefix = len(METRICS) + 1
+        workers = len(self.pushes)
+        try:
+            while True:
+                parts = inbox.recv_multipart(copy=False)
+                index = zlib.crc32(parts[0].bytes[prefix:]) % workers
+                try:
+                    # Never block the dispatcher on one slow worker
+                    self.pushes[index].send_multipart(parts, flags=zmq.NOBLOCK, copy=False)
+                    self.dispatched[index] += 1
+                except zmq.Again:
+                    self.dropped[index] += 1
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            inbox.close()
+            for push in self.pushes:
+                push.close()
+
+
+def run(workers, frontend_port, backend_port, interval):
+    """Run a broker until Ctrl+C, logging its dispatch counters every interval."""
+    broker = Broker(workers, frontend_port, backend_port, interval).start()
+    try:
+        while True:
+            time.sleep(interval)
+            logger.info(f"Broker: {broker.stats()}")
+    except KeyboardInterrupt:
+        logger.info("Broker shutting down...")
+    finally:
+        broker.stop()
+        logger.info("Broker stopped.")
+
+
+# ============================================================================
+# Subscribers
+# ============================================================================
+
+def subscriber(host, backend_port, channels):
+    context = SerializingContext.instance()
+    socket = context.socket(zmq.SUB)
+    for channel in channels:
+        socket.setsockopt(zmq.SUBSCRIBE, f"{channel}/".encode())
+    socket.connect(f"tcp://{host}:{backend_port}")
+    return socket
+
+
+def display(host, backend_port):
+    """Show every client's video in its own window ('q' quits)."""
+    socket = subscriber(host, backend_port, [VIDEO])
+    logger.info(f"Displaying video from {host}:{backend_port}")
+    try:
+        while True:
+            _, data, image = socket.recv_message()
+            if image is not None:
+                cv2.imshow(f"Client: {data.get('id', 'unknown')}",
+                           cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cv2.destroyAllWindows()
+        socket.close()
+
+
+def log_summaries(host, backend_port, interval):
+    """Log the latest summary of every user once per interval."""
+    socket = subscriber(host, backend_port, [SUMMARY, STATS])
+    summaries, workers = {}, {}
+    next_log = time.monotonic() + interval
+    logger.info(f"Logging summaries from {host}:{backend_port}")
+    try:
+        while True:
+            if socket.poll(max(0, int((next_log - time.monotonic()) * 1000))):
+                name, data, _ = socket.recv_message()
+                (workers if name.startswith(STATS) else summaries)[name] = data
+                continue
+            for summary in sorted(summaries.values(), key=lambda s: s['id']):
+                yaw = summary['yaw']
+                focus = summary['windows']['5m']['focus_ratio']
+                logger.info(
+                    f"[{summary['id']}] "
+                    f"Messages: {summary['messages']}, "
+                    f"Blinks: {summary['blink_count']}, "
+                    f"Yawns: {summary['yawn_count']}, "
+                    f"Yaw: {'-' if yaw is None else f'{yaw:.1f}'}°, "
+                    f"Lost Focus: {summary['lost_focus_count']}, "
+                    f"Focus (5m): {'-' if focus is None else f'{focus:.0%}'}"
+                )
+            processed = sum(stats['processed'] for stats in workers.values())
+            logger.info(f"{len(summaries)} users, {processed} records processed by "
+                        f"{len(workers)} workers")
+            summaries.clear()
+            next_log += interval
+    except KeyboardInterrupt:
+        pass
+    finally:
+        socket.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Attention monitor ZeroMQ broker')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Run the proxy and aggregation workers')
+    run_parser.add_argument('--workers', type=int, default=max(1, multiprocessing.cpu_count() - 1))
+    run_parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between summary publishes')
+    display_parser = commands.add_parser('display', help='Show client video')
+    log_parser = commands.add_parser('log', help='Log user summaries')
+    log_parser.add_argument('--interval', type=float, default=10.0, help='Seconds between logs')
+    for sub in (display_parser, log_parser):
+        sub.add_argument('--host', default='localhost', help='Broker host')
+    for sub in (run_parser, display_parser, log_parser):
+        sub.add_argument('--frontend-port', type=int, default=FRONTEND_PORT)
+        sub.add_argument('--backend-port', type=int, default=BACKEND_PORT)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args.workers, args.frontend_port, args.backend_port, args.interval)
+    elif args.command == 'display':
+        display(args.host, args.backend_port)
+    else:
+        log_summaries(args.host, args.backend_port, args.interval)
@@ -5,12 +5,25 @@ This server:
 1. Subscribes to attention metrics from clients
 2. Aggregates and processes the data
 3. Broadcasts to connected subscribers (dashboards, logging, etc.)
+
+Clients publish records on metrics/<userid> and frames on video/<userid>.
+With --metrics-only the server doesn't subscribe to the video channel, so
+frames are filtered out by ZeroMQ before they cross the network.
+
+Every record is folded into the user's rolling 1m, 5m and session
+aggregates (see aggregates.py) as it arrives. Dashboards and the API read
+them from the snapshot port with a REQ socket: send {"id": <userid>}, or
+{"id": <userid>, "series": true} to include per-minute deltas, and receive
+the snapshot, or null for an unknown user.
 """
 
+import argparse
 import zmq
 import cv2
 import logging
-from SerializingContext import SerializingContext
+import time
+from SerializingContext import METRICS, VIDEO, SerializingContext
+from aggregates import AggregateStore
 
 # Configure logging
 logging.basicConfig(
@@ -23,13 +36,15 @@ logger = logging.getLogger(__name__)
 ZMQ_HOST = "*"
 ZMQ_PORT = 5556
 ZMQ_PROTOCOL = "tcp"
+SNAPSHOT_PORT = 5559
 
 # Setup context and socket
 context = SerializingContext()
 socket = context.socket(zmq.SUB)
-socket.setsockopt(zmq.SUBSCRIBE, b'')
 socket.bind(f"{ZMQ_PROTOCOL}://{ZMQ_HOST}:{ZMQ_PORT}")
 
+aggregates = AggregateStore()
+
 
 def subscribe(copy=False):
     """
@@ -40,35 +55,81 @@ def subscribe(copy=False):
         
     Returns:
         dict: Attention metrics (user ID, yaw, pitch, roll, blink count, etc.)
-        ndarray: OpenCV image from client
+        ndarray: OpenCV image from client, or None for metrics messages
     """
     msg, image = socket.recv_array(copy=copy)
     return msg, image
 
 
-def main():
+def answer_snapshot(snapshots):
+    """
+    Reply to one snapshot request.
+    
+    Arguments:
+        snapshots: REP socket with a request waiting
+    """
+    try:
+        request = snapshots.recv_json()
+        reply = aggregates.snapshot(request.get('id'), series=bool(request.get('series')))
+    except (ValueError, AttributeError) as e:
+        logger.error(f"Bad snapshot request: {e}")
+        reply = None
+    snapshots.send_json(reply)
+
+
+def main(video=True, snapshot_port=SNAPSHOT_PORT):
     """
     Main server loop that aggregates and displays client data.
+    
+    Arguments:
+        video: Subscribe to the video channel and display client frames
+        snapshot_port: Port answering aggregate snapshot requests (0 = off)
     """
+    channels = [METRICS, VIDEO] if video else [METRICS]
+    for channel in channels:
+        socket.setsockopt(zmq.SUBSCRIBE, f"{channel}/".encode())
+    # Clients that publish without topics send a JSON header first
+    socket.setsockopt(zmq.SUBSCRIBE, b'{')
+
     logger.info(f"ZeroMQ Server started on {ZMQ_PROTOCOL}://{ZMQ_HOST}:{ZMQ_PORT}")
+    poller = zmq.Poller()
+    poller.register(socket, zmq.POLLIN)
+    snapshots = None
+    if snapshot_port:
+        snapshots = context.socket(zmq.REP)
+        snapshots.bind(f"{ZMQ_PROTOCOL}://{ZMQ_HOST}:{snapshot_port}")
+        poller.register(snapshots, zmq.POLLIN)
+        logger.info(f"Serving aggregate snapshots on port {snapshot_port}")
     logger.info("Waiting for client connections...")
     
     try:
         while True:
             try:
+                events = dict(poller.poll())
+                if snapshots in events:
+                    answer_snapshot(snapshots)
+                if socket not in events:
+                    continue
+                
                 # Receive data from client
                 data, image = subscribe()
                 
                 # Validate data
-                if data is None or 'record' not in data:
+                if data is None:
                     continue
+                user_id = data.get('id', 'unknown')
+                
+                # Display frame
+                if image is not None:
+                    cv2.imshow(f"Client: {user_id}", cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+                    cv2.waitKey(1)
                 
                 record = data.get('record')
                 if record is None:
                     continue
+                aggregates.add(user_id, record, time.monotonic())
                 
                 # Log metrics for this frame
-                user_id = data.get('id', 'unknown')
                 logger.info(
                     f"[{user_id}] "
                     f"Blinks: {record.get('blink_count')}, "
@@ -76,11 +137,6 @@ def main():
                     f"Yaw: {record.get('yaw'):.1f}°, "
                     f"Lost Focus: {record.get('lost_focus_count')}"
                 )
-                
-                # Display frame with metrics
-                if image is not None:
-                    cv2.imshow(f"Client: {user_id}", cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
-                    cv2.waitKey(1)
                     
             except Exception as e:
                 logger.error(f"Error processing frame: {e}")
@@ -90,10 +146,18 @@ def main():
         logger.info("Server shutting down...")
     finally:
         cv2.destroyAllWindows()
+        if snapshots is not None:
+            snapshots.close()
         socket.close()
         context.term()
         logger.info("Server stopped.")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Attention monitor ZeroMQ server')
+    parser.add_argument('--metrics-only', action='store_true',
+                        help="Don't subscribe to client video")
+    parser.add_argument('--snapshot-port', type=int, default=SNAPSHOT_PORT,
+                        help='Port answering aggregate snapshot requests (0 = off)')
+    args = parser.parse_args()
+    main(video=not args.metrics_only, snapshot_port=args.snapshot_port)
\ No newline at end of file
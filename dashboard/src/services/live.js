@@ -0,0 +1,52 @@
+// Live per-user metrics pushed by attention-monitor/zeromq/async_server.py.
+// The server coalesces updates per connection, so a slow page gets the
+// latest values rather than a backlog.
+const LIVE_PORT = 8765;
+
+function defaultUrl() {
+  const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+  return `${protocol}://${window.location.hostname}:${LIVE_PORT}/`;
+}
+
+/**
+ * Call onUpdate({ [userid]: { record, captured, sent, windows } }) for every
+ * update, reconnecting with backoff. Returns a function that unsubscribes.
+ */
+export function subscribeLive(onUpdate, { users, url } = {}) {
+  const query = users && users.length ? `?users=${users.map(encodeURIComponent).join(',')}` : '';
+  let socket;
+  let timer;
+  let closed = false;
+  let retry = 1000;
+
+  const connect = () => {
+    timer = undefined;
+    if (closed) {
+      return;
+    }
+    socket = new WebSocket(`${url || defaultUrl()}${query}`);
+    socket.onopen = () => {
+      retry = 1000;
+    };
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === 'update') {
+        onUpdate(message.users);
+      }
+    };
+    socket.onclose = () => {
+      if (!closed) {
+        timer = setTimeout(connect, retry);
+        retry = Math.min(retry * 2, 30000);
+      }
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    // Unsubscribing during a backoff must not let the timer reconnect
+    clearTimeout(timer);
+    socket.close();
+  };
+}
@@ -1,11 +1,14 @@
 import zmq
 import cv2
-from SerializingContext import SerializingContext
+from SerializingContext import METRICS, VIDEO, SerializingContext
 import numpy as np
 
 context = SerializingContext()
 socket = context.socket(zmq.SUB)
-socket.setsockopt(zmq.SUBSCRIBE, b'')
+# Records arrive on metrics/<userid> and frames on video/<userid>; b'{'
+# matches clients that publish without topics
+for prefix in (f"{METRICS}/", f"{VIDEO}/", '{'):
+    socket.setsockopt(zmq.SUBSCRIBE, prefix.encode())
 # socket.bind("tcp://10.10.10.163:5555")
 socket.bind("tcp://*:5556")
 from threading import Thread
@@ -28,7 +31,7 @@ def server(q):
         # print(data)
         # print(client_id)
         # print(client_id.dtype)
-        if data['record'] != None:
+        if data.get('record') is not None:
             this_dict["mar_stream"] = np.append(this_dict["mar_stream"][1:], data['record']['mar'])
             this_dict["ear_stream"] = np.append(this_dict["ear_stream"][1:], data['record']['ear'])
             this_dict["yaw_stream"] = np.append(this_dict["yaw_stream"][1:], data['record']['yaw'])
@@ -43,8 +46,10 @@ def server(q):
             # print(data['record']['face_not_present_duration'])
 
             # sample data {'id': '100', 'sortKey': '3cd72332-b2d9-11ea-b115-0d30b3991a0b', 'timestamp': 1592645668.660121, 'yaw': -7.538459777832031, 'pitch': -4.917228698730469, 'roll': 1.390106201171875, 'ear': 0.33526643780010046, 'blink_count': 6, 'mar': 0.02564102564102564, 'yawn_count': 0, 'lost_focus_count': 1, 'lost_focus_duration': 1.3774120807647705, 'face_not_present_duration': 0.34656667709350586}
-        cv2.imshow(data['id'],  cv2.cvtColor(image, cv2.COLOR_RGB2BGR)) # 1 window for each RPi
-        cv2.waitKey(1)
+        # image is None when the client's bandwidth budget withheld the frame
+        if image is not None:
+            cv2.imshow(data['id'],  cv2.cvtColor(image, cv2.COLOR_RGB2BGR)) # 1 window for each RPi
+            cv2.waitKey(1)
         # image_hub.send_reply(b'OK')
 
 def subscribe(copy=False):